@@ -3,6 +3,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from transcription.models import Meeting
+from .models import ProcessingJob, PipelineCheckpoint, ProcessingRun, StageMetric, UploadSession
 
 
 # نضع تكوين Meeting هنا إذا أردنا عرضه من منظور معالجة الصوت
@@ -97,24 +98,210 @@ class AudioProcessingMeetingAdmin(admin.ModelAdmin):
     actions = ['process_selected_meetings']
 
     def process_selected_meetings(self, request, queryset):
-        from audio_processing.tasks import process_meeting_task
-        import threading
+        from audio_processing.jobs import enqueue_meeting
 
         unprocessed = queryset.filter(processed=False)
         count = 0
 
+        # المعالجة الجماعية تدخل الطابور كأرشيف حتى لا تؤخر الاجتماعات العاجلة
         for meeting in unprocessed:
-            thread = threading.Thread(target=process_meeting_task, args=(meeting.id,))
-            thread.daemon = True
-            thread.start()
-            count += 1
+            job, created = enqueue_meeting(meeting, priority=ProcessingJob.PRIORITY_BACKFILL)
+            if created:
+                count += 1
 
         if count:
-            self.message_user(request, f'تم بدء معالجة {count} اجتماع')
+            self.message_user(request, f'تمت إضافة {count} اجتماع إلى طابور المعالجة')
         else:
-            self.message_user(request, 'جميع الاجتماعات المحددة تمت معالجتها بالفعل')
+            self.message_user(request, 'جميع الاجتماعات المحددة تمت معالجتها أو قيد المعالجة بالفعل')
 
     process_selected_meetings.short_description = 'معالجة الاجتماعات المحددة'
 
 # تسجيل نموذج Meeting مع تكوين مخصص لمعالجة الصوت
-# admin.site.register(Meeting, AudioProcessingMeetingAdmin)
\ No newline at end of file
+# admin.site.register(Meeting, AudioProcessingMeetingAdmin)
+
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ['meeting', 'status', 'priority', 'attempts', 'wait_time', 'lease_owner',
+                    'created_at', 'started_at', 'finished_at']
+    list_filter = ['status', 'priority', 'created_at']
+    list_editable = ['priority']
+    search_fields = ['meeting__title', 'lease_owner']
+    date_hierarchy = 'created_at'
+
+    fieldsets = (
+        ('المهمة', {
+            'fields': ('meeting', 'status', 'priority', 'attempts', 'audio_bytes')
+        }),
+        ('الحجز', {
+            'fields': ('lease_owner', 'lease_expires_at')
+        }),
+        ('التوقيت', {
+            'fields': ('created_at', 'queued_at', 'wait_seconds', 'started_at', 'finished_at',
+                       'cancel_requested_at')
+        }),
+        ('الأخطاء', {
+            'fields': ('error',),
+            'classes': ('collapse',)
+        }),
+    )
+
+    readonly_fields = ['meeting', 'attempts', 'audio_bytes', 'lease_owner', 'lease_expires_at',
+                       'created_at', 'queued_at', 'wait_seconds', 'started_at', 'finished_at',
+                       'cancel_requested_at', 'error']
+
+    actions = ['cancel_jobs']
+
+    def wait_time(self, obj):
+        if obj.wait_seconds is None:
+            return '-'
+        return f'{obj.wait_seconds / 60:.1f} دقيقة'
+
+    wait_time.short_description = 'مدة الانتظار'
+    wait_time.admin_order_field = 'wait_seconds'
+
+    def cancel_jobs(self, request, queryset):
+        from audio_processing.jobs import request_cancel
+
+        count = sum(1 for job in queryset.filter(status__in=ProcessingJob.ACTIVE_STATUSES) if request_cancel(job))
+
+        if count:
+            self.message_user(request, f'تم طلب إلغاء {count} مهمة')
+        else:
+            self.message_user(request, 'لا توجد مهام نشطة بين المهام المحددة')
+
+    cancel_jobs.short_description = 'إلغاء المهام المحددة'
+
+    def has_add_permission(self, request):
+        # المهام تضاف من واجهة الرفع أو إجراءات الاجتماعات فقط
+        return False
+
+
+@admin.register(PipelineCheckpoint)
+class PipelineCheckpointAdmin(admin.ModelAdmin):
+    """
+    المراحل المكتملة لكل اجتماع - حذف سجل مرحلة يجبر إعادة تنفيذها في المعالجة التالية
+    """
+    list_display = ['meeting', 'stage', 'input_hash', 'completed_at']
+    list_filter = ['stage', 'completed_at']
+    search_fields = ['meeting__title', 'stage']
+    readonly_fields = ['meeting', 'stage', 'input_hash', 'artifact_path', 'completed_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
+# Inline لقياسات مراحل التشغيل
+class StageMetricInline(admin.TabularInline):
+    model = StageMetric
+    extra = 0
+    fields = ['stage', 'wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'audio_seconds', 'bytes_uploaded',
+              'from_checkpoint']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProcessingRun)
+class ProcessingRunAdmin(admin.ModelAdmin):
+    """
+    سجل تشغيلات المعالجة والمرحلة التي وصل إليها كل تشغيل
+    """
+    list_display = ['meeting', 'status', 'stage', 'stage_progress', 'started_at', 'finished_at']
+    list_filter = ['status', 'stage', 'started_at']
+    search_fields = ['meeting__title']
+    date_hierarchy = 'started_at'
+
+    fieldsets = (
+        ('التشغيل', {
+            'fields': ('meeting', 'job', 'status')
+        }),
+        ('التقدم', {
+            'fields': ('stage', 'stage_progress', 'stage_started_at', 'updated_at')
+        }),
+        ('التوقيت', {
+            'fields': ('started_at', 'finished_at')
+        }),
+        ('الأخطاء', {
+            'fields': ('error',),
+            'classes': ('collapse',)
+        }),
+    )
+
+    readonly_fields = ['meeting', 'job', 'status', 'stage', 'stage_progress', 'stage_started_at',
+                       'updated_at', 'started_at', 'finished_at', 'error']
+    inlines = [StageMetricInline]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(StageMetric)
+class StageMetricAdmin(admin.ModelAdmin):
+    """
+    قياسات كل مرحلة: التصفية حسب المرحلة والتاريخ تظهر أثر تحديث النماذج أو المكتبات
+    """
+    list_display = ['run', 'stage', 'wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'audio_seconds',
+                    'rtf', 'upload_size', 'from_checkpoint', 'recorded_at']
+    list_filter = ['stage', 'from_checkpoint', 'recorded_at']
+    search_fields = ['run__meeting__title']
+    date_hierarchy = 'recorded_at'
+    list_select_related = ['run__meeting']
+    readonly_fields = ['run', 'stage', 'wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'audio_seconds',
+                       'bytes_uploaded', 'from_checkpoint', 'recorded_at']
+
+    def rtf(self, obj):
+        factor = obj.real_time_factor
+        return f'{factor:.3f}' if factor is not None else '-'
+
+    rtf.short_description = 'معامل الزمن الحقيقي'
+
+    def upload_size(self, obj):
+        if not obj.bytes_uploaded:
+            return '-'
+        return f'{obj.bytes_uploaded / (1024 * 1024):.2f} MB'
+
+    upload_size.short_description = 'حجم الرفع'
+    upload_size.admin_order_field = 'bytes_uploaded'
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    """
+    جلسات الرفع على أجزاء: الجلسات المتوقفة تنتهي صلاحيتها وتُحذف أجزاؤها تلقائياً
+    """
+    list_display = ['filename', 'created_by', 'status', 'progress', 'meeting', 'created_at', 'updated_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['filename', 'title', 'created_by__username']
+    list_select_related = ['created_by', 'meeting']
+    readonly_fields = ['id', 'created_by', 'filename', 'size', 'received', 'status', 'title', 'date',
+                       'description', 'priority', 'meeting', 'ingest_owner', 'ingest_lease_expires_at',
+                       'created_at', 'updated_at']
+
+    fieldsets = (
+        ('الملف', {
+            'fields': ('id', 'filename', 'size', 'received', 'status')
+        }),
+        ('فك الترميز أثناء الرفع', {
+            'fields': ('ingest_owner', 'ingest_lease_expires_at')
+        }),
+        ('الاجتماع', {
+            'fields': ('title', 'date', 'description', 'priority', 'meeting', 'created_by')
+        }),
+        ('التوقيت', {
+            'fields': ('created_at', 'updated_at')
+        }),
+    )
+
+    def progress(self, obj):
+        return f'{obj.progress_percent}%'
+
+    progress.short_description = 'التقدم'
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,87 @@
+# audio_processing/cancellation.py - إلغاء المعالجة ومهلة كل مرحلة
+
+import time
+import threading
+from concurrent.futures import wait
+from django.conf import settings
+
+# المرحلة الجارية في خيط المهمة الحالي (كل اجتماع يُعالج في خيط مستقل داخل العامل)
+_current = threading.local()
+
+# الفترة بين كل فحص لحالة التشغيل أثناء انتظار مرحلة في أحد المجمعات
+CHECK_INTERVAL = 2.0
+
+
+class ProcessingCancelled(Exception):
+    """أُلغيت المعالجة، أو انتقل التشغيل إلى مرحلة أخرى فلم يعد لناتج هذه المرحلة فائدة"""
+
+
+class StageTimeout(Exception):
+    """تجاوزت المرحلة المهلة المحددة لها في PROCESSING_STAGE_TIMEOUTS"""
+
+
+def get_stage_timeout(stage):
+    """المهلة بالثواني لمرحلة، أو None إذا لم تُحدد"""
+    return getattr(settings, 'PROCESSING_STAGE_TIMEOUTS', {}).get(stage)
+
+
+def enter_stage(run, stage):
+    """تسجيل المرحلة الجارية وموعد انتهاء مهلتها للخيط الحالي"""
+    timeout = get_stage_timeout(stage)
+    _current.run_id = run.id if run is not None else None
+    _current.stage = stage
+    _current.deadline = time.monotonic() + timeout if timeout else None
+
+
+def leave_run():
+    _current.run_id = None
+    _current.stage = None
+    _current.deadline = None
+
+
+def is_stage_active(run_id, stage=None):
+    """التشغيل ما زال قيد التنفيذ (لم يُلغَ) وما زال في نفس المرحلة"""
+    # استيراد متأخر: scheduler يستورد هذه الوحدة قبل django.setup في عمليات المجمع
+    from .models import ProcessingRun
+
+    runs = ProcessingRun.objects.filter(id=run_id, status='running')
+    if stage is not None:
+        runs = runs.filter(stage=stage)
+    return runs.exists()
+
+
+def check_cancelled():
+    """نقطة فحص تعاونية: إثارة ProcessingCancelled إذا أُلغي التشغيل الحالي"""
+    run_id = getattr(_current, 'run_id', None)
+    if run_id is not None and not is_stage_active(run_id):
+        raise ProcessingCancelled(f"Run {run_id} was cancelled")
+
+
+def wait_for(future):
+    """
+    انتظار ناتج مرحلة تعمل في أحد المجمعات مع احترام المهلة والإلغاء
+
+    الانتظار يتم على فترات قصيرة، فيتحرر خيط المهمة فور انتهاء المهلة أو الإلغاء.
+    المرحلة نفسها في مجمع المعالج تتوقف عند نقطة الفحص التالية (دالة التقدم)
+    لأن التشغيل لم يعد في مرحلتها
+    """
+    run_id = getattr(_current, 'run_id', None)
+    stage = getattr(_current, 'stage', None)
+    deadline = getattr(_current, 'deadline', None)
+
+    while True:
+        interval = CHECK_INTERVAL
+        if deadline is not None:
+            interval = max(0.0, min(interval, deadline - time.monotonic()))
+
+        wait([future], timeout=interval)
+        if future.done():
+            return future.result()
+
+        if deadline is not None and time.monotonic() >= deadline:
+            future.cancel()
+            raise StageTimeout(f"Stage '{stage}' exceeded {get_stage_timeout(stage)}s")
+
+        if run_id is not None and not is_stage_active(run_id):
+            future.cancel()
+            raise ProcessingCancelled(f"Run {run_id} was cancelled during '{stage}'")
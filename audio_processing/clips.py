@@ -0,0 +1,149 @@
+# audio_processing/clips.py - مقاطع صوتية جاهزة لكل مقطع نصي مع تخزين مؤقت
+
+import os
+import hashlib
+import logging
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from transcription.models import TranscriptSegment
+from .utils.preprocessing import (
+    PCM_SAMPLE_RATE, decode_to_pcm, get_pcm_duration, encode_pcm_range, get_format_extension
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_clips_dir():
+    return getattr(settings, 'SEGMENT_CLIPS_DIR', os.path.join(settings.MEDIA_ROOT, 'segment_clips'))
+
+
+def get_clip_format():
+    return getattr(settings, 'SEGMENT_CLIPS_FORMAT', 'mp3')
+
+
+def get_clip_key(meeting):
+    """
+    مفتاح مقاطع الاجتماع: بصمة التسجيل المحفوظة (SHA-256)
+
+    الاجتماعات المرفوعة قبل إضافة البصمة تُستخدم لها بصمة سريعة من مسار الملف
+    وحجمه ووقت تعديله، فلا يُقرأ التسجيل كاملاً داخل طلب الويب (العامل يحسب
+    البصمة الكاملة ويحفظها عند معالجة الاجتماع)
+    """
+    if meeting.audio_sha256:
+        return meeting.audio_sha256
+
+    path = meeting.audio_file.path
+    stat = os.stat(path)
+    return hashlib.sha256(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8')).hexdigest()
+
+
+def get_clip_path(audio_hash, start_time, end_time):
+    """
+    مسار المقطع في الذاكرة المؤقتة، ومفتاحه بصمة التسجيل (get_clip_key) وحدود المقطع
+
+    فلا يتأثر بتعديل نص المقطع، ويُستخدم نفس الملف للاجتماعات المكررة
+    """
+    start_ms, end_ms = int(round(start_time * 1000)), int(round(end_time * 1000))
+    extension = get_format_extension(get_clip_format())
+    return os.path.join(get_clips_dir(), audio_hash[:2], f"{audio_hash}-{start_ms}-{end_ms}{extension}")
+
+
+def get_segment_clip(segment, create=True):
+    """
+    مسار مقطع الصوت لمقطع نصي، يُقص من نسخة PCM ويُرمز عند أول طلب
+
+    كل استخدام يحدّث تاريخ الملف، فالإخلاء (evict_clips) يحذف الأقدم استخداماً أولاً
+
+    Returns:
+        str أو None: None إذا لم يُفك ترميز صوت الاجتماع بعد
+    """
+    meeting = segment.meeting
+    audio_path = meeting.audio_file.path
+    clip_path = get_clip_path(get_clip_key(meeting), segment.start_time, segment.end_time)
+
+    if os.path.exists(clip_path):
+        try:
+            os.utime(clip_path)
+            return clip_path
+        except FileNotFoundError:
+            # حُذف أثناء الإخلاء من عملية أخرى
+            pass
+
+    if not create or get_pcm_duration(audio_path) is None:
+        return None
+
+    samples = np.load(decode_to_pcm(audio_path), mmap_mode='r')
+    start = max(0, int(segment.start_time * PCM_SAMPLE_RATE))
+    end = min(len(samples), int(segment.end_time * PCM_SAMPLE_RATE))
+    if end <= start:
+        return None
+
+    os.makedirs(os.path.dirname(clip_path), exist_ok=True)
+    encode_pcm_range(samples, start, end, clip_path, get_clip_format())
+    evict_clips()
+    return clip_path
+
+
+def evict_clips(max_bytes=None):
+    """
+    حذف المقاطع الأقدم استخداماً حتى يعود حجم الذاكرة المؤقتة تحت SEGMENT_CLIPS_MAX_BYTES
+
+    الحذف يستمر إلى 90% من الحد، فلا يتكرر الحذف مع كل مقطع جديد
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'SEGMENT_CLIPS_MAX_BYTES', 500 * 1024 * 1024)
+
+    clips = []
+    total = 0
+    for root, _, files in os.walk(get_clips_dir()):
+        for name in files:
+            if name.endswith('.tmp'):
+                # مقطع قيد الكتابة
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            clips.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    for _, size, path in sorted(clips):
+        if total <= max_bytes * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+
+    logger.info(f"Evicted {removed} segment clips")
+    return removed
+
+
+def prewarm_segment_clips(meeting_id):
+    """
+    تجهيز مقاطع القرارات والمهام مسبقاً (أكثر ما يعيد المراجعون تشغيله)
+
+    Returns:
+        int: عدد المقاطع الجاهزة
+    """
+    segments = TranscriptSegment.objects.filter(
+        Q(is_decision=True) | Q(is_action_item=True), meeting_id=meeting_id
+    ).select_related('meeting')
+
+    ready = 0
+    for segment in segments:
+        try:
+            if get_segment_clip(segment):
+                ready += 1
+        except Exception as e:
+            # المقطع يُجهز عند أول طلب، فلا تفشل المعالجة بسببه
+            logger.warning(f"Could not prepare clip for segment {segment.id}: {e}")
+    return ready
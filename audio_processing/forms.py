@@ -1,10 +1,44 @@
 # audio_processing/forms.py
 
+import os
 from django import forms
 from transcription.models import Meeting
+from .models import ProcessingJob, UploadSession
+from .pipeline import compute_upload_hash
 from django.utils.translation import gettext_lazy as _
 
-class MeetingUploadForm(forms.ModelForm):
+class PriorityFormMixin:
+    """
+    أولوية "عاجل" للمشرفين فقط (is_staff): لا تظهر لغيرهم، وتُرفض إذا أُرسلت يدوياً
+    """
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        if not self.can_use_urgent():
+            field = self.fields['priority']
+            field.choices = [choice for choice in field.choices if choice[0] != ProcessingJob.PRIORITY_URGENT]
+
+    def can_use_urgent(self):
+        return self.user is not None and self.user.is_staff
+
+    def clean_priority(self):
+        priority = self.cleaned_data['priority']
+        if priority == ProcessingJob.PRIORITY_URGENT and not self.can_use_urgent():
+            raise forms.ValidationError(_('الأولوية العاجلة متاحة للمشرفين فقط'))
+        return priority
+
+
+class MeetingUploadForm(PriorityFormMixin, forms.ModelForm):
+    priority = forms.TypedChoiceField(
+        label=_('أولوية المعالجة'),
+        choices=ProcessingJob.PRIORITY_CHOICES,
+        coerce=int,
+        initial=ProcessingJob.PRIORITY_NORMAL,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        help_text=_('اختر "أرشيف" عند رفع تسجيلات قديمة لا يلزم معالجتها فوراً'),
+    )
+
     class Meta:
         model = Meeting
         fields = ['title', 'date', 'description', 'audio_file']
@@ -22,4 +56,33 @@ class MeetingUploadForm(forms.ModelForm):
         }
         help_texts = {
             'audio_file': _('يدعم صيغ MP3, WAV, M4A - الحد الأقصى 3 ساعات'),
-        }
\ No newline at end of file
+        }
+
+    def save(self, commit=True):
+        meeting = super().save(commit=False)
+        # البصمة تُحسب من أجزاء الملف المرفوع قبل حفظه، لاكتشاف التسجيلات المكررة
+        if 'audio_file' in self.changed_data:
+            meeting.audio_sha256 = compute_upload_hash(self.cleaned_data['audio_file'])
+        if commit:
+            meeting.save()
+        return meeting
+
+
+class UploadSessionForm(PriorityFormMixin, forms.ModelForm):
+    """بيانات الاجتماع والملف عند بدء رفع على أجزاء (الملف نفسه يُرسل لاحقاً)"""
+
+    class Meta:
+        model = UploadSession
+        fields = ['title', 'date', 'description', 'priority', 'filename', 'size']
+
+    def clean_filename(self):
+        filename = os.path.basename(self.cleaned_data['filename'].replace('\\', '/'))
+        if not filename:
+            raise forms.ValidationError(_('اسم الملف غير صالح'))
+        return filename
+
+    def clean_size(self):
+        size = self.cleaned_data['size']
+        if size <= 0:
+            raise forms.ValidationError(_('حجم الملف غير صالح'))
+        return size
@@ -0,0 +1,294 @@
+# audio_processing/ingest.py - فك ترميز التسجيل واكتشاف الكلام أثناء رفعه
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+import logging
+import numpy as np
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from .models import UploadSession
+from .jobs import get_lease_duration
+from .uploads import get_uploads_dir, get_part_path
+from .utils.preprocessing import (
+    PCM_SAMPLE_RATE, VAD_FRAME_SECONDS, store_raw_pcm, find_speech_intervals, save_speech_intervals
+)
+
+logger = logging.getLogger(__name__)
+
+# حجم القراءة من ملف الأجزاء ومن مخرج ffmpeg
+FEED_BLOCK_SIZE = 1024 * 1024
+
+# عدد العينات في إطار VAD (نفس إطارات frame_energies)
+FRAME_SAMPLES = int(PCM_SAMPLE_RATE * VAD_FRAME_SECONDS)
+
+
+class IngestError(Exception):
+    """تعذر فك ترميز التسجيل أثناء رفعه (صيغة لا تُقرأ كتدفق، مثل m4a بفهرس في آخره)"""
+
+
+def get_ingest_settings():
+    return {
+        'concurrency': getattr(settings, 'UPLOAD_INGEST_CONCURRENCY', 2),
+        'poll_interval': getattr(settings, 'UPLOAD_INGEST_POLL_INTERVAL', 1),
+        'wait_seconds': getattr(settings, 'UPLOAD_INGEST_WAIT_SECONDS', 120),
+        'idle_seconds': getattr(settings, 'UPLOAD_INGEST_IDLE_SECONDS', 30),
+    }
+
+
+def get_raw_path(session):
+    """عينات s16le المفكوكة حتى الآن، تُحول إلى نسخة PCM للاجتماع عند اكتمال الرفع"""
+    return os.path.join(get_uploads_dir(), f"{session.id}.pcm16k.raw")
+
+
+class StreamingDecoder:
+    """
+    فك ترميز ملف يصل على دفعات عبر ffmpeg يقرأ من stdin
+
+    خيط جانبي يكتب مخرج ffmpeg في ملف خام ويحسب طاقة إطارات VAD كلما وصلت
+    عينات، فعند انتهاء الرفع تكون نسخة PCM وطاقة الإطارات جاهزتين إلا آخر جزء
+    """
+
+    def __init__(self, raw_path):
+        self.raw_path = raw_path
+        self.fed = 0
+        self.energies = []
+        self._pending = b''
+        self._error = None
+
+        os.makedirs(os.path.dirname(raw_path), exist_ok=True)
+        self._raw = open(raw_path, 'wb')
+        self.process = subprocess.Popen(
+            ['ffmpeg', '-nostdin', '-v', 'error', '-i', 'pipe:0',
+             '-ac', '1', '-ar', str(PCM_SAMPLE_RATE), '-f', 's16le', '-acodec', 'pcm_s16le', 'pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+
+    def _read_output(self):
+        try:
+            for data in iter(lambda: self.process.stdout.read(FEED_BLOCK_SIZE), b''):
+                self._raw.write(data)
+                self._add_frames(data)
+        except Exception as e:
+            self._error = e
+
+    def _add_frames(self, data):
+        """طاقة الإطارات المكتملة (نفس حساب frame_energies)، والباقي ينتظر الدفعة التالية"""
+        data = self._pending + data
+        usable = len(data) // (2 * FRAME_SAMPLES) * (2 * FRAME_SAMPLES)
+        self._pending = data[usable:]
+        if not usable:
+            return
+
+        frames = np.frombuffer(data[:usable], dtype='<i2').astype(np.float32).reshape(-1, FRAME_SAMPLES)
+        self.energies.append(np.sqrt(np.mean(np.square(frames / 32768.0), axis=1)))
+
+    def feed(self, path, end):
+        """إرسال البايتات [fed, end) من الملف إلى ffmpeg"""
+        if end <= self.fed:
+            return
+        try:
+            with open(path, 'rb') as f:
+                f.seek(self.fed)
+                while self.fed < end:
+                    data = f.read(min(FEED_BLOCK_SIZE, end - self.fed))
+                    if not data:
+                        break
+                    self.process.stdin.write(data)
+                    self.fed += len(data)
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            raise IngestError(f"ffmpeg stopped after {self.fed} bytes")
+
+    def finish(self, audio_file_path):
+        """
+        إغلاق الإدخال وحفظ نسخة PCM وفترات الكلام للملف الصوتي النهائي
+
+        Returns:
+            float: مدة الصوت بالثواني
+        """
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self.process.wait()
+        self._reader.join()
+        self._raw.close()
+        if returncode != 0 or self._error is not None:
+            raise IngestError(f"ffmpeg exited with {returncode}: {self._error or ''}")
+
+        num_samples = store_raw_pcm(self.raw_path, audio_file_path)
+        energies = np.concatenate(self.energies) if self.energies else np.zeros(0, np.float32)
+        save_speech_intervals(audio_file_path, find_speech_intervals(energies))
+        self.close()
+        return num_samples / PCM_SAMPLE_RATE
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self._reader.join()
+        self._raw.close()
+        if os.path.exists(self.raw_path):
+            os.remove(self.raw_path)
+
+
+class UploadIngestor:
+    """
+    حجز جلسات الرفع الجارية وتغذية أجزائها المؤكدة إلى StreamingDecoder
+
+    الحجز مثل حجز مهام المعالجة (مالك + انتهاء يُجدد كل دورة)، فإذا توقف العامل
+    يحجز الجلسة عامل آخر ويبدأ فك ترميزها من أولها. عند اكتمال الرفع يُكمل الباقي
+    من ملف الاجتماع ثم يحرر الحجز، ومرحلة فك الترميز تنتظر ذلك (wait_for_ingest)
+
+    الرفع المتوقف (لم يصل جزء منذ UPLOAD_INGEST_IDLE_SECONDS) يُحرر وتُوقف عملية
+    ffmpeg الخاصة به، فلا يشغل مكاناً من concurrency، ويُحجز من جديد عند وصول جزء
+    """
+
+    def __init__(self, worker_id, concurrency=None, idle_seconds=None):
+        options = get_ingest_settings()
+        self.worker_id = worker_id
+        self.concurrency = concurrency or options['concurrency']
+        self.idle_seconds = options['idle_seconds'] if idle_seconds is None else idle_seconds
+        self.decoders = {}
+        self.enabled = shutil.which('ffmpeg') is not None
+        if not self.enabled:
+            logger.warning("ffmpeg not found, uploads are decoded after they complete")
+
+    def tick(self):
+        """دورة واحدة: تغذية الجلسات المحجوزة ثم حجز جلسات جديدة"""
+        if not self.enabled:
+            return
+        for session_id in list(self.decoders):
+            self._advance(session_id)
+        self._claim_sessions()
+
+    def _advance(self, session_id):
+        decoder = self.decoders[session_id]
+        session = UploadSession.objects.filter(id=session_id, ingest_owner=self.worker_id).first()
+        if session is None:
+            logger.warning(f"Worker {self.worker_id} lost ingest lease on upload {session_id}")
+            self._drop(session_id, release=False)
+            return
+
+        try:
+            if session.status == 'uploading':
+                if session.received < decoder.fed:
+                    # جزء أُلغي بعد تغذيته (توقف الخادم قبل كتابته): يُعاد فك الترميز من البداية
+                    self._drop(session_id)
+                    return
+                if session.received == decoder.fed and session.updated_at < self._idle_since():
+                    logger.info(f"Upload {session_id}: no chunks for {self.idle_seconds}s, pausing streaming decode")
+                    self._drop(session_id)
+                    return
+                decoder.feed(get_part_path(session), session.received)
+                self._renew(session_id)
+            elif session.status == 'complete' and session.meeting_id:
+                audio_path = session.meeting.audio_file.path
+                decoder.feed(audio_path, session.size)
+                duration = decoder.finish(audio_path)
+                del self.decoders[session_id]
+                self._release(session_id)
+                logger.info(f"Upload {session_id}: decoded {duration:.1f}s during upload")
+            elif session.status == 'expired':
+                self._drop(session_id)
+            else:
+                # الرفع اكتمل والملف يُنقل إلى مكانه
+                self._renew(session_id)
+        except (IngestError, OSError) as e:
+            logger.warning(f"Upload {session_id}: streaming decode failed, decoding after upload: {e}")
+            self._drop(session_id)
+            # لا يُعاد حجز جلسة لا تُقرأ كتدفق
+            UploadSession.objects.filter(id=session_id).update(ingest_owner='failed', ingest_lease_expires_at=None)
+
+    def _claim_sessions(self):
+        free = self.concurrency - len(self.decoders)
+        if free <= 0:
+            return
+
+        now = timezone.now()
+        claimable = UploadSession.objects.filter(
+            status='uploading', received__gt=0, updated_at__gte=self._idle_since()
+        ).exclude(
+            ingest_owner='failed'
+        ).filter(Q(ingest_lease_expires_at__isnull=True) | Q(ingest_lease_expires_at__lt=now))
+
+        for session in claimable.order_by('created_at')[:free]:
+            claimed = claimable.filter(id=session.id).update(
+                ingest_owner=self.worker_id,
+                ingest_lease_expires_at=now + get_lease_duration(),
+            )
+            if not claimed:
+                continue
+            try:
+                self.decoders[session.id] = StreamingDecoder(get_raw_path(session))
+            except OSError as e:
+                logger.warning(f"Upload {session.id}: could not start streaming decode: {e}")
+                self._release(session.id)
+                continue
+            logger.info(f"Worker {self.worker_id} decoding upload {session.id} while it streams in")
+            self._advance(session.id)
+
+    def _idle_since(self):
+        return timezone.now() - timedelta(seconds=self.idle_seconds)
+
+    def _renew(self, session_id):
+        UploadSession.objects.filter(id=session_id, ingest_owner=self.worker_id).update(
+            ingest_lease_expires_at=timezone.now() + get_lease_duration()
+        )
+
+    def _release(self, session_id):
+        UploadSession.objects.filter(id=session_id, ingest_owner=self.worker_id).update(
+            ingest_owner='', ingest_lease_expires_at=None
+        )
+
+    def _drop(self, session_id, release=True):
+        self.decoders.pop(session_id).close()
+        if release:
+            self._release(session_id)
+
+    def close(self):
+        """إيقاف فك الترميز الجاري وتحرير الحجوزات (عند إيقاف العامل)"""
+        for session_id in list(self.decoders):
+            self._drop(session_id)
+
+
+def run_ingest_loop(worker_id, stop_event):
+    """حلقة خيط فك الترميز أثناء الرفع في run_processing_worker"""
+    ingestor = UploadIngestor(worker_id)
+    interval = get_ingest_settings()['poll_interval']
+    try:
+        while ingestor.enabled and not stop_event.wait(interval):
+            try:
+                ingestor.tick()
+            except Exception as e:
+                logger.error(f"Upload ingest failed: {str(e)}")
+    finally:
+        ingestor.close()
+        connection.close()
+
+
+def wait_for_ingest(meeting, timeout=None):
+    """
+    انتظار انتهاء فك ترميز الجزء الأخير من رفع الاجتماع (إن كان عامل يفكه)
+
+    بعد ذلك تجد مرحلة فك الترميز نسخة PCM جاهزة، وبعد المهلة تفك الترميز بنفسها
+    """
+    if timeout is None:
+        timeout = get_ingest_settings()['wait_seconds']
+
+    deadline = time.monotonic() + timeout
+    sessions = UploadSession.objects.filter(meeting=meeting)
+    while sessions.filter(ingest_lease_expires_at__gt=timezone.now()).exists():
+        if time.monotonic() >= deadline:
+            logger.warning(f"Meeting {meeting.id}: streaming decode did not finish in {timeout}s")
+            return False
+        time.sleep(0.5)
+    return True
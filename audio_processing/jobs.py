@@ -0,0 +1,345 @@
+# audio_processing/jobs.py - طابور مهام المعالجة المحفوظ في قاعدة البيانات
+
+import os
+import socket
+import threading
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from .models import ProcessingJob, ProcessingRun
+from .cancellation import ProcessingCancelled
+
+logger = logging.getLogger(__name__)
+
+
+def get_worker_id():
+    """معرف فريد للعامل الحالي (اسم الجهاز + رقم العملية)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_lease_duration():
+    return timedelta(seconds=getattr(settings, 'PROCESSING_LEASE_SECONDS', 300))
+
+
+def get_active_job(meeting):
+    """المهمة المنتظرة أو قيد التنفيذ للاجتماع إن وجدت"""
+    return ProcessingJob.objects.filter(
+        meeting=meeting,
+        status__in=ProcessingJob.ACTIVE_STATUSES,
+    ).first()
+
+
+def get_audio_size(meeting):
+    """حجم الملف الصوتي (تقدير لطول الاجتماع عند الجدولة)"""
+    try:
+        return meeting.audio_file.size
+    except (OSError, ValueError):
+        return 0
+
+
+def enqueue_meeting(meeting, priority=ProcessingJob.PRIORITY_NORMAL):
+    """
+    إضافة اجتماع إلى طابور المعالجة
+    واجهة الويب تستدعي هذه الدالة فقط، والمعالجة الفعلية تتم في العامل
+
+    إذا كان للاجتماع مهمة نشطة يُعاد ربط الطلب بها بدلاً من إنشاء تشغيل ثانٍ،
+    والقيد الفريد في قاعدة البيانات يمنع الإنشاء المزدوج عند تزامن طلبين.
+    إذا طُلبت أولوية أعلى لمهمة منتظرة تُرفع أولويتها
+
+    Returns:
+        tuple: (job, created)
+    """
+    active_job = get_active_job(meeting)
+    if active_job:
+        logger.info(f"Meeting {meeting.id} already has active job {active_job.id}")
+        if priority < active_job.priority:
+            ProcessingJob.objects.filter(id=active_job.id).update(priority=priority)
+            active_job.priority = priority
+        return active_job, False
+
+    try:
+        with transaction.atomic():
+            job = ProcessingJob.objects.create(
+                meeting=meeting,
+                priority=priority,
+                audio_bytes=get_audio_size(meeting),
+            )
+    except IntegrityError:
+        # طلب آخر أنشأ المهمة في نفس اللحظة
+        return get_active_job(meeting), False
+
+    logger.info(f"Enqueued processing job {job.id} for meeting {meeting.id}")
+    return job, True
+
+
+def _claimable_jobs(now):
+    """المهام المنتظرة أو التي انتهى حجزها (عامل توقف أثناء التنفيذ)"""
+    max_attempts = getattr(settings, 'PROCESSING_MAX_ATTEMPTS', 3)
+    return ProcessingJob.objects.filter(
+        Q(status='queued') | Q(status='running', lease_expires_at__lt=now),
+        attempts__lt=max_attempts,
+        cancel_requested_at__isnull=True,
+    )
+
+
+def get_waiting_since(job):
+    """
+    بداية انتظار المهمة في الطابور
+
+    المهمة التي انتهى حجزها عادت إلى الانتظار عند انتهاء الحجز، لا عند إضافتها
+    أول مرة (مدة التشغيل السابق ليست انتظاراً في الطابور)
+    """
+    if job.status == 'running' and job.lease_expires_at is not None:
+        return job.lease_expires_at
+    return job.queued_at
+
+
+def effective_priority(job, now):
+    """
+    الأولوية بعد احتساب مدة الانتظار: كل PROCESSING_PRIORITY_AGING_SECONDS
+    ترفع المهمة درجة واحدة حتى لا تبقى مهام الأرشيف منتظرة إلى الأبد
+    """
+    aging = getattr(settings, 'PROCESSING_PRIORITY_AGING_SECONDS', 3600)
+    waited = (now - get_waiting_since(job)).total_seconds()
+    return max(ProcessingJob.PRIORITY_URGENT, job.priority - int(waited // aging))
+
+
+def get_user_usage(now):
+    """
+    استهلاك كل مستخدم للعمال في الحصة العادلة
+
+    Returns:
+        dict: user_id -> (المهام قيد التنفيذ + المنتهية خلال PROCESSING_FAIR_SHARE_WINDOW_SECONDS،
+        المهام المنتظرة)
+    """
+    window = timedelta(seconds=getattr(settings, 'PROCESSING_FAIR_SHARE_WINDOW_SECONDS', 3600))
+    running = Q(status='running', lease_expires_at__gte=now)
+    finished = Q(status__in=('done', 'failed'), finished_at__gte=now - window)
+    rows = (
+        ProcessingJob.objects.filter(running | finished | Q(status='queued'))
+        .values('meeting__created_by')
+        .annotate(
+            recent=Count('id', filter=running | finished),
+            queued=Count('id', filter=Q(status='queued')),
+        )
+    )
+    return {row['meeting__created_by']: (row['recent'], row['queued']) for row in rows}
+
+
+def order_candidates(candidates, now):
+    """
+    ترتيب المهام المرشحة حسب سياسة الجدولة:
+    1. الأولوية (عاجل، عادي، أرشيف) بعد احتساب مدة الانتظار
+    2. حصة عادلة: مهام المستخدم الأقل استهلاكاً أولاً (قيد التنفيذ + المنتهية مؤخراً)،
+       ثم الأقل مهاماً في الطابور، فلا يحجز من رفع دفعة كبيرة كل العمال تباعاً
+    3. الاجتماعات الأقصر ثم الأحدث تاريخاً
+    4. الأقدم في الطابور
+    """
+    usage = get_user_usage(now)
+
+    return sorted(candidates, key=lambda job: (
+        effective_priority(job, now),
+        usage.get(job.meeting.created_by_id, (0, 0)),
+        job.audio_bytes,
+        -job.meeting.date.toordinal(),
+        get_waiting_since(job),
+    ))
+
+
+def claim_next_job(worker_id):
+    """
+    حجز المهمة التالية للعامل حسب الأولوية والحصة العادلة بين المستخدمين
+
+    الحجز يتم بتحديث مشروط على الصف نفسه، لذلك لا يمكن لعاملين حجز نفس المهمة
+    حتى لو قرآ نفس المرشحين في نفس اللحظة
+
+    Returns:
+        ProcessingJob أو None إذا لم توجد مهام
+    """
+    now = timezone.now()
+    claimable = _claimable_jobs(now).select_related('meeting')
+
+    # الأعلى أولوية + الأقدم انتظاراً (حتى تصل المهام التي رفعتها مدة الانتظار)
+    candidates = {job.id: job for job in claimable.order_by('priority', 'queued_at')[:50]}
+    candidates.update({job.id: job for job in claimable.order_by('queued_at')[:50]})
+    candidates = list(candidates.values())
+
+    for candidate in order_candidates(candidates, now):
+        job = _claim(candidate, worker_id, now)
+        if job:
+            return job
+
+    return None
+
+
+def claim_job(job_id, worker_id):
+    """حجز مهمة محددة (للمعالجة الجماعية)، أو None إذا حجزها عامل آخر"""
+    now = timezone.now()
+    candidate = _claimable_jobs(now).filter(id=job_id).first()
+    if candidate is None:
+        return None
+    return _claim(candidate, worker_id, now)
+
+
+def _claim(candidate, worker_id, now):
+    waiting_since = get_waiting_since(candidate)
+    claimed = _claimable_jobs(now).filter(id=candidate.id).update(
+        status='running',
+        lease_owner=worker_id,
+        lease_expires_at=now + get_lease_duration(),
+        attempts=F('attempts') + 1,
+        queued_at=waiting_since,
+        wait_seconds=(now - waiting_since).total_seconds(),
+        started_at=now,
+        finished_at=None,
+    )
+    if not claimed:
+        return None
+
+    job = ProcessingJob.objects.select_related('meeting').get(id=candidate.id)
+    logger.info(
+        f"Worker {worker_id} claimed job {job.id} (attempt {job.attempts}, "
+        f"priority {job.priority}, waited {job.wait_seconds:.1f}s)"
+    )
+    return job
+
+
+def renew_lease(job, worker_id):
+    """تمديد حجز المهمة، ويعيد False إذا فقد العامل ملكيتها"""
+    renewed = ProcessingJob.objects.filter(
+        id=job.id,
+        status='running',
+        lease_owner=worker_id,
+    ).update(lease_expires_at=timezone.now() + get_lease_duration())
+    return bool(renewed)
+
+
+def complete_job(job, worker_id):
+    ProcessingJob.objects.filter(id=job.id, lease_owner=worker_id).update(
+        status='done',
+        lease_expires_at=None,
+        finished_at=timezone.now(),
+        error='',
+    )
+
+
+def fail_job(job, worker_id, error):
+    """
+    تسجيل فشل المهمة، وإعادتها إلى الطابور إذا بقيت محاولات
+    """
+    max_attempts = getattr(settings, 'PROCESSING_MAX_ATTEMPTS', 3)
+    job.refresh_from_db()
+    status = 'queued' if job.attempts < max_attempts else 'failed'
+
+    now = timezone.now()
+    ProcessingJob.objects.filter(id=job.id, lease_owner=worker_id).update(
+        status=status,
+        lease_expires_at=None,
+        queued_at=now,
+        finished_at=now,
+        error=str(error),
+    )
+    logger.warning(f"Job {job.id} failed (attempt {job.attempts}/{max_attempts}): {error}")
+
+
+def request_cancel(job):
+    """
+    إلغاء مهمة معالجة
+
+    المهمة المنتظرة تُلغى مباشرة. المهمة قيد التنفيذ يُعلَّم تشغيلها كملغى،
+    فيتوقف العامل عند نقطة الفحص التالية (بين المراحل أو داخل حلقات المراحل الطويلة)
+    ويحرر مكانه لمهمة أخرى
+
+    Returns:
+        bool: True إذا كانت المهمة نشطة وسُجل الإلغاء
+    """
+    now = timezone.now()
+
+    if ProcessingJob.objects.filter(id=job.id, status='queued').update(
+        status='cancelled', cancel_requested_at=now, finished_at=now
+    ):
+        logger.info(f"Cancelled queued job {job.id}")
+        return True
+
+    if not ProcessingJob.objects.filter(id=job.id, status='running').update(cancel_requested_at=now):
+        return False
+
+    ProcessingRun.objects.filter(job=job, status='running').update(
+        status='cancelled', finished_at=now, updated_at=now
+    )
+    # عامل توقف أثناء التنفيذ لن يصل إلى نقطة فحص، فتُلغى مهمته مباشرة
+    ProcessingJob.objects.filter(id=job.id, status='running', lease_expires_at__lt=now).update(
+        status='cancelled', lease_expires_at=None, finished_at=now
+    )
+    logger.info(f"Cancellation requested for running job {job.id}")
+    return True
+
+
+def cancel_job(job, worker_id):
+    """تسجيل توقف العامل عن مهمة أُلغيت"""
+    ProcessingJob.objects.filter(id=job.id, lease_owner=worker_id).update(
+        status='cancelled',
+        lease_expires_at=None,
+        finished_at=timezone.now(),
+    )
+
+
+def fail_exhausted_jobs():
+    """تحويل المهام المتروكة التي استنفدت محاولاتها إلى فاشلة"""
+    max_attempts = getattr(settings, 'PROCESSING_MAX_ATTEMPTS', 3)
+    return ProcessingJob.objects.filter(
+        status='running',
+        lease_expires_at__lt=timezone.now(),
+        attempts__gte=max_attempts,
+    ).update(status='failed', lease_expires_at=None, finished_at=timezone.now(),
+             error='انتهى الحجز بعد استنفاد جميع المحاولات')
+
+
+def cancel_abandoned_jobs():
+    """إنهاء المهام الملغاة التي توقف عاملها قبل الوصول إلى نقطة فحص"""
+    return ProcessingJob.objects.filter(
+        status='running',
+        lease_expires_at__lt=timezone.now(),
+        cancel_requested_at__isnull=False,
+    ).update(status='cancelled', lease_expires_at=None, finished_at=timezone.now())
+
+
+def run_job(job, worker_id):
+    """
+    تنفيذ مهمة محجوزة مع تجديد الحجز دورياً في خيط جانبي
+    """
+    from .tasks_enhanced import process_meeting_task
+
+    stop_heartbeat = threading.Event()
+    interval = get_lease_duration().total_seconds() / 3
+
+    def heartbeat():
+        try:
+            while not stop_heartbeat.wait(interval):
+                if not renew_lease(job, worker_id):
+                    logger.warning(f"Worker {worker_id} lost lease on job {job.id}")
+                    return
+        finally:
+            connection.close()
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+
+    try:
+        process_meeting_task(job.meeting_id, job=job)
+        complete_job(job, worker_id)
+        return True
+    except ProcessingCancelled:
+        logger.info(f"Job {job.id} cancelled")
+        cancel_job(job, worker_id)
+        return False
+    except Exception as e:
+        logger.error(f"Error running job {job.id}: {str(e)}")
+        fail_job(job, worker_id, e)
+        return False
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
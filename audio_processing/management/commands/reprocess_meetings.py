@@ -0,0 +1,259 @@
+# audio_processing/management/commands/reprocess_meetings.py
+
+import json
+import time
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from transcription.models import Meeting
+from audio_processing.models import ProcessingJob
+from audio_processing.jobs import enqueue_meeting, claim_job, run_job, get_worker_id
+from audio_processing.pipeline import invalidate_checkpoints
+from audio_processing.scheduler import init_django_process
+
+
+def parse_id_ranges(value):
+    """تحويل '1-20,35,40-45' إلى مجموعة أرقام"""
+    ids = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if '-' in part:
+                start, end = (int(bound) for bound in part.split('-', 1))
+                ids.update(range(min(start, end), max(start, end) + 1))
+            else:
+                ids.add(int(part))
+        except ValueError:
+            raise CommandError(f'نطاق غير صالح: {part}')
+    return ids
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'تاريخ غير صالح (الصيغة YYYY-MM-DD): {value}')
+
+
+def process_batch_job(job_id):
+    """
+    معالجة مهمة واحدة داخل عملية من مجمع المعالجة الجماعية
+
+    المهمة تُحجز بنفس آلية الطابور، فإذا سبق إليها عامل run_processing_worker تُتخطى.
+    الحالة retrying تعني أن المحاولة فشلت وأُعيدت المهمة إلى الطابور (بقيت لها محاولات)
+    """
+    worker_id = f"{get_worker_id()}/batch"
+    started = time.monotonic()
+
+    try:
+        job = claim_job(job_id, worker_id)
+        if job is None:
+            job = ProcessingJob.objects.get(id=job_id)
+            return {
+                'meeting_id': job.meeting_id,
+                'job_id': job_id,
+                'status': 'skipped',
+                'seconds': 0.0,
+                'error': 'المهمة محجوزة لعامل آخر أو غير قابلة للحجز',
+            }
+
+        run_job(job, worker_id)
+        job.refresh_from_db()
+        return {
+            'meeting_id': job.meeting_id,
+            'job_id': job_id,
+            # فشل وبقيت له محاولات فأعاده fail_job إلى الطابور: يُحسب منفصلاً عن الفشل النهائي
+            'status': 'retrying' if job.status == 'queued' else job.status,
+            'seconds': round(time.monotonic() - started, 2),
+            'audio_bytes': job.audio_bytes,
+            'attempts': job.attempts,
+            'error': job.error,
+        }
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'إعادة معالجة مجموعة من الاجتماعات بالتوازي (حسب الأرقام أو التاريخ أو غير المعالجة)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ids',
+            type=str,
+            help='أرقام الاجتماعات أو نطاقاتها، مثل: 1-20,35,40-45'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='الاجتماعات من هذا التاريخ (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            help='الاجتماعات حتى هذا التاريخ (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--unprocessed',
+            action='store_true',
+            help='الاجتماعات غير المعالجة فقط'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='جميع الاجتماعات (مثلاً بعد تحديث النماذج)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'PROCESSING_CONCURRENT_JOBS', 4),
+            help='عدد العمليات المتوازية'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='حذف نواتج المراحل المحفوظة للاجتماعات المختارة (ومكرراتها) وإعادة كل المراحل'
+        )
+        parser.add_argument(
+            '--enqueue-only',
+            action='store_true',
+            help='إضافة الاجتماعات إلى الطابور فقط وترك التنفيذ لـ run_processing_worker'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='عرض الاجتماعات المختارة بدون معالجتها'
+        )
+        parser.add_argument(
+            '--summary',
+            type=str,
+            help='مسار ملف JSON لملخص التوقيتات (الافتراضي: الطباعة في النهاية)'
+        )
+
+    def get_meetings(self, options):
+        if not any([options['ids'], options['since'], options['until'], options['unprocessed'], options['all']]):
+            raise CommandError('حدد الاجتماعات: --ids أو --since/--until أو --unprocessed أو --all')
+
+        meetings = Meeting.objects.all()
+        if options['ids']:
+            meetings = meetings.filter(id__in=parse_id_ranges(options['ids']))
+        if options['since']:
+            meetings = meetings.filter(date__gte=parse_date(options['since']))
+        if options['until']:
+            meetings = meetings.filter(date__lte=parse_date(options['until']))
+        if options['unprocessed']:
+            meetings = meetings.filter(processed=False)
+        return meetings.order_by('id')
+
+    def handle(self, *args, **options):
+        meetings = list(self.get_meetings(options))
+        if not meetings:
+            self.stdout.write(self.style.WARNING('لا توجد اجتماعات مطابقة'))
+            return
+
+        if options['dry_run']:
+            for meeting in meetings:
+                self.stdout.write(f'{meeting.id}\t{meeting.date}\t{meeting.title}')
+            self.stdout.write(f'عدد الاجتماعات: {len(meetings)}')
+            return
+
+        if options['force']:
+            # بدونه تُسترجع نواتج المراحل المحفوظة إذا لم تتغير مدخلاتها (النماذج وإصداراتها والإعدادات)
+            deleted = invalidate_checkpoints(meetings)
+            self.stdout.write(f'تم حذف {deleted} من نواتج المراحل المحفوظة')
+
+        # المعالجة الجماعية تدخل الطابور كأرشيف، فلا تؤخر الاجتماعات العاجلة لدى العمال
+        jobs = []
+        for meeting in meetings:
+            job, created = enqueue_meeting(meeting, priority=ProcessingJob.PRIORITY_BACKFILL)
+            jobs.append(job)
+        self.stdout.write(f'تمت إضافة {len(jobs)} اجتماع إلى طابور المعالجة')
+
+        if options['enqueue_only']:
+            return
+
+        workers = max(1, options['workers'])
+        self.stdout.write(f'بدء المعالجة بـ {workers} عمليات متوازية...')
+
+        started_at = timezone.now()
+        started = time.monotonic()
+        results = []
+
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_django_process,
+        )
+        try:
+            futures = {executor.submit(process_batch_job, job.id): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'meeting_id': job.meeting_id, 'job_id': job.id, 'status': 'failed',
+                              'seconds': 0.0, 'error': str(e)}
+                results.append(result)
+                self.report(result, len(results), len(jobs), time.monotonic() - started)
+        except KeyboardInterrupt:
+            # المهام التي لم تبدأ تبقى في الطابور ليكملها run_processing_worker
+            self.stdout.write(self.style.WARNING('\nتم الإيقاف، المهام المتبقية بقيت في الطابور'))
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+        self.write_summary(options, started_at, time.monotonic() - started, workers, results)
+
+    def report(self, result, done, total, elapsed):
+        """سطر تقدم لكل اجتماع مع الوقت المتبقي المقدر"""
+        remaining = elapsed / done * (total - done)
+        line = (f"[{done}/{total}] الاجتماع {result['meeting_id']}: {result['status']} "
+                f"({result['seconds']:.1f} ث) - المتبقي تقريباً {remaining / 60:.1f} دقيقة")
+
+        if result['status'] == 'done':
+            self.stdout.write(self.style.SUCCESS(line))
+        elif result['status'] in ('skipped', 'cancelled'):
+            self.stdout.write(self.style.WARNING(line))
+        elif result['status'] == 'retrying':
+            self.stdout.write(self.style.WARNING(f"{line}\n    {result.get('error', '')}"))
+        else:
+            self.stdout.write(self.style.ERROR(f"{line}\n    {result.get('error', '')}"))
+
+    def write_summary(self, options, started_at, wall_seconds, workers, results):
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+
+        processed_seconds = sum(result['seconds'] for result in results)
+        summary = {
+            'started_at': started_at.isoformat(),
+            'finished_at': timezone.now().isoformat(),
+            'workers': workers,
+            'total': len(results),
+            'counts': counts,
+            'wall_seconds': round(wall_seconds, 2),
+            'processing_seconds': round(processed_seconds, 2),
+            'speedup': round(processed_seconds / wall_seconds, 2) if wall_seconds else None,
+            'meetings': sorted(results, key=lambda result: result['meeting_id']),
+        }
+
+        output = json.dumps(summary, ensure_ascii=False, indent=2)
+        if options['summary']:
+            with open(options['summary'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            self.stdout.write(f"تم حفظ الملخص في {options['summary']}")
+        else:
+            self.stdout.write(output)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ انتهت المعالجة: {counts.get('done', 0)} من {len(results)} خلال {wall_seconds / 60:.1f} دقيقة"
+        ))
+        if counts.get('retrying'):
+            self.stdout.write(self.style.WARNING(
+                f"{counts['retrying']} اجتماع فشلت محاولته وبقي في الطابور ليعيده run_processing_worker"
+            ))
@@ -0,0 +1,145 @@
+# audio_processing/management/commands/run_processing_worker.py
+
+import threading
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from audio_processing.jobs import (
+    get_worker_id,
+    claim_next_job,
+    run_job,
+    fail_exhausted_jobs,
+    cancel_abandoned_jobs
+)
+from audio_processing.scheduler import configure_scheduler, shutdown_scheduler
+from audio_processing.uploads import expire_upload_sessions
+from audio_processing.ingest import run_ingest_loop
+
+
+class Command(BaseCommand):
+    help = 'تشغيل عامل معالجة الاجتماعات (يستلم المهام من طابور قاعدة البيانات)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='معالجة المهام المتوفرة حالياً ثم الخروج'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'PROCESSING_POLL_INTERVAL', 5),
+            help='عدد الثواني بين كل فحص للطابور عندما يكون فارغاً'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=getattr(settings, 'PROCESSING_CONCURRENT_JOBS', 4),
+            help='عدد الاجتماعات التي تُعالج في نفس الوقت'
+        )
+        parser.add_argument(
+            '--cpu-workers',
+            type=int,
+            default=None,
+            help='عدد عمليات مجمع المعالج (الافتراضي: عدد الأنوية)'
+        )
+        parser.add_argument(
+            '--io-workers',
+            type=int,
+            default=None,
+            help='عدد خيوط مجمع استدعاءات الـ API'
+        )
+
+    def handle(self, *args, **options):
+        self.once = options.get('once', False)
+        self.poll_interval = options['poll_interval']
+        self.stop_event = threading.Event()
+        concurrency = max(1, options['concurrency'])
+
+        scheduler = configure_scheduler(
+            cpu_workers=options.get('cpu_workers'),
+            io_workers=options.get('io_workers'),
+        )
+        self.stdout.write(
+            f'بدء العامل {get_worker_id()} ({concurrency} اجتماعات متزامنة، '
+            f'{scheduler.cpu_workers} عمليات للمعالج، {scheduler.io_workers} خيوط للـ API)...'
+        )
+
+        if getattr(settings, 'MODEL_PRELOAD', []):
+            for future in scheduler.warm_up():
+                future.add_done_callback(self.report_models)
+
+        threads = [
+            threading.Thread(target=self.job_loop, args=(f"{get_worker_id()}/{i}",), daemon=True)
+            for i in range(concurrency)
+        ]
+        if not self.once:
+            # فك ترميز التسجيلات أثناء رفعها، فتبدأ معالجتها بنسخة PCM جاهزة
+            threads.append(threading.Thread(
+                target=run_ingest_loop, args=(f"{get_worker_id()}/ingest", self.stop_event), daemon=True
+            ))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stop_event.set()
+            self.stdout.write(self.style.WARNING('\nتم إيقاف العامل'))
+        finally:
+            shutdown_scheduler()
+
+    def report_models(self, future):
+        """طباعة جاهزية نماذج عملية من مجمع المعالج بعد تحميلها"""
+        try:
+            status = future.result()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'تعذر بدء عملية المعالج: {e}'))
+            return
+
+        for name, model in status.items():
+            if model['state'] == 'ready':
+                self.stdout.write(self.style.SUCCESS(
+                    f"✓ النموذج {name} جاهز في العملية {model['pid']} ({model['seconds']} ث)"
+                ))
+            elif model['state'] == 'failed':
+                self.stdout.write(self.style.ERROR(
+                    f"✗ تعذر تحميل النموذج {name} في العملية {model['pid']}: {model['error']}"
+                ))
+
+    def job_loop(self, worker_id):
+        """حلقة خيط واحد: حجز مهمة، تنفيذها، ثم التالية"""
+        try:
+            while not self.stop_event.is_set():
+                fail_exhausted_jobs()
+                cancel_abandoned_jobs()
+                expire_upload_sessions()
+                job = claim_next_job(worker_id)
+
+                if job is None:
+                    if self.once:
+                        break
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+
+                self.stdout.write(f'معالجة الاجتماع {job.meeting_id} (مهمة {job.id})...')
+
+                if run_job(job, worker_id):
+                    self.stdout.write(
+                        self.style.SUCCESS(f'✓ تمت معالجة الاجتماع {job.meeting_id}')
+                    )
+                    continue
+
+                job.refresh_from_db(fields=['status'])
+                if job.status == 'cancelled':
+                    self.stdout.write(
+                        self.style.WARNING(f'أُلغيت معالجة الاجتماع {job.meeting_id}')
+                    )
+                else:
+                    self.stdout.write(
+                        self.style.ERROR(f'فشلت معالجة الاجتماع {job.meeting_id}')
+                    )
+        finally:
+            connection.close()
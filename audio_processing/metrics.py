@@ -0,0 +1,233 @@
+# audio_processing/metrics.py - قياس الزمن والموارد لكل مرحلة معالجة
+
+import sys
+import time
+import logging
+import threading
+
+try:
+    import resource
+except ImportError:  # غير متوفر على Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# عدادات الاستدعاءات الجارية في الخيط الحالي (البيانات المرفوعة إلى الـ API)
+_usage = threading.local()
+
+# قياس المرحلة الجارية في خيط المهمة
+_current = threading.local()
+
+# الفاصل بين قراءات الذاكرة المقيمة أثناء المراحل المنفذة في العامل
+RSS_SAMPLE_INTERVAL = 0.2
+
+
+def record_upload(nbytes):
+    """تسجيل حجم البيانات المرسلة إلى API بعيد (Whisper، GPT) من الخيط الحالي"""
+    _usage.bytes_uploaded = getattr(_usage, 'bytes_uploaded', 0) + nbytes
+
+
+def _uploaded():
+    return getattr(_usage, 'bytes_uploaded', 0)
+
+
+def _reset_peak_rss():
+    """تصفير أقصى ذاكرة للعملية (Linux) حتى يُقاس أقصى استهلاك للمرحلة وحدها"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def get_rss_mb():
+    """الذاكرة المقيمة الحالية للعملية بالميجابايت (Linux)، أو None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def get_peak_rss_mb():
+    """أقصى ذاكرة مقيمة للعملية الحالية بالميجابايت"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    # ru_maxrss بالكيلوبايت على Linux وبالبايت على macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measured_call(fn, args, kwargs, dedicated_process=False):
+    """
+    تنفيذ دالة مرحلة مع قياس استهلاكها، على مستوى الوحدة حتى تُرسل إلى مجمع العمليات
+
+    dedicated_process: العملية تنفذ هذه الدالة وحدها (مجمع المعالج)، فيُحسب زمن المعالج
+        لكل خيوطها (torch يستخدم عدة خيوط) ويُقاس أقصى استهلاك للذاكرة.
+        في مجمع الخيوط يُحسب زمن الخيط فقط ولا تُقاس الذاكرة (مشتركة مع باقي الاجتماعات)
+
+    Returns:
+        tuple: (ناتج الدالة، قاموس القياسات)
+    """
+    cpu_clock = time.process_time if dedicated_process else time.thread_time
+    if dedicated_process:
+        _reset_peak_rss()
+
+    cpu_start = cpu_clock()
+    uploaded_start = _uploaded()
+
+    result = fn(*args, **kwargs)
+
+    return result, {
+        'cpu_seconds': cpu_clock() - cpu_start,
+        'peak_rss_mb': get_peak_rss_mb() if dedicated_process else None,
+        'bytes_uploaded': _uploaded() - uploaded_start,
+    }
+
+
+class RssSampler:
+    """
+    خيط واحد لكل عملية يقرأ الذاكرة المقيمة دورياً ويرفع أقصى قيمة لكل مرحلة جارية
+
+    أقصى ذاكرة للعملية (VmHWM) لا يصلح للمراحل المنفذة في العامل: يشمل كل ما سبقها،
+    وتصفيره عند بدء مرحلة يفسد قياس المراحل المتزامنة في خيوط المهام الأخرى.
+    الخيط يتوقف عند انتهاء آخر مرحلة ويبدأ مع المرحلة التالية
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._meters = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, meter):
+        with self._lock:
+            self._meters.add(meter)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+                self._thread.start()
+
+    def remove(self, meter):
+        with self._lock:
+            self._meters.discard(meter)
+
+    def _run(self):
+        while True:
+            rss = get_rss_mb()
+            with self._lock:
+                if not self._meters or rss is None:
+                    self._thread = None
+                    return
+                for meter in self._meters:
+                    meter.observe_rss(rss)
+            time.sleep(self.interval)
+
+
+_sampler = RssSampler()
+
+
+class StageMeter:
+    """
+    قياسات مرحلة واحدة في خيط المهمة
+
+    يشمل زمن المعالج لخيط المهمة نفسه (العمل المنفذ مباشرة) مضافاً إليه
+    ما أرجعته الاستدعاءات المنفذة في المجمعات. أقصى ذاكرة للمرحلة من قراءات
+    RssSampler أثناءها (أو من عملية مجمع المعالج التي نفذتها)
+    """
+
+    def __init__(self, run, stage):
+        self.run = run
+        self.stage = stage
+        self.wall_start = time.monotonic()
+        self.cpu_start = time.thread_time()
+        self.uploaded_start = _uploaded()
+        self.pool_cpu_seconds = 0.0
+        self.pool_peak_rss_mb = None
+        self.pool_bytes_uploaded = 0
+        self.audio_seconds = None
+        self.from_checkpoint = False
+
+        self.peak_rss_mb = get_rss_mb()
+        if self.peak_rss_mb is not None:
+            _sampler.add(self)
+
+    def observe_rss(self, rss_mb):
+        if rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, rss_mb)
+
+    def add_call(self, stats):
+        self.pool_cpu_seconds += stats['cpu_seconds']
+        self.pool_bytes_uploaded += stats['bytes_uploaded']
+        if stats['peak_rss_mb'] is not None:
+            self.pool_peak_rss_mb = max(self.pool_peak_rss_mb or 0.0, stats['peak_rss_mb'])
+
+    def save(self):
+        from .models import StageMetric
+
+        _sampler.remove(self)
+        self.observe_rss(get_rss_mb())
+
+        # المراحل المنفذة في مجمع المعالج تسجل أقصى ذاكرة لعمليتها، والمراحل المنفذة
+        # في العامل أقصى ذاكرة مقيمة أثناءها (وبدون /proc أقصى ذاكرة لعملية العامل)
+        peak_rss_mb = self.pool_peak_rss_mb
+        if peak_rss_mb is None:
+            peak_rss_mb = self.peak_rss_mb if self.peak_rss_mb is not None else get_peak_rss_mb()
+
+        try:
+            StageMetric.objects.create(
+                run_id=self.run.id,
+                stage=self.stage,
+                wall_seconds=time.monotonic() - self.wall_start,
+                cpu_seconds=time.thread_time() - self.cpu_start + self.pool_cpu_seconds,
+                peak_rss_mb=peak_rss_mb,
+                audio_seconds=self.audio_seconds,
+                bytes_uploaded=_uploaded() - self.uploaded_start + self.pool_bytes_uploaded,
+                from_checkpoint=self.from_checkpoint,
+            )
+        except Exception as e:
+            # القياس لا يجب أن يوقف المعالجة
+            logger.warning(f"Could not save metrics for stage '{self.stage}' of run {self.run.id}: {e}")
+
+
+def begin_stage(run, stage):
+    """إنهاء قياس المرحلة السابقة وبدء قياس مرحلة جديدة"""
+    finish_stage()
+    if run is not None:
+        _current.meter = StageMeter(run, stage)
+
+
+def finish_stage():
+    meter = getattr(_current, 'meter', None)
+    if meter is not None:
+        _current.meter = None
+        meter.save()
+
+
+def add_call_stats(stats):
+    meter = getattr(_current, 'meter', None)
+    if meter is not None:
+        meter.add_call(stats)
+
+
+def record_audio(seconds):
+    """مدة الصوت الذي عالجته المرحلة الحالية (لحساب معامل الزمن الحقيقي)"""
+    meter = getattr(_current, 'meter', None)
+    if meter is not None:
+        meter.audio_seconds = seconds
+
+
+def mark_from_checkpoint():
+    meter = getattr(_current, 'meter', None)
+    if meter is not None:
+        meter.from_checkpoint = True
@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 13:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('transcription', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'مكتملة'), ('failed', 'فشلت')], db_index=True, default='queued', max_length=20, verbose_name='الحالة')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='عدد المحاولات')),
+                ('lease_owner', models.CharField(blank=True, max_length=200, verbose_name='العامل المالك')),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True, verbose_name='انتهاء الحجز')),
+                ('error', models.TextField(blank=True, verbose_name='آخر خطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإضافة')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='وقت البدء')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='وقت الانتهاء')),
+                ('meeting', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='processing_jobs', to='transcription.meeting')),
+            ],
+            options={
+                'verbose_name': 'مهمة معالجة',
+                'verbose_name_plural': 'مهام المعالجة',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-18 13:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0001_initial'),
+        ('audio_processing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=50, verbose_name='المرحلة')),
+                ('input_hash', models.CharField(max_length=64, verbose_name='بصمة المدخلات')),
+                ('artifact_path', models.CharField(max_length=500, verbose_name='مسار الناتج')),
+                ('completed_at', models.DateTimeField(auto_now=True, verbose_name='وقت الاكتمال')),
+                ('meeting', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='transcription.meeting')),
+            ],
+            options={
+                'verbose_name': 'مرحلة مكتملة',
+                'verbose_name_plural': 'المراحل المكتملة',
+                'ordering': ['completed_at'],
+                'unique_together': {('meeting', 'stage', 'input_hash')},
+            },
+        ),
+    ]
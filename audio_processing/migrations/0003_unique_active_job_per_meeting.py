@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio_processing', '0002_pipelinecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='processingjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('meeting',), name='unique_active_job_per_meeting'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 13:28
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio_processing', '0003_unique_active_job_per_meeting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='audio_bytes',
+            field=models.BigIntegerField(default=0, verbose_name='حجم الملف الصوتي'),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'عاجل'), (1, 'عادي'), (2, 'أرشيف (معالجة خلفية)')], default=1, verbose_name='الأولوية'),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='queued_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='وقت الدخول للطابور'),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='wait_seconds',
+            field=models.FloatField(blank=True, null=True, verbose_name='مدة الانتظار (بالثواني)'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 13:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0001_initial'),
+        ('audio_processing', '0004_job_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'قيد التنفيذ'), ('done', 'مكتمل'), ('failed', 'فشل')], default='running', max_length=20, verbose_name='الحالة')),
+                ('stage', models.CharField(choices=[('starting', 'بدء المعالجة'), ('embeddings', 'تحضير البصمات الصوتية'), ('diarization', 'تقسيم الصوت حسب المتحدثين'), ('transcription', 'نسخ محتوى الكلام'), ('speaker_attribution', 'تحديد هوية المتحدثين'), ('merge', 'دمج النص مع المتحدثين'), ('saving', 'حفظ النتائج'), ('report', 'استخراج القرارات والمهام'), ('finished', 'اكتملت المعالجة')], default='starting', max_length=50, verbose_name='المرحلة الحالية')),
+                ('stage_progress', models.FloatField(default=0.0, verbose_name='التقدم داخل المرحلة (%)')),
+                ('stage_started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='بداية المرحلة')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='وقت البدء')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='وقت الانتهاء')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+                ('error', models.TextField(blank=True, verbose_name='الخطأ')),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='runs', to='audio_processing.processingjob')),
+                ('meeting', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='processing_runs', to='transcription.meeting')),
+            ],
+            options={
+                'verbose_name': 'تشغيل معالجة',
+                'verbose_name_plural': 'تشغيلات المعالجة',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio_processing', '0005_processingrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='cancel_requested_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='وقت طلب الإلغاء'),
+        ),
+        migrations.AlterField(
+            model_name='processingjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'مكتملة'), ('failed', 'فشلت'), ('cancelled', 'ملغاة')], db_index=True, default='queued', max_length=20, verbose_name='الحالة'),
+        ),
+        migrations.AlterField(
+            model_name='processingrun',
+            name='status',
+            field=models.CharField(choices=[('running', 'قيد التنفيذ'), ('done', 'مكتمل'), ('failed', 'فشل'), ('cancelled', 'ملغى')], default='running', max_length=20, verbose_name='الحالة'),
+        ),
+    ]
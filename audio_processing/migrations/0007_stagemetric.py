@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 13:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio_processing', '0006_job_cancellation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('starting', 'بدء المعالجة'), ('embeddings', 'تحضير البصمات الصوتية'), ('diarization', 'تقسيم الصوت حسب المتحدثين'), ('transcription', 'نسخ محتوى الكلام'), ('speaker_attribution', 'تحديد هوية المتحدثين'), ('merge', 'دمج النص مع المتحدثين'), ('saving', 'حفظ النتائج'), ('report', 'استخراج القرارات والمهام'), ('finished', 'اكتملت المعالجة')], max_length=50, verbose_name='المرحلة')),
+                ('wall_seconds', models.FloatField(verbose_name='الزمن الفعلي (بالثواني)')),
+                ('cpu_seconds', models.FloatField(default=0.0, verbose_name='زمن المعالج (بالثواني)')),
+                ('peak_rss_mb', models.FloatField(blank=True, null=True, verbose_name='أقصى ذاكرة (MB)')),
+                ('audio_seconds', models.FloatField(blank=True, null=True, verbose_name='مدة الصوت المعالج (بالثواني)')),
+                ('bytes_uploaded', models.BigIntegerField(default=0, verbose_name='البيانات المرفوعة (بايت)')),
+                ('from_checkpoint', models.BooleanField(default=False, verbose_name='من ناتج محفوظ')),
+                ('recorded_at', models.DateTimeField(auto_now_add=True, verbose_name='وقت التسجيل')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metrics', to='audio_processing.processingrun')),
+            ],
+            options={
+                'verbose_name': 'قياس مرحلة',
+                'verbose_name_plural': 'قياسات المراحل',
+                'ordering': ['recorded_at'],
+            },
+        ),
+    ]
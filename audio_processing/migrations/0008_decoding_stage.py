@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio_processing', '0007_stagemetric'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processingrun',
+            name='stage',
+            field=models.CharField(choices=[('starting', 'بدء المعالجة'), ('decoding', 'فك ترميز الصوت'), ('embeddings', 'تحضير البصمات الصوتية'), ('diarization', 'تقسيم الصوت حسب المتحدثين'), ('transcription', 'نسخ محتوى الكلام'), ('speaker_attribution', 'تحديد هوية المتحدثين'), ('merge', 'دمج النص مع المتحدثين'), ('saving', 'حفظ النتائج'), ('report', 'استخراج القرارات والمهام'), ('finished', 'اكتملت المعالجة')], default='starting', max_length=50, verbose_name='المرحلة الحالية'),
+        ),
+        migrations.AlterField(
+            model_name='stagemetric',
+            name='stage',
+            field=models.CharField(choices=[('starting', 'بدء المعالجة'), ('decoding', 'فك ترميز الصوت'), ('embeddings', 'تحضير البصمات الصوتية'), ('diarization', 'تقسيم الصوت حسب المتحدثين'), ('transcription', 'نسخ محتوى الكلام'), ('speaker_attribution', 'تحديد هوية المتحدثين'), ('merge', 'دمج النص مع المتحدثين'), ('saving', 'حفظ النتائج'), ('report', 'استخراج القرارات والمهام'), ('finished', 'اكتملت المعالجة')], max_length=50, verbose_name='المرحلة'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-18 14:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transcription', '0002_meeting_audio_sha256'),
+        ('audio_processing', '0008_decoding_stage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='اسم الملف')),
+                ('size', models.BigIntegerField(verbose_name='الحجم الكلي')),
+                ('received', models.BigIntegerField(default=0, verbose_name='البايتات المستلمة')),
+                ('status', models.CharField(choices=[('uploading', 'قيد الرفع'), ('complete', 'مكتمل'), ('expired', 'منتهي الصلاحية')], db_index=True, default='uploading', max_length=20, verbose_name='الحالة')),
+                ('title', models.CharField(max_length=200, verbose_name='عنوان الاجتماع')),
+                ('date', models.DateField(verbose_name='تاريخ الاجتماع')),
+                ('description', models.TextField(blank=True, verbose_name='وصف الاجتماع')),
+                ('priority', models.PositiveSmallIntegerField(choices=[(0, 'عاجل'), (1, 'عادي'), (2, 'أرشيف (معالجة خلفية)')], default=1, verbose_name='أولوية المعالجة')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ البدء')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر جزء')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+                ('meeting', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='transcription.meeting')),
+            ],
+            options={
+                'verbose_name': 'جلسة رفع',
+                'verbose_name_plural': 'جلسات الرفع',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 14:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio_processing', '0009_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='ingest_lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='انتهاء حجز فك الترميز'),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='ingest_owner',
+            field=models.CharField(blank=True, max_length=200, verbose_name='عامل فك الترميز'),
+        ),
+    ]
@@ -1,3 +1,210 @@
+# audio_processing/models.py
+
+import uuid
+from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class ProcessingJob(models.Model):
+    """
+    مهمة معالجة اجتماع محفوظة في قاعدة البيانات
+    تضيفها واجهة الويب فقط، ويستلمها عامل منفصل (run_processing_worker) بحجز مؤقت
+    """
+    STATUS_CHOICES = (
+        ('queued', _('في الانتظار')),
+        ('running', _('قيد التنفيذ')),
+        ('done', _('مكتملة')),
+        ('failed', _('فشلت')),
+        ('cancelled', _('ملغاة')),
+    )
+
+    PRIORITY_URGENT = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_BACKFILL = 2
+    PRIORITY_CHOICES = (
+        (PRIORITY_URGENT, _('عاجل')),
+        (PRIORITY_NORMAL, _('عادي')),
+        (PRIORITY_BACKFILL, _('أرشيف (معالجة خلفية)')),
+    )
+
+    meeting = models.ForeignKey('transcription.Meeting', on_delete=models.CASCADE, related_name='processing_jobs')
+    status = models.CharField(_('الحالة'), max_length=20, choices=STATUS_CHOICES, default='queued', db_index=True)
+    priority = models.PositiveSmallIntegerField(_('الأولوية'), choices=PRIORITY_CHOICES, default=PRIORITY_NORMAL)
+    audio_bytes = models.BigIntegerField(_('حجم الملف الصوتي'), default=0)
+    attempts = models.PositiveIntegerField(_('عدد المحاولات'), default=0)
+    lease_owner = models.CharField(_('العامل المالك'), max_length=200, blank=True)
+    lease_expires_at = models.DateTimeField(_('انتهاء الحجز'), null=True, blank=True)
+    error = models.TextField(_('آخر خطأ'), blank=True)
+    created_at = models.DateTimeField(_('تاريخ الإضافة'), auto_now_add=True)
+    queued_at = models.DateTimeField(_('وقت الدخول للطابور'), default=timezone.now)
+    wait_seconds = models.FloatField(_('مدة الانتظار (بالثواني)'), null=True, blank=True)
+    started_at = models.DateTimeField(_('وقت البدء'), null=True, blank=True)
+    finished_at = models.DateTimeField(_('وقت الانتهاء'), null=True, blank=True)
+    cancel_requested_at = models.DateTimeField(_('وقت طلب الإلغاء'), null=True, blank=True)
+
+    ACTIVE_STATUSES = ('queued', 'running')
+
+    class Meta:
+        verbose_name = _('مهمة معالجة')
+        verbose_name_plural = _('مهام المعالجة')
+        ordering = ['created_at']
+        constraints = [
+            # مهمة نشطة واحدة فقط لكل اجتماع
+            models.UniqueConstraint(
+                fields=['meeting'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_job_per_meeting',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.meeting.title} - {self.get_status_display()}"
+
+
+class PipelineCheckpoint(models.Model):
+    """
+    سجل مرحلة مكتملة من مراحل معالجة الاجتماع
+    ناتج المرحلة محفوظ كملف JSON، ومفتاحه بصمة مدخلات المرحلة (الملف الصوتي + الإعدادات)
+    """
+    meeting = models.ForeignKey('transcription.Meeting', on_delete=models.CASCADE, related_name='checkpoints')
+    stage = models.CharField(_('المرحلة'), max_length=50)
+    input_hash = models.CharField(_('بصمة المدخلات'), max_length=64)
+    artifact_path = models.CharField(_('مسار الناتج'), max_length=500)
+    completed_at = models.DateTimeField(_('وقت الاكتمال'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('مرحلة مكتملة')
+        verbose_name_plural = _('المراحل المكتملة')
+        unique_together = ['meeting', 'stage', 'input_hash']
+        ordering = ['completed_at']
+
+    def __str__(self):
+        return f"{self.meeting.title} - {self.stage}"
+
+
+class ProcessingRun(models.Model):
+    """
+    تشغيل واحد لمعالجة اجتماع: المرحلة الحالية ونسبة التقدم داخلها
+    يحدّثه مسار المعالجة في tasks_enhanced وتقرؤه صفحة حالة المعالجة
+    """
+    STATUS_CHOICES = (
+        ('running', _('قيد التنفيذ')),
+        ('done', _('مكتمل')),
+        ('failed', _('فشل')),
+        ('cancelled', _('ملغى')),
+    )
+
+    STAGE_CHOICES = (
+        ('starting', _('بدء المعالجة')),
+        ('decoding', _('فك ترميز الصوت')),
+        ('embeddings', _('تحضير البصمات الصوتية')),
+        ('diarization', _('تقسيم الصوت حسب المتحدثين')),
+        ('transcription', _('نسخ محتوى الكلام')),
+        ('speaker_attribution', _('تحديد هوية المتحدثين')),
+        ('merge', _('دمج النص مع المتحدثين')),
+        ('saving', _('حفظ النتائج')),
+        ('report', _('استخراج القرارات والمهام')),
+        ('finished', _('اكتملت المعالجة')),
+    )
+
+    meeting = models.ForeignKey('transcription.Meeting', on_delete=models.CASCADE, related_name='processing_runs')
+    job = models.ForeignKey(ProcessingJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='runs')
+    status = models.CharField(_('الحالة'), max_length=20, choices=STATUS_CHOICES, default='running')
+    stage = models.CharField(_('المرحلة الحالية'), max_length=50, choices=STAGE_CHOICES, default='starting')
+    stage_progress = models.FloatField(_('التقدم داخل المرحلة (%)'), default=0.0)
+    stage_started_at = models.DateTimeField(_('بداية المرحلة'), default=timezone.now)
+    started_at = models.DateTimeField(_('وقت البدء'), auto_now_add=True)
+    finished_at = models.DateTimeField(_('وقت الانتهاء'), null=True, blank=True)
+    updated_at = models.DateTimeField(_('آخر تحديث'), auto_now=True)
+    error = models.TextField(_('الخطأ'), blank=True)
+
+    class Meta:
+        verbose_name = _('تشغيل معالجة')
+        verbose_name_plural = _('تشغيلات المعالجة')
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.meeting.title} - {self.get_stage_display()}"
+
+
+class StageMetric(models.Model):
+    """
+    قياسات مرحلة واحدة من تشغيل معالجة (الزمن، المعالج، الذاكرة، حجم الرفع)
+    لمتابعة معامل الزمن الحقيقي لكل مرحلة واكتشاف التراجع بعد تحديث النماذج أو المكتبات
+    """
+    run = models.ForeignKey(ProcessingRun, on_delete=models.CASCADE, related_name='metrics')
+    stage = models.CharField(_('المرحلة'), max_length=50, choices=ProcessingRun.STAGE_CHOICES)
+    wall_seconds = models.FloatField(_('الزمن الفعلي (بالثواني)'))
+    cpu_seconds = models.FloatField(_('زمن المعالج (بالثواني)'), default=0.0)
+    peak_rss_mb = models.FloatField(_('أقصى ذاكرة (MB)'), null=True, blank=True)
+    audio_seconds = models.FloatField(_('مدة الصوت المعالج (بالثواني)'), null=True, blank=True)
+    bytes_uploaded = models.BigIntegerField(_('البيانات المرفوعة (بايت)'), default=0)
+    from_checkpoint = models.BooleanField(_('من ناتج محفوظ'), default=False)
+    recorded_at = models.DateTimeField(_('وقت التسجيل'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('قياس مرحلة')
+        verbose_name_plural = _('قياسات المراحل')
+        ordering = ['recorded_at']
+
+    def __str__(self):
+        return f"{self.run} - {self.get_stage_display()}"
+
+    @property
+    def real_time_factor(self):
+        """زمن المعالجة مقسوماً على مدة الصوت (أقل من 1 = أسرع من الزمن الحقيقي)"""
+        if not self.audio_seconds:
+            return None
+        return self.wall_seconds / self.audio_seconds
+
+
+class UploadSession(models.Model):
+    """
+    رفع ملف اجتماع على أجزاء قابل للاستئناف (audio_processing.uploads)
+    الأجزاء تُكتب بالترتيب في ملف .part، وعند الاكتمال يُنشأ الاجتماع ويُضاف إلى طابور المعالجة.
+    أثناء الرفع يفك أحد العمال ترميز الأجزاء المستلمة (audio_processing.ingest)
+    """
+    STATUS_CHOICES = (
+        ('uploading', _('قيد الرفع')),
+        ('complete', _('مكتمل')),
+        ('expired', _('منتهي الصلاحية')),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(_('اسم الملف'), max_length=255)
+    size = models.BigIntegerField(_('الحجم الكلي'))
+    received = models.BigIntegerField(_('البايتات المستلمة'), default=0)
+    status = models.CharField(_('الحالة'), max_length=20, choices=STATUS_CHOICES, default='uploading', db_index=True)
+
+    # بيانات الاجتماع الذي يُنشأ عند اكتمال الرفع
+    title = models.CharField(_('عنوان الاجتماع'), max_length=200)
+    date = models.DateField(_('تاريخ الاجتماع'))
+    description = models.TextField(_('وصف الاجتماع'), blank=True)
+    priority = models.PositiveSmallIntegerField(
+        _('أولوية المعالجة'), choices=ProcessingJob.PRIORITY_CHOICES, default=ProcessingJob.PRIORITY_NORMAL
+    )
+    meeting = models.ForeignKey(
+        'transcription.Meeting', on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_sessions'
+    )
+
+    # العامل الذي يفك ترميز الأجزاء أثناء الرفع (audio_processing.ingest)
+    ingest_owner = models.CharField(_('عامل فك الترميز'), max_length=200, blank=True)
+    ingest_lease_expires_at = models.DateTimeField(_('انتهاء حجز فك الترميز'), null=True, blank=True)
+
+    created_at = models.DateTimeField(_('تاريخ البدء'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('آخر جزء'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('جلسة رفع')
+        verbose_name_plural = _('جلسات الرفع')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
 
-# Create your models here.
+    @property
+    def progress_percent(self):
+        return int(self.received * 100 / self.size) if self.size else 0
@@ -0,0 +1,226 @@
+# audio_processing/pipeline.py - مراحل معالجة قابلة للاستئناف
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import importlib.metadata
+from django.conf import settings
+from transcription.models import Meeting
+from .models import PipelineCheckpoint
+from .progress import set_stage, progress_callback, report_progress
+from .metrics import record_audio, mark_from_checkpoint
+from .utils.preprocessing import get_audio_duration, reuse_pcm
+
+logger = logging.getLogger(__name__)
+
+
+def compute_file_hash(file_path, block_size=1024 * 1024):
+    """حساب SHA-256 لملف بالقراءة على دفعات (بدون تحميله كاملاً في الذاكرة)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compute_upload_hash(uploaded_file):
+    """حساب SHA-256 لملف مرفوع من أجزائه (قبل حفظه أو تحميله كاملاً في الذاكرة)"""
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_meeting_audio_hash(meeting):
+    """بصمة صوت الاجتماع المحفوظة، وتُحسب وتُحفظ للاجتماعات المرفوعة قبل إضافتها"""
+    if not meeting.audio_sha256:
+        meeting.audio_sha256 = compute_file_hash(meeting.audio_file.path)
+        Meeting.objects.filter(id=meeting.id).update(audio_sha256=meeting.audio_sha256)
+    return meeting.audio_sha256
+
+
+def find_duplicate_meetings(meeting):
+    """الاجتماعات الأخرى التي رُفع لها نفس التسجيل (الأحدث معالجةً أولاً)"""
+    if not meeting.audio_sha256:
+        return Meeting.objects.none()
+    return Meeting.objects.filter(audio_sha256=meeting.audio_sha256).exclude(id=meeting.id).order_by('-processed', '-id')
+
+
+def package_versions(*names):
+    """إصدارات المكتبات التي تؤثر على ناتج مرحلة (تُضاف إلى مدخلاتها، فترقيتها تعيد المرحلة)"""
+    versions = {}
+    for name in names:
+        try:
+            versions[name] = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def get_artifacts_dir(meeting):
+    base_dir = getattr(settings, 'PIPELINE_ARTIFACTS_DIR', os.path.join(settings.MEDIA_ROOT, 'pipeline_artifacts'))
+    return os.path.join(base_dir, str(meeting.id))
+
+
+class MeetingPipeline:
+    """
+    تنفيذ مراحل معالجة اجتماع مع حفظ ناتج كل مرحلة
+
+    كل مرحلة لها مفتاح مبني على بصمة الملف الصوتي ومدخلات المرحلة،
+    فإذا أُعيدت المعالجة (محاولة جديدة أو إعادة معالجة من لوحة الإدارة)
+    تُقرأ نواتج المراحل المكتملة بدلاً من إعادة diarization أو رفع الصوت إلى Whisper.
+    المفتاح مبني على محتوى الملف لا على الاجتماع، فإذا رُفع نفس التسجيل مرة أخرى
+    تُنسخ نواتج الاجتماع الأول
+    """
+
+    def __init__(self, meeting, run=None):
+        self.meeting = meeting
+        self.run = run
+        self.audio_hash = get_meeting_audio_hash(meeting)
+        self.stage_keys = {}
+        self._audio_seconds = None
+
+    @property
+    def progress(self):
+        """دالة تقدم المرحلة الجارية (تُقرأ داخل دالة المرحلة بعد الانتقال إليها)"""
+        return progress_callback(self.run)
+
+    @property
+    def audio_seconds(self):
+        """مدة صوت الاجتماع (تُقرأ مرة واحدة عند الحاجة)"""
+        if self._audio_seconds is None:
+            self._audio_seconds = get_audio_duration(self.meeting.audio_file.path)
+        return self._audio_seconds
+
+    def stage_key(self, stage, inputs=None):
+        # PIPELINE_CACHE_VERSION يُزاد يدوياً لإبطال كل النواتج المحفوظة بعد تغيير لا تلتقطه المدخلات
+        version = getattr(settings, 'PIPELINE_CACHE_VERSION', 1)
+        payload = json.dumps([self.audio_hash, stage, inputs, version], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def load_artifact(self, stage, key):
+        checkpoint = PipelineCheckpoint.objects.filter(
+            meeting=self.meeting, stage=stage, input_hash=key
+        ).first()
+        if checkpoint is not None:
+            result = self.read_artifact(checkpoint)
+            if result is not None:
+                return result, True
+
+        return self.clone_artifact(stage, key)
+
+    def read_artifact(self, checkpoint):
+        if not os.path.exists(checkpoint.artifact_path):
+            return None
+        try:
+            with open(checkpoint.artifact_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable artifact for stage {checkpoint.stage} of meeting {checkpoint.meeting_id}: {e}")
+            return None
+
+    def clone_artifact(self, stage, key):
+        """
+        نسخ ناتج نفس المرحلة بنفس المفتاح من اجتماع آخر (نفس التسجيل ونفس الإعدادات)
+
+        الناتج يُنسخ إلى مجلد هذا الاجتماع حتى لا يتأثر بحذف الاجتماع الأصلي
+        """
+        checkpoints = PipelineCheckpoint.objects.filter(
+            stage=stage, input_hash=key
+        ).exclude(meeting=self.meeting).order_by('-completed_at')
+
+        for checkpoint in checkpoints:
+            result = self.read_artifact(checkpoint)
+            if result is not None:
+                logger.info(f"Meeting {self.meeting.id}: reusing '{stage}' from duplicate meeting {checkpoint.meeting_id}")
+                self.save_artifact(stage, key, result)
+                return result, True
+        return None, False
+
+    def save_artifact(self, stage, key, result):
+        artifacts_dir = get_artifacts_dir(self.meeting)
+        os.makedirs(artifacts_dir, exist_ok=True)
+        artifact_path = os.path.join(artifacts_dir, f"{stage}-{key[:16]}.json")
+
+        # الكتابة إلى ملف مؤقت ثم الاستبدال، حتى لا يبقى ناتج نصف مكتوب
+        temp_path = f"{artifact_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(temp_path, artifact_path)
+
+        PipelineCheckpoint.objects.update_or_create(
+            meeting=self.meeting, stage=stage, input_hash=key,
+            defaults={'artifact_path': artifact_path}
+        )
+
+    def run_stage(self, stage, fn, inputs=None, audio=False):
+        """
+        تنفيذ مرحلة أو استرجاع ناتجها المحفوظ
+
+        Args:
+            stage: اسم المرحلة
+            fn: دالة بدون وسائط تنفذ المرحلة وتعيد ناتجاً قابلاً للتحويل إلى JSON
+                (يمكنها تسجيل تقدمها عبر self.progress)
+            inputs: ما تعتمد عليه المرحلة غير الملف الصوتي (إعدادات، مفاتيح مراحل سابقة)
+            audio: المرحلة تعالج صوت الاجتماع كاملاً، فتُسجل مدته في قياساتها
+
+        Returns:
+            ناتج المرحلة
+        """
+        key = self.stage_key(stage, inputs)
+        self.stage_keys[stage] = key
+        set_stage(self.run, stage)
+        if audio:
+            record_audio(self.audio_seconds)
+
+        result, found = self.load_artifact(stage, key)
+        if found:
+            logger.info(f"Meeting {self.meeting.id}: resuming from saved '{stage}' artifact")
+            mark_from_checkpoint()
+            if self.run is not None:
+                report_progress(self.run.id, stage, 1, 1)
+            return result
+
+        logger.info(f"Meeting {self.meeting.id}: running stage '{stage}'")
+        result = fn()
+        self.save_artifact(stage, key, result)
+        if self.run is not None:
+            report_progress(self.run.id, stage, 1, 1)
+        return result
+
+    def reuse_decoded_audio(self):
+        """ربط نسخة PCM لاجتماع مطابق بدلاً من فك ترميز نفس التسجيل مرة أخرى"""
+        for duplicate in find_duplicate_meetings(self.meeting):
+            if reuse_pcm(self.meeting.audio_file.path, duplicate.audio_file.path):
+                logger.info(f"Meeting {self.meeting.id}: reusing decoded audio of meeting {duplicate.id}")
+                return True
+        return False
+
+    def completed_stages(self):
+        return list(
+            PipelineCheckpoint.objects.filter(meeting=self.meeting).values_list('stage', flat=True)
+        )
+
+
+def invalidate_checkpoints(meetings):
+    """
+    حذف نواتج المراحل المحفوظة للاجتماعات وملفاتها، فتُعاد كل المراحل عند المعالجة التالية
+
+    تُحذف أيضاً نواتج الاجتماعات المكررة (نفس التسجيل)، وإلا نُسخت منها مرة أخرى (clone_artifact)
+
+    Returns:
+        int: عدد النواتج المحذوفة
+    """
+    meeting_ids = {meeting.id for meeting in meetings}
+    hashes = {meeting.audio_sha256 for meeting in meetings if meeting.audio_sha256}
+    if hashes:
+        meeting_ids.update(Meeting.objects.filter(audio_sha256__in=hashes).values_list('id', flat=True))
+
+    deleted, _ = PipelineCheckpoint.objects.filter(meeting_id__in=meeting_ids).delete()
+    for meeting in Meeting.objects.filter(id__in=meeting_ids):
+        shutil.rmtree(get_artifacts_dir(meeting), ignore_errors=True)
+
+    logger.info(f"Invalidated {deleted} checkpoints of {len(meeting_ids)} meetings")
+    return deleted
@@ -0,0 +1,199 @@
+# audio_processing/progress.py - تسجيل تقدم مراحل المعالجة
+
+import time
+import logging
+from functools import partial
+from django.utils import timezone
+from django.db.models import OuterRef, Subquery
+from .models import ProcessingJob, ProcessingRun
+from .cancellation import ProcessingCancelled, enter_stage, leave_run
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# آخر وقت كُتب فيه التقدم لكل تشغيل، حتى لا تُكتب قاعدة البيانات مع كل مقطع
+_last_report = {}
+REPORT_INTERVAL = 1.0
+
+
+def start_run(meeting, job=None):
+    return ProcessingRun.objects.create(meeting=meeting, job=job)
+
+
+def set_stage(run, stage):
+    """
+    الانتقال إلى مرحلة جديدة
+
+    هذه أيضاً نقطة فحص للإلغاء بين المراحل: إذا لم يعد التشغيل قيد التنفيذ
+    تُثار ProcessingCancelled بدلاً من بدء المرحلة
+    """
+    if run is None:
+        return
+    now = timezone.now()
+    updated = ProcessingRun.objects.filter(id=run.id, status='running').update(
+        stage=stage,
+        stage_progress=0.0,
+        stage_started_at=now,
+        updated_at=now,
+    )
+    if not updated:
+        raise ProcessingCancelled(f"Run {run.id} was cancelled before stage '{stage}'")
+
+    run.stage = stage
+    run.stage_progress = 0.0
+    enter_stage(run, stage)
+    metrics.begin_stage(run, stage)
+    logger.info(f"Meeting {run.meeting_id}: stage '{stage}'")
+
+
+def report_progress(run_id, stage, done, total):
+    """
+    تسجيل التقدم داخل المرحلة الحالية (مثلاً عدد مقاطع diarization المعالجة)
+
+    دالة على مستوى الوحدة حتى يمكن تمريرها عبر partial إلى عمليات مجمع المعالج.
+    كل تسجيل هو أيضاً نقطة فحص للإلغاء: إذا أُلغي التشغيل أو تجاوز هذه المرحلة
+    (بسبب انتهاء مهلتها) تُثار ProcessingCancelled فتتوقف المرحلة وتحرر العملية
+    """
+    if not total:
+        return
+
+    now = time.monotonic()
+    finished = done >= total
+    if not finished and now - _last_report.get(run_id, 0) < REPORT_INTERVAL:
+        return
+    _last_report[run_id] = now
+
+    updated = ProcessingRun.objects.filter(id=run_id, status='running', stage=stage).update(
+        stage_progress=min(100.0, 100.0 * done / total),
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        raise ProcessingCancelled(f"Run {run_id} is no longer in stage '{stage}'")
+
+
+def progress_callback(run):
+    """دالة تقدم للمرحلة الحالية قابلة للتمرير إلى المراحل، أو None إذا لم يوجد تشغيل"""
+    if run is None:
+        return None
+    return partial(report_progress, run.id, run.stage)
+
+
+def finish_run(run):
+    if run is None:
+        return
+    now = timezone.now()
+    ProcessingRun.objects.filter(id=run.id).update(
+        status='done',
+        stage='finished',
+        stage_progress=100.0,
+        stage_started_at=now,
+        finished_at=now,
+        updated_at=now,
+    )
+    _last_report.pop(run.id, None)
+    metrics.finish_stage()
+    leave_run()
+
+
+def fail_run(run, error):
+    if run is None:
+        return
+    now = timezone.now()
+    # التشغيل الملغى يبقى ملغى
+    ProcessingRun.objects.filter(id=run.id, status='running').update(
+        status='failed',
+        finished_at=now,
+        updated_at=now,
+        error=str(error),
+    )
+    _last_report.pop(run.id, None)
+    metrics.finish_stage()
+    leave_run()
+
+
+def serialize_run(run):
+    """بيانات التشغيل كما تعرضها صفحة حالة المعالجة"""
+    if run is None:
+        return None
+
+    stages = [stage for stage, _ in ProcessingRun.STAGE_CHOICES]
+    return {
+        'id': run.id,
+        'status': run.status,
+        'stage': run.stage,
+        'stage_display': str(run.get_stage_display()),
+        'stage_index': stages.index(run.stage) if run.stage in stages else 0,
+        'stage_count': len(stages),
+        'stage_progress': round(run.stage_progress, 1),
+        'stage_started_at': run.stage_started_at.isoformat() if run.stage_started_at else None,
+        'started_at': run.started_at.isoformat() if run.started_at else None,
+        'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+        'error': run.error,
+    }
+
+
+def build_status_payload(meeting):
+    """حالة معالجة الاجتماع كما تعيدها check_status ويبثها stream_status"""
+    job = meeting.processing_jobs.order_by('-created_at').first()
+
+    return {
+        'processed': meeting.processed,
+        'id': meeting.id,
+        'title': meeting.title,
+        'job': {
+            'status': job.status,
+            'priority': str(job.get_priority_display()),
+            'cancel_requested': job.cancel_requested_at is not None,
+        } if job else None,
+        'run': serialize_run(meeting.processing_runs.first()),
+    }
+
+
+def get_status_signature(meeting_id):
+    """
+    بصمة مختصرة لحالة المعالجة (استعلام واحد بدون تحميل الكائنات)
+
+    تتغير عند اكتمال الاجتماع أو تغير حالة آخر مهمة، أو تغير حالة آخر تشغيل أو مرحلته
+    أو نسبة تقدمه (بالعدد الصحيح)، فيُعاد بناء الحالة الكاملة وإرسالها فقط عند تغير البصمة.
+    updated_at لا يدخل فيها: يتغير مع كل تسجيل تقدم حتى لو لم يتغير ما تعرضه الصفحة
+    """
+    return get_status_signatures([meeting_id]).get(meeting_id)
+
+
+def get_status_signatures(meeting_ids):
+    """
+    بصمات عدة اجتماعات في استعلام واحد (StatusPoller يفحص كل البثوث المفتوحة معاً)
+
+    Returns:
+        dict: meeting_id -> البصمة (لا يظهر الاجتماع المحذوف)
+    """
+    from transcription.models import Meeting
+
+    latest_run = ProcessingRun.objects.filter(meeting=OuterRef('pk')).order_by('-started_at')
+    latest_job = ProcessingJob.objects.filter(meeting=OuterRef('pk')).order_by('-created_at')
+    rows = Meeting.objects.filter(id__in=meeting_ids).annotate(
+        run_id=Subquery(latest_run.values('id')[:1]),
+        run_status=Subquery(latest_run.values('status')[:1]),
+        run_stage=Subquery(latest_run.values('stage')[:1]),
+        run_progress=Subquery(latest_run.values('stage_progress')[:1]),
+        job_status=Subquery(latest_job.values('status')[:1]),
+        job_cancel_requested_at=Subquery(latest_job.values('cancel_requested_at')[:1]),
+    ).values_list(
+        'id', 'processed', 'run_id', 'run_status', 'run_stage', 'run_progress', 'job_status', 'job_cancel_requested_at'
+    )
+    return {
+        meeting_id: (processed, run_id, run_status, run_stage,
+                     int(run_progress) if run_progress is not None else None, job_status, cancel_requested_at)
+        for meeting_id, processed, run_id, run_status, run_stage, run_progress, job_status, cancel_requested_at in rows
+    }
+
+
+def is_final_status(payload):
+    """لن تتغير الحالة بعد الآن: اكتملت المعالجة، أو فشلت أو أُلغيت بلا محاولة منتظرة"""
+    if payload['processed']:
+        return True
+    job = payload['job']
+    if job is not None:
+        return job['status'] in ('failed', 'cancelled')
+    run = payload['run']
+    return run is not None and run['status'] in ('failed', 'cancelled')
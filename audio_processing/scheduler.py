@@ -0,0 +1,155 @@
+# audio_processing/scheduler.py - تشغيل مراحل المعالجة في مجمعات حسب نوع المورد
+
+import os
+import multiprocessing
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from .cancellation import wait_for
+from .metrics import measured_call, add_call_stats
+
+logger = logging.getLogger(__name__)
+
+_scheduler = None
+
+
+def init_django_process():
+    """
+    تهيئة Django داخل عملية المجمع (تعمل بطريقة spawn لتجنب مشاركة اتصالات قاعدة البيانات)
+    ثم تحميل نماذج MODEL_PRELOAD، فلا يدفع أول اجتماع في العملية وقت تحميلها
+    """
+    import django
+    django.setup()
+
+    from speaker_identification.utils.model_registry import preload_models
+    preload_models()
+
+
+def get_model_status():
+    """حالة نماذج العملية الحالية (تُنفذ في عملية المجمع عبر warm_up)"""
+    from speaker_identification.utils.model_registry import registry
+    return registry.status()
+
+
+class StageScheduler:
+    """
+    مجمعان منفصلان لمراحل المعالجة:
+    - مجمع عمليات بعدد الأنوية للمراحل الحسابية (تحويل الصوت، diarization، البصمات)
+    - مجمع خيوط أكبر لاستدعاءات الـ API البعيدة (Whisper و GPT) التي تقضي وقتها في الانتظار
+
+    بهذا يمكن لاجتماع أن يستخدم المعالج بينما ينتظر اجتماع آخر رد Whisper
+    """
+
+    def __init__(self, cpu_workers=None, io_workers=None):
+        cpu_count = os.cpu_count() or 1
+        self.cpu_workers = max(1, min(cpu_workers or cpu_count, cpu_count))
+        self.io_workers = io_workers or getattr(settings, 'PROCESSING_IO_WORKERS', 16)
+
+        self.cpu_pool = ProcessPoolExecutor(
+            max_workers=self.cpu_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_django_process,
+        )
+        self.io_pool = ThreadPoolExecutor(
+            max_workers=self.io_workers,
+            thread_name_prefix='processing-io',
+        )
+        logger.info(f"Stage scheduler started: {self.cpu_workers} CPU processes, {self.io_workers} I/O threads")
+
+    def warm_up(self):
+        """
+        بدء كل عمليات المجمع الآن بدلاً من أول مرحلة حسابية
+
+        المجمع يبدأ عملية جديدة لكل مهمة لا تجد عملية متفرغة، فإرسال مهمة لكل عملية
+        يبدؤها جميعاً وتحمّل النماذج (init_django_process) قبل وصول أول اجتماع
+
+        Returns:
+            list: futures بحالة نماذج كل عملية
+        """
+        return [self.cpu_pool.submit(get_model_status) for _ in range(self.cpu_workers)]
+
+    def submit_cpu(self, fn, *args, **kwargs):
+        return self.cpu_pool.submit(fn, *args, **kwargs)
+
+    def submit_io(self, fn, *args, **kwargs):
+        return self.io_pool.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        self.io_pool.shutdown(wait=wait)
+        self.cpu_pool.shutdown(wait=wait)
+
+
+def configure_scheduler(cpu_workers=None, io_workers=None):
+    """إنشاء المجمعات المشتركة للعملية الحالية (يستدعيها العامل عند بدء التشغيل)"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = StageScheduler(
+            cpu_workers=cpu_workers or getattr(settings, 'PROCESSING_CPU_WORKERS', None),
+            io_workers=io_workers,
+        )
+    return _scheduler
+
+
+def shutdown_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown()
+        _scheduler = None
+
+
+def run_cpu(fn, *args, **kwargs):
+    """
+    تشغيل مرحلة حسابية في مجمع العمليات
+
+    إذا لم يتم إعداد المجمعات (مثل السكربتات اليدوية) تُنفذ الدالة مباشرة
+    الدالة ووسائطها يجب أن تكون قابلة للـ pickle (دوال على مستوى الوحدة)
+    الانتظار يحترم مهلة المرحلة الحالية وإلغاء التشغيل (cancellation.wait_for)
+    """
+    if _scheduler is None:
+        return fn(*args, **kwargs)
+    result, stats = wait_for(_scheduler.submit_cpu(measured_call, fn, args, kwargs, True))
+    add_call_stats(stats)
+    return result
+
+
+def run_io(fn, *args, **kwargs):
+    """تشغيل استدعاء API في مجمع الخيوط"""
+    if _scheduler is None:
+        return fn(*args, **kwargs)
+    result, stats = wait_for(_scheduler.submit_io(measured_call, fn, args, kwargs))
+    add_call_stats(stats)
+    return result
+
+
+def map_io(fn, items, progress=None):
+    """
+    تشغيل عدة استدعاءات API متزامنة مع الحفاظ على ترتيب النتائج
+
+    progress: دالة اختيارية (done, total) تُستدعى كلما اكتمل استدعاء
+    """
+    items = list(items)
+    total = len(items)
+
+    if _scheduler is None:
+        results = []
+        for item in items:
+            results.append(fn(item))
+            if progress:
+                progress(len(results), total)
+        return results
+
+    futures = [_scheduler.submit_io(measured_call, fn, (item,), {}) for item in items]
+    results = []
+    try:
+        for future in futures:
+            result, stats = wait_for(future)
+            add_call_stats(stats)
+            results.append(result)
+            if progress:
+                progress(len(results), total)
+    except BaseException:
+        # إلغاء الاستدعاءات التي لم تبدأ بعد حتى يتحرر المجمع لاجتماعات أخرى
+        for future in futures:
+            future.cancel()
+        raise
+    return results
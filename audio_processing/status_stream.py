@@ -0,0 +1,96 @@
+# audio_processing/status_stream.py - فحص مشترك لحالة المعالجة لكل بثوث SSE في العملية
+
+import asyncio
+import weakref
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .progress import get_status_signatures
+
+logger = logging.getLogger(__name__)
+
+
+class StatusPoller:
+    """
+    مهمة asyncio واحدة تفحص بصمات حالة كل الاجتماعات التي لها بث مفتوح
+
+    بدلاً من استعلام لكل متصفح كل ثانية: استعلام واحد كل PROCESSING_STATUS_STREAM_INTERVAL
+    لكل العملية مهما كان عدد المتصفحات، ويُوقظ البث عند تغير بصمة اجتماعه فقط.
+    المهمة تتوقف عند إغلاق آخر بث وتبدأ مع البث التالي
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, 'PROCESSING_STATUS_STREAM_INTERVAL', 3)
+        self._subscribers = {}
+        self._signatures = {}
+        self._events = {}
+        self._task = None
+
+    def subscribe(self, meeting_id):
+        self._subscribers[meeting_id] = self._subscribers.get(meeting_id, 0) + 1
+        self._events.setdefault(meeting_id, asyncio.Event())
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def unsubscribe(self, meeting_id):
+        count = self._subscribers.get(meeting_id, 0) - 1
+        if count > 0:
+            self._subscribers[meeting_id] = count
+            return
+        self._subscribers.pop(meeting_id, None)
+        self._signatures.pop(meeting_id, None)
+        self._events.pop(meeting_id, None)
+
+    async def wait(self, meeting_id, known, timeout):
+        """
+        انتظار تغير بصمة الاجتماع عن known حتى timeout ثانية
+
+        Returns:
+            البصمة الجديدة، أو known إذا لم تتغير، أو None إذا حُذف الاجتماع
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            signature = self._signatures.get(meeting_id, known)
+            remaining = deadline - loop.time()
+            if signature != known or remaining <= 0:
+                return signature
+            try:
+                await asyncio.wait_for(self._events[meeting_id].wait(), remaining)
+            except asyncio.TimeoutError:
+                return self._signatures.get(meeting_id, known)
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                try:
+                    signatures = await sync_to_async(get_status_signatures)(list(self._subscribers))
+                except Exception as e:
+                    logger.error(f"Status poll failed: {str(e)}")
+                else:
+                    self._publish(signatures)
+                await asyncio.sleep(self.interval)
+        finally:
+            self._task = None
+
+    def _publish(self, signatures):
+        for meeting_id in list(self._subscribers):
+            signature = signatures.get(meeting_id)
+            if meeting_id in self._signatures and self._signatures[meeting_id] == signature:
+                continue
+            self._signatures[meeting_id] = signature
+            # حدث جديد لكل تغير: كل من ينتظر الحدث السابق يستيقظ
+            event, self._events[meeting_id] = self._events[meeting_id], asyncio.Event()
+            event.set()
+
+
+# فاحص لكل حلقة asyncio (حلقة واحدة لكل عملية تحت uvicorn)
+_pollers = weakref.WeakKeyDictionary()
+
+
+def get_status_poller():
+    loop = asyncio.get_running_loop()
+    poller = _pollers.get(loop)
+    if poller is None:
+        poller = _pollers[loop] = StatusPoller()
+    return poller
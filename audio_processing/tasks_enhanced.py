@@ -1,92 +1,135 @@
 # audio_processing/tasks_enhanced.py - نسخة محسنة مع المقارنة الصوتية
 
 import os
-import tempfile
-import time
+import hashlib
 from django.conf import settings
+from django.db import transaction
 from django.utils.translation import gettext as _
 from transcription.models import Meeting, TranscriptSegment, MeetingReport
 from speaker_identification.models import Speaker
-from audio_processing.utils.preprocessing import convert_audio_to_wav, enhance_audio_quality
-from transcription.utils.whisper_gpt4o import transcribe_with_whisper
+from audio_processing.utils.preprocessing import decode_to_pcm, compute_peaks
+from transcription.utils.chunked_whisper import transcribe_chunked, get_chunk_settings
+from audio_processing.scheduler import run_cpu, map_io
+from audio_processing.pipeline import MeetingPipeline, package_versions
+from audio_processing.clips import prewarm_segment_clips
+from audio_processing.ingest import wait_for_ingest
+from audio_processing.progress import start_run, set_stage, finish_run, fail_run
+from audio_processing.cancellation import ProcessingCancelled, StageTimeout
+from audio_processing.metrics import record_upload, record_audio
 import logging
 import openai
 
 logger = logging.getLogger(__name__)
 
+# نموذج GPT لتحديد المتحدثين في مسار OpenAI
+SPEAKER_ATTRIBUTION_MODEL = "gpt-3.5-turbo"
+
 # تكوين OpenAI
 if hasattr(settings, 'OPENAI_API_KEY') and settings.OPENAI_API_KEY:
     openai.api_key = settings.OPENAI_API_KEY
 
 
-def process_meeting_task(meeting_id):
+def process_meeting_task(meeting_id, job=None):
     """معالجة الاجتماع - نقطة الدخول الرئيسية"""
     meeting = Meeting.objects.get(id=meeting_id)
 
+    # سجل التشغيل الذي تعرضه صفحة حالة المعالجة
+    run = start_run(meeting, job)
+
     try:
+        # إذا رُفع الملف على أجزاء فقد فُك ترميز معظمه أثناء الرفع، وينتظر الجزء الأخير
+        wait_for_ingest(meeting)
+
         # التحقق من الإعدادات
         use_voice_comparison = getattr(settings, 'USE_VOICE_COMPARISON', False)
 
         # التحقق من توفر المتطلبات للمقارنة الصوتية
         if use_voice_comparison and os.getenv("HUGGINGFACE_TOKEN"):
             logger.info(f"Processing meeting {meeting_id} with voice comparison")
-            process_meeting_with_voice_comparison(meeting)
+            process_meeting_with_voice_comparison(meeting, run)
         elif settings.OPENAI_API_KEY and not getattr(settings, 'TESTING_MODE', False):
             logger.info(f"Processing meeting {meeting_id} with OpenAI")
-            process_meeting_with_openai(meeting)
+            process_meeting_with_openai(meeting, run)
         else:
             logger.info(f"Processing meeting {meeting_id} in test mode")
-            process_meeting_test_mode(meeting)
+            process_meeting_test_mode(meeting, run)
 
+        finish_run(run)
+
+    except ProcessingCancelled:
+        logger.info(f"Processing of meeting {meeting_id} was cancelled")
+        fail_run(run, _('أُلغيت المعالجة'))
+        raise
     except Exception as e:
         logger.error(f"Error processing meeting {meeting_id}: {str(e)}")
+        fail_run(run, e)
         meeting.processed = False
         meeting.save()
         raise e
 
 
-def process_meeting_with_voice_comparison(meeting):
+def process_meeting_with_voice_comparison(meeting, run=None):
     """معالجة مع المقارنة الصوتية"""
     print(f"🎤 Voice Comparison Processing for meeting {meeting.id}")
 
-    try:
-        # استيراد وظائف المقارنة الصوتية
-        from speaker_identification.utils.voice_comparison import (
-            process_meeting_with_diarization,
-            save_speaker_embedding
-        )
+    pipeline = None
 
-        # 1. تحضير البصمات الصوتية للمتحدثين
-        prepare_speaker_embeddings()
+    try:
+        # التأكد من توفر وحدات المقارنة الصوتية قبل البدء
+        from speaker_identification.utils.voice_comparison import process_meeting_with_diarization
 
-        # 2. معالجة الصوت مع diarization
+        # نواتج المراحل المكتملة في محاولة سابقة تُسترجع بدلاً من إعادة حسابها
+        pipeline = MeetingPipeline(meeting, run)
         audio_path = meeting.audio_file.path
-        segments = process_meeting_with_diarization(audio_path)
 
-        if not segments:
-            raise Exception("No segments found from diarization")
+        # 0. فك ترميز الصوت مرة واحدة إلى نسخة PCM تقرؤها كل المراحل التالية
+        #    (تُتخطى عند إعادة المعالجة إذا كانت النسخة موجودة، أو تُربط نسخة تسجيل مطابق رُفع سابقاً)
+        set_stage(run, 'decoding')
+        record_audio(pipeline.audio_seconds)
+        if not pipeline.reuse_decoded_audio():
+            run_cpu(decode_to_pcm, audio_path)
+        # قمم الموجة لمشغل صفحة الاجتماع
+        run_cpu(compute_peaks, audio_path)
+
+        # 1. تحضير البصمات الصوتية للمتحدثين (مجمع المعالج)
+        set_stage(run, 'embeddings')
+        run_cpu(prepare_speaker_embeddings)
+
+        # 2. معالجة الصوت مع diarization (مجمع المعالج)، والتقدم = عدد المقاطع المعالجة
+        segments = pipeline.run_stage(
+            'diarization',
+            lambda: run_cpu(diarize_audio, audio_path, pipeline.progress),
+            inputs=get_diarization_inputs(),
+            audio=True
+        )
 
         print(f"✅ Found {len(segments)} segments")
 
-        # 3. نسخ الصوت بـ Whisper
-        with open(audio_path, "rb") as audio_file:
-            transcript = openai.Audio.transcribe(
-                model="whisper-1",
-                file=audio_file,
-                language="ar"
-            )
+        # 3. نسخ الصوت بـ Whisper (أجزاؤه تُرفع في مجمع استدعاءات الـ API)
+        transcript = pipeline.run_stage(
+            'transcription',
+            lambda: transcribe_audio_file(audio_path, pipeline.progress),
+            inputs=get_transcription_inputs(),
+            audio=True
+        )
 
         # 4. دمج النص مع مقاطع المتحدثين
-        merged_segments = merge_transcript_with_diarization(
-            transcript['text'],
-            segments
+        merged_segments = pipeline.run_stage(
+            'merge',
+            lambda: merge_transcript_with_diarization(transcript, segments),
+            inputs=[pipeline.stage_keys['diarization'], pipeline.stage_keys['transcription']]
         )
+        merged_segments = attach_speakers(merged_segments)
 
         # 5. حفظ النتائج
+        set_stage(run, 'saving')
         save_segments_to_database(meeting, merged_segments)
 
         # 6. إنشاء التقرير
+        set_stage(run, 'report')
         create_meeting_report_from_segments(meeting, merged_segments)
+        # مقاطع القرارات والمهام جاهزة للتشغيل فور فتح الاجتماع
+        run_cpu(prewarm_segment_clips, meeting.id)
 
         # 7. تحديث حالة الاجتماع
         meeting.processed = True
@@ -94,106 +137,79 @@ def process_meeting_with_voice_comparison(meeting):
 
         print(f"✅ Meeting {meeting.id} processed successfully with voice comparison!")
 
+    except (ProcessingCancelled, StageTimeout):
+        # الإلغاء وتجاوز المهلة ينهيان المعالجة، ولا يُعاد تشغيلها بمسار OpenAI
+        raise
     except ImportError as e:
         logger.error(f"Voice comparison modules not available: {str(e)}")
         logger.info("Falling back to OpenAI processing")
-        process_meeting_with_openai(meeting)
+        process_meeting_with_openai(meeting, run, pipeline)
     except Exception as e:
         logger.error(f"Voice comparison error: {str(e)}")
         logger.info("Falling back to OpenAI processing")
-        process_meeting_with_openai(meeting)
+        process_meeting_with_openai(meeting, run, pipeline)
 
 
-def process_meeting_with_openai(meeting):
+def process_meeting_with_openai(meeting, run=None, pipeline=None):
     """معالجة حقيقية باستخدام OpenAI"""
     print(f"Starting OpenAI processing for meeting {meeting.id}")
 
-    temp_dir = tempfile.mkdtemp()
-
     try:
         # 1. تحضير الملف الصوتي
         audio_path = os.path.join(settings.MEDIA_ROOT, str(meeting.audio_file))
         print(f"Audio file: {audio_path}")
 
-        # 2. نسخ الصوت باستخدام Whisper
+        if pipeline is None:
+            pipeline = MeetingPipeline(meeting, run)
+
+        # 2. نسخ الصوت باستخدام Whisper (نفس مرحلة مسار المقارنة الصوتية، فلا يُعاد الرفع بعد الرجوع)
         print("Transcribing with Whisper...")
-        with open(audio_path, "rb") as audio_file:
-            transcript = openai.Audio.transcribe(
-                model="whisper-1",
-                file=audio_file,
-                language="ar",
-                response_format="text"
-            )
+        transcript = pipeline.run_stage(
+            'transcription',
+            lambda: transcribe_audio_file(audio_path, pipeline.progress),
+            inputs=get_transcription_inputs(),
+            audio=True
+        )
 
-        print(f"Transcription complete. Length: {len(transcript)} characters")
+        print(f"Transcription complete. Length: {len(transcript['text'])} characters")
 
         # 3. تحليل النص وتحديد المتحدثين باستخدام GPT
         print("Analyzing transcript with GPT...")
 
-        # تقسيم النص إلى أجزاء صغيرة للمعالجة
-        segments = split_text_into_segments(transcript)
+        # تجميع مقاطع Whisper في أجزاء صغيرة للمعالجة مع الاحتفاظ بتوقيتاتها
+        timed_segments = group_transcript_segments(transcript)
+        segments = [segment['text'] for segment in timed_segments]
         print(f"Split into {len(segments)} segments")
 
         # جلب المتحدثين المحتملين
         speakers = Speaker.objects.all()
         speaker_info = "\n".join([f"- {s.name} ({s.position})" for s in speakers])
 
-        # معالجة كل مقطع
+        # تحديد المتحدث لكل مقطع باستخدام GPT - الطلبات تُرسل بالتوازي عبر مجمع الـ API
+        prompts = [build_speaker_prompt(speaker_info, segment_text) for segment_text in segments]
+        speaker_names = pipeline.run_stage(
+            'speaker_attribution',
+            lambda: map_io(identify_speaker_with_gpt, prompts, progress=pipeline.progress),
+            inputs=[pipeline.stage_keys['transcription'], speaker_info, SPEAKER_ATTRIBUTION_MODEL]
+        )
+
+        # معالجة كل مقطع بالترتيب (المتحدث الحالي يُستخدم عند عدم التعرف)
         processed_segments = []
         current_speaker = None
 
-        for i, segment_text in enumerate(segments):
+        for i, (segment_text, speaker_name) in enumerate(zip(segments, speaker_names)):
             print(f"Processing segment {i + 1}/{len(segments)}")
 
-            # استخدام GPT لتحديد المتحدث
-            prompt = f"""
-            لديك هذه القائمة من المتحدثين المحتملين:
-            {speaker_info}
-
-            النص التالي من اجتماع. حدد من المتحدث:
-            "{segment_text}"
-
-            ابحث عن:
-            1. عبارات تعريف (أنا فلان، معكم فلان)
-            2. ذكر الأسماء (شكراً دكتور أحمد)
-            3. تغيير المتحدث (أعطي الكلمة لـ)
-
-            أجب فقط باسم المتحدث أو "غير محدد" إذا لم تستطع التحديد.
-            """
-
-            try:
-                response = openai.ChatCompletion.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "أنت خبير في تحليل محاضر الاجتماعات"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=50,
-                    temperature=0.3
-                )
-
-                speaker_name = response.choices[0].message.content.strip()
-                print(f"GPT identified speaker: {speaker_name}")
-
+            speaker_obj = None
+            if speaker_name:
                 # البحث عن المتحدث في قاعدة البيانات
-                speaker_obj = None
                 for s in speakers:
                     if s.name in speaker_name or speaker_name in s.name:
                         speaker_obj = s
                         current_speaker = s
                         break
 
-                if not speaker_obj:
-                    if current_speaker:
-                        speaker_obj = current_speaker
-                    else:
-                        speaker_obj = Speaker.objects.get_or_create(
-                            name="متحدث غير محدد",
-                            defaults={'position': 'غير محدد', 'speaker_type': 'unknown'}
-                        )[0]
-
-            except Exception as e:
-                print(f"GPT error: {e}")
+            if not speaker_obj:
                 speaker_obj = current_speaker or Speaker.objects.get_or_create(
                     name="متحدث غير محدد",
                     defaults={'position': 'غير محدد', 'speaker_type': 'unknown'}
@@ -208,27 +224,26 @@ def process_meeting_with_openai(meeting):
                 'text': segment_text,
                 'is_decision': is_decision,
                 'is_task': is_task,
-                'start_time': i * 30,  # تقدير الوقت
-                'end_time': (i + 1) * 30
+                'start_time': timed_segments[i]['start'],
+                'end_time': timed_segments[i]['end']
             })
 
         # 4. حفظ المقاطع في قاعدة البيانات
         print("Saving segments to database...")
-        for seg in processed_segments:
-            TranscriptSegment.objects.create(
-                meeting=meeting,
-                speaker=seg['speaker'],
-                text=seg['text'],
-                start_time=seg['start_time'],
-                end_time=seg['end_time'],
-                confidence=0.85,
-                is_decision=seg['is_decision'],
-                is_action_item=seg['is_task']
-            )
+        set_stage(run, 'saving')
+        # قمم الموجة لمشغل صفحة الاجتماع (نسخة PCM موجودة بعد النسخ)
+        run_cpu(compute_peaks, audio_path)
+        save_segments_to_database(meeting, [
+            {**seg, 'start': seg['start_time'], 'end': seg['end_time']}
+            for seg in processed_segments
+        ])
 
         # 5. إنشاء التقرير
         print("Creating meeting report...")
+        set_stage(run, 'report')
         create_meeting_report(meeting, processed_segments)
+        # مقاطع القرارات والمهام جاهزة للتشغيل فور فتح الاجتماع
+        run_cpu(prewarm_segment_clips, meeting.id)
 
         # 6. تحديث حالة المعالجة
         meeting.processed = True
@@ -238,14 +253,173 @@ def process_meeting_with_openai(meeting):
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise
-    finally:
-        import shutil
-        shutil.rmtree(temp_dir, ignore_errors=True)
 
 
-def process_meeting_test_mode(meeting):
+def diarize_audio(audio_path, progress=None):
+    """
+    مرحلة diarization وتحديد المتحدثين، بناتج قابل للحفظ (أرقام المتحدثين بدلاً من الكائنات)
+    """
+    from speaker_identification.utils.voice_comparison import process_meeting_with_diarization
+
+    segments = process_meeting_with_diarization(audio_path, progress_callback=progress)
+    if not segments:
+        raise Exception("No segments found from diarization")
+
+    return [
+        {
+            'speaker': seg['speaker'].id,
+            'start': seg['start'],
+            'end': seg['end'],
+            'label': seg['label'],
+        }
+        for seg in segments
+    ]
+
+
+def attach_speakers(segments):
+    """استبدال أرقام المتحدثين في نواتج المراحل بكائنات Speaker"""
+    speakers = Speaker.objects.in_bulk({seg['speaker'] for seg in segments})
+    unknown = None
+
+    attached = []
+    for seg in segments:
+        speaker = speakers.get(seg['speaker'])
+        if speaker is None:
+            # المتحدث حُذف بعد حفظ الناتج
+            if unknown is None:
+                unknown = Speaker.objects.get_or_create(
+                    name="متحدث غير محدد",
+                    defaults={'position': 'غير محدد', 'speaker_type': 'unknown'}
+                )[0]
+            speaker = unknown
+        attached.append({**seg, 'speaker': speaker})
+
+    return attached
+
+
+def get_enrolled_speakers_fingerprint():
+    """
+    بصمة المتحدثين المسجلين الذين تُطابق معهم مقاطع diarization
+
+    ناتج المرحلة يحفظ أرقام المتحدثين الذين تم التعرف عليهم، فتسجيل متحدث جديد
+    أو تغيير بصمته أو ملفه المرجعي يجب أن يعيد المرحلة
+
+    Returns:
+        list: (رقم المتحدث، hash البصمة، اسم الملف المرجعي وحجمه ووقت تعديله) لكل متحدث
+    """
+    fingerprint = []
+    for speaker in Speaker.objects.order_by('id'):
+        embedding_hash = None
+        if speaker.voice_embedding:
+            embedding_hash = hashlib.sha256(bytes(speaker.voice_embedding)).hexdigest()
+
+        reference = None
+        if speaker.reference_audio:
+            try:
+                stat = os.stat(speaker.reference_audio.path)
+                reference = [speaker.reference_audio.name, stat.st_size, stat.st_mtime]
+            except OSError:
+                reference = [speaker.reference_audio.name, None, None]
+
+        if embedding_hash or reference:
+            fingerprint.append([speaker.id, embedding_hash, reference])
+    return fingerprint
+
+
+def get_diarization_inputs():
+    """
+    مدخلات مرحلة diarization: النماذج وإصدارات مكتباتها وإعدادات البصمات
+    والمتحدثون المسجلون، فتغيير أي منها يعيد المرحلة بدلاً من استرجاع ناتج سابق
+    """
+    from speaker_identification.utils.model_registry import DIARIZATION_MODEL, EMBEDDING_MODEL
+    from speaker_identification.utils.batch_embeddings import get_batch_settings
+
+    embedding_settings = get_batch_settings()
+    # حجم الدفعة لا يغير البصمات
+    embedding_settings.pop('batch_size')
+    return {
+        'model': DIARIZATION_MODEL,
+        'embedding_model': EMBEDDING_MODEL,
+        'embeddings': embedding_settings,
+        'versions': package_versions('pyannote.audio', 'torch'),
+        'speakers': get_enrolled_speakers_fingerprint(),
+    }
+
+
+def get_transcription_inputs():
+    """مدخلات مرحلة النسخ (تغيير طول الأجزاء أو صيغة الرفع أو المكتبة يغير النص الناتج فيعيد النسخ)"""
+    options = get_chunk_settings()
+    return {
+        'model': 'whisper-1',
+        'language': 'ar',
+        'chunk_seconds': options['chunk_seconds'],
+        'concurrency': options['concurrency'],
+        'prompt_chars': options['prompt_chars'],
+        'upload_format': options['upload_format'],
+        'versions': package_versions('openai'),
+    }
+
+
+def transcribe_audio_file(audio_path, progress=None):
+    """
+    نسخ ملف صوتي كامل باستخدام Whisper على أجزاء متزامنة
+
+    Returns:
+        dict: النص والمقاطع بتوقيتاتها من بداية الاجتماع
+    """
+    return transcribe_chunked(audio_path, language="ar", progress=progress)
+
+
+def build_speaker_prompt(speaker_info, segment_text):
+    """نص الطلب المرسل إلى GPT لتحديد متحدث المقطع"""
+    return f"""
+            لديك هذه القائمة من المتحدثين المحتملين:
+            {speaker_info}
+
+            النص التالي من اجتماع. حدد من المتحدث:
+            "{segment_text}"
+
+            ابحث عن:
+            1. عبارات تعريف (أنا فلان، معكم فلان)
+            2. ذكر الأسماء (شكراً دكتور أحمد)
+            3. تغيير المتحدث (أعطي الكلمة لـ)
+
+            أجب فقط باسم المتحدث أو "غير محدد" إذا لم تستطع التحديد.
+            """
+
+
+def identify_speaker_with_gpt(prompt):
+    """
+    تحديد اسم المتحدث باستخدام GPT
+
+    Returns:
+        str: الاسم كما أرجعه GPT، أو None في حالة الخطأ
+    """
+    try:
+        record_upload(len(prompt.encode('utf-8')))
+        response = openai.ChatCompletion.create(
+            model=SPEAKER_ATTRIBUTION_MODEL,
+            messages=[
+                {"role": "system", "content": "أنت خبير في تحليل محاضر الاجتماعات"},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=50,
+            temperature=0.3
+        )
+
+        speaker_name = response.choices[0].message.content.strip()
+        logger.debug(f"GPT identified speaker: {speaker_name}")
+        return speaker_name
+
+    except Exception as e:
+        logger.warning(f"GPT error: {e}")
+        return None
+
+
+def process_meeting_test_mode(meeting, run=None):
     """وضع تجريبي مع بيانات واضحة"""
     print(f"Test mode for meeting {meeting.id}")
+    set_stage(run, 'saving')
 
     # بيانات تجريبية واضحة
     test_data = [
@@ -291,6 +465,7 @@ def process_meeting_test_mode(meeting):
         start_time += 20
 
     # إنشاء التقرير
+    set_stage(run, 'report')
     summary = """
     اجتماع تجريبي لعرض النظام
     المشاركون: د. أحمد محمد، أ. سارة خالد، م. فاطمة علي
@@ -334,6 +509,38 @@ def split_text_into_segments(text, segment_size=200):
     return segments
 
 
+def group_transcript_segments(transcript, segment_size=200):
+    """
+    تجميع مقاطع Whisper المتتالية في أجزاء بطول segment_size تقريباً
+
+    Returns:
+        list: قواميس فيها النص وبداية أول مقطع ونهاية آخر مقطع
+    """
+    groups = []
+    current = None
+
+    for segment in transcript.get('segments') or []:
+        if current is not None and len(current['text']) < segment_size:
+            current['text'] += " " + segment['text']
+            current['end'] = segment['end']
+        else:
+            if current is not None:
+                groups.append(current)
+            current = {'text': segment['text'], 'start': segment['start'], 'end': segment['end']}
+
+    if current is not None:
+        groups.append(current)
+
+    if not groups and transcript.get('text'):
+        # نص بدون توقيتات: التقسيم بالجمل مع توقيت تقديري
+        groups = [
+            {'text': text, 'start': i * 30, 'end': (i + 1) * 30}
+            for i, text in enumerate(split_text_into_segments(transcript['text'], segment_size))
+        ]
+
+    return groups
+
+
 def create_meeting_report(meeting, segments):
     """إنشاء تقرير الاجتماع"""
     # إحصائيات المتحدثين
@@ -368,12 +575,14 @@ def create_meeting_report(meeting, segments):
     for i, task in enumerate(tasks, 1):
         tasks_text += f"{i}. {task['speaker'].name}: {task['text']}\n"
 
-    MeetingReport.objects.create(
-        meeting=meeting,
-        summary=summary.strip(),
-        decisions=decisions_text.strip() or "لا توجد قرارات",
-        action_items=tasks_text.strip() or "لا توجد مهام"
-    )
+    with transaction.atomic():
+        MeetingReport.objects.filter(meeting=meeting).delete()
+        MeetingReport.objects.create(
+            meeting=meeting,
+            summary=summary.strip(),
+            decisions=decisions_text.strip() or "لا توجد قرارات",
+            action_items=tasks_text.strip() or "لا توجد مهام"
+        )
 
 
 def prepare_speaker_embeddings():
@@ -394,10 +603,56 @@ def prepare_speaker_embeddings():
         logger.warning("Voice comparison module not available")
 
 
-def merge_transcript_with_diarization(transcript_text, diarization_segments):
+def assign_transcript_to_turns(transcript_segments, diarization_segments):
+    """
+    توزيع مقاطع Whisper على مقاطع diarization حسب التداخل الزمني
+
+    كل مقطع نص يُنسب إلى المقطع الأكثر تداخلاً معه، أو الأقرب إليه إذا وقع في فجوة بين المقاطع
+
+    Returns:
+        list: نص كل مقطع diarization بنفس الترتيب
+    """
+    texts = [[] for _ in diarization_segments]
+    if not diarization_segments:
+        return texts
+
+    turns = sorted(range(len(diarization_segments)), key=lambda i: diarization_segments[i]['start'])
+    first = 0
+
+    for segment in sorted(transcript_segments, key=lambda seg: seg['start']):
+        # المقاطع التي انتهت قبل بداية هذا النص لن تتداخل مع ما بعده
+        while first < len(turns) - 1 and diarization_segments[turns[first]]['end'] <= segment['start']:
+            first += 1
+
+        best, best_score = None, None
+        for position in range(max(0, first - 1), len(turns)):
+            turn = diarization_segments[turns[position]]
+            if turn['start'] > segment['end'] and best is not None:
+                break
+            overlap = min(turn['end'], segment['end']) - max(turn['start'], segment['start'])
+            # التداخل الموجب يُفضّل، وإلا فالأقرب (تداخل سالب = المسافة بينهما)
+            if best_score is None or overlap > best_score:
+                best, best_score = turns[position], overlap
+
+        texts[best].append(segment['text'])
+
+    return texts
+
+
+def merge_transcript_with_diarization(transcript, diarization_segments):
     """دمج النص المنسوخ مع مقاطع diarization"""
 
-    # تقسيم النص إلى جمل
+    if transcript.get('segments'):
+        merged = []
+        texts = assign_transcript_to_turns(transcript['segments'], diarization_segments)
+        for segment, parts in zip(diarization_segments, texts):
+            segment_text = " ".join(parts)
+            if segment_text.strip():
+                merged.append(build_merged_segment(segment, segment_text))
+        return merged
+
+    # نص بدون توقيتات: توزيع الجمل تقديرياً حسب طول كل مقطع
+    transcript_text = transcript['text']
     sentences = [s.strip() + '.' for s in transcript_text.split('.') if s.strip()]
 
     # توزيع الجمل على المقاطع
@@ -414,39 +669,54 @@ def merge_transcript_with_diarization(transcript_text, diarization_segments):
             sentence_idx += 1
 
         if segment_text.strip():
-            # تحديد نوع المقطع
-            is_decision = any(word in segment_text for word in ['القرار', 'نقرر', 'الموافقة'])
-            is_task = any(word in segment_text for word in ['مهمة', 'نكلف', 'يجب على'])
-
-            merged.append({
-                'speaker': segment['speaker'],
-                'text': segment_text.strip(),
-                'start': segment['start'],
-                'end': segment['end'],
-                'is_decision': is_decision,
-                'is_task': is_task
-            })
+            merged.append(build_merged_segment(segment, segment_text))
 
     return merged
 
 
+def build_merged_segment(segment, segment_text):
+    """مقطع متحدث مع نصه ونوعه"""
+    # تحديد نوع المقطع
+    is_decision = any(word in segment_text for word in ['القرار', 'نقرر', 'الموافقة'])
+    is_task = any(word in segment_text for word in ['مهمة', 'نكلف', 'يجب على'])
+
+    return {
+        'speaker': segment['speaker'],
+        'text': segment_text.strip(),
+        'start': segment['start'],
+        'end': segment['end'],
+        'is_decision': is_decision,
+        'is_task': is_task
+    }
+
+
 def save_segments_to_database(meeting, segments):
-    """حفظ المقاطع في قاعدة البيانات"""
-    # حذف المقاطع القديمة
-    TranscriptSegment.objects.filter(meeting=meeting).delete()
+    """
+    حفظ المقاطع في قاعدة البيانات
 
-    # إنشاء المقاطع الجديدة
-    for seg in segments:
-        TranscriptSegment.objects.create(
-            meeting=meeting,
-            speaker=seg['speaker'],
-            text=seg['text'],
-            start_time=seg['start'],
-            end_time=seg['end'],
-            confidence=0.85,
-            is_decision=seg.get('is_decision', False),
-            is_action_item=seg.get('is_task', False)
-        )
+    الحذف والإنشاء في معاملة واحدة مع قفل صف الاجتماع،
+    فلا يتداخل تشغيلان على نفس الاجتماع ولا يرى المستخدم نصاً نصف محفوظ
+    """
+    with transaction.atomic():
+        Meeting.objects.select_for_update().filter(id=meeting.id).first()
+
+        # حذف المقاطع القديمة
+        TranscriptSegment.objects.filter(meeting=meeting).delete()
+
+        # إنشاء المقاطع الجديدة
+        TranscriptSegment.objects.bulk_create([
+            TranscriptSegment(
+                meeting=meeting,
+                speaker=seg['speaker'],
+                text=seg['text'],
+                start_time=seg['start'],
+                end_time=seg['end'],
+                confidence=seg.get('confidence', 0.85),
+                is_decision=seg.get('is_decision', False),
+                is_action_item=seg.get('is_task', False)
+            )
+            for seg in segments
+        ])
 
 
 def create_meeting_report_from_segments(meeting, segments):
@@ -486,10 +756,11 @@ def create_meeting_report_from_segments(meeting, segments):
             tasks.append(f"{seg['speaker'].name}: {seg['text']}")
 
     # حفظ التقرير
-    MeetingReport.objects.filter(meeting=meeting).delete()
-    MeetingReport.objects.create(
-        meeting=meeting,
-        summary=summary.strip(),
-        decisions="\n".join(decisions) or "لا توجد قرارات",
-        action_items="\n".join(tasks) or "لا توجد مهام"
-    )
\ No newline at end of file
+    with transaction.atomic():
+        MeetingReport.objects.filter(meeting=meeting).delete()
+        MeetingReport.objects.create(
+            meeting=meeting,
+            summary=summary.strip(),
+            decisions="\n".join(decisions) or "لا توجد قرارات",
+            action_items="\n".join(tasks) or "لا توجد مهام"
+        )
\ No newline at end of file
@@ -1,3 +1,987 @@
-from django.test import TestCase
+# audio_processing/tests.py
 
-# Create your tests here.
+import io
+import os
+import json
+import time
+import shutil
+import hashlib
+import datetime
+import tempfile
+from unittest import mock
+import numpy as np
+import soundfile as sf
+from scipy import signal
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from transcription.models import Meeting, TranscriptSegment
+from speaker_identification.models import Speaker
+from . import clips, jobs, metrics
+from .management.commands import reprocess_meetings
+from .jobs import enqueue_meeting, claim_job, fail_job, request_cancel
+from .models import PipelineCheckpoint, ProcessingJob, ProcessingRun, StageMetric, UploadSession
+from .pipeline import MeetingPipeline, get_artifacts_dir
+from .progress import get_status_signature
+from .tasks_enhanced import get_diarization_inputs
+from .uploads import UploadError, UploadOffsetMismatch, get_part_path, write_chunk, finalize_upload
+from .utils import preprocessing
+from .utils.preprocessing import (
+    PCM_SAMPLE_RATE, VAD_FRAME_SECONDS, PEAK_LEVELS, get_pcm_path, get_peaks_path, frame_energies,
+    find_speech_intervals, detect_speech, compute_peaks, read_peaks, load_audio_segment, convert_audio_to_wav,
+    encode_for_upload, split_audio_by_silence, enhance_audio_quality, pcm_to_float, _enhancement_filter
+)
+
+
+def make_signal(parts, amplitude=0.3, frequency=440):
+    """عينات int16 من أجزاء (المدة بالثواني، نغمة أم صمت)"""
+    blocks = []
+    for seconds, tone in parts:
+        t = np.arange(int(seconds * PCM_SAMPLE_RATE)) / PCM_SAMPLE_RATE
+        block = amplitude * np.sin(2 * np.pi * frequency * t) if tone else np.zeros_like(t)
+        blocks.append((block * 32767).astype(np.int16))
+    return np.concatenate(blocks)
+
+
+class AudioFileMixin:
+    """ملف صوتي مؤقت مع نسخة PCM جاهزة بجانبه (فلا يلزم ffmpeg)"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.audio_path = os.path.join(self.directory, 'meeting.wav')
+        open(self.audio_path, 'wb').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def write_pcm(self, samples):
+        # الملف الأصلي أقدم من نسخة PCM فتُستخدم النسخة بدون فك ترميز
+        mtime = os.path.getmtime(self.audio_path) - 10
+        os.utime(self.audio_path, (mtime, mtime))
+        np.save(get_pcm_path(self.audio_path), samples, allow_pickle=False)
+
+
+class ProcessingJobQueueTests(TestCase):
+    """طابور مهام المعالجة (audio_processing.jobs)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('member', password='secret')
+        self.meeting = Meeting.objects.create(
+            title='اجتماع', date=datetime.date(2026, 1, 1), created_by=self.user
+        )
+
+    def test_enqueue_returns_active_job(self):
+        job, created = enqueue_meeting(self.meeting)
+        again, created_again = enqueue_meeting(self.meeting)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.id, job.id)
+        self.assertEqual(ProcessingJob.objects.filter(meeting=self.meeting).count(), 1)
+
+    def test_concurrent_enqueue_returns_same_job(self):
+        """طلبان متزامنان لم يجد أي منهما مهمة نشطة: القيد الفريد يمنع الثانية فتُعاد الأولى"""
+        job, _ = enqueue_meeting(self.meeting)
+
+        real_get_active_job = jobs.get_active_job
+        with mock.patch.object(jobs, 'get_active_job', side_effect=[None, real_get_active_job(self.meeting)]):
+            again, created = enqueue_meeting(self.meeting)
+
+        self.assertFalse(created)
+        self.assertEqual(again.id, job.id)
+        self.assertEqual(ProcessingJob.objects.filter(meeting=self.meeting).count(), 1)
+
+    def test_enqueue_raises_priority_of_queued_job(self):
+        job, _ = enqueue_meeting(self.meeting, priority=ProcessingJob.PRIORITY_BACKFILL)
+        enqueue_meeting(self.meeting, priority=ProcessingJob.PRIORITY_URGENT)
+
+        job.refresh_from_db()
+        self.assertEqual(job.priority, ProcessingJob.PRIORITY_URGENT)
+
+    def test_claim_refuses_leased_job(self):
+        job, _ = enqueue_meeting(self.meeting)
+        stale = ProcessingJob.objects.get(id=job.id)
+
+        claimed = claim_job(job.id, 'worker-1')
+        self.assertEqual(claimed.lease_owner, 'worker-1')
+        self.assertEqual(claimed.attempts, 1)
+
+        # عامل ثانٍ قرأ المهمة قبل حجزها لا يستطيع حجزها بعده
+        self.assertIsNone(claim_job(job.id, 'worker-2'))
+        self.assertIsNone(jobs._claim(stale, 'worker-2', timezone.now()))
+        self.assertEqual(ProcessingJob.objects.get(id=job.id).lease_owner, 'worker-1')
+
+    def test_claim_takes_over_expired_lease(self):
+        job, _ = enqueue_meeting(self.meeting)
+        claim_job(job.id, 'worker-1')
+        ProcessingJob.objects.filter(id=job.id).update(
+            lease_expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+
+        claimed = claim_job(job.id, 'worker-2')
+        self.assertEqual(claimed.lease_owner, 'worker-2')
+        self.assertEqual(claimed.attempts, 2)
+
+    @override_settings(PROCESSING_MAX_ATTEMPTS=2)
+    def test_fail_job_requeues_until_max_attempts(self):
+        job, _ = enqueue_meeting(self.meeting)
+
+        fail_job(claim_job(job.id, 'worker-1'), 'worker-1', 'خطأ أول')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.error, 'خطأ أول')
+
+        fail_job(claim_job(job.id, 'worker-1'), 'worker-1', 'خطأ ثانٍ')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(claim_job(job.id, 'worker-1'))
+
+    def test_fail_job_ignores_worker_without_lease(self):
+        job, _ = enqueue_meeting(self.meeting)
+        claim_job(job.id, 'worker-1')
+
+        fail_job(job, 'worker-2', 'خطأ')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+    def test_request_cancel_queued_job(self):
+        job, _ = enqueue_meeting(self.meeting)
+
+        self.assertTrue(request_cancel(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'cancelled')
+        self.assertIsNone(claim_job(job.id, 'worker-1'))
+
+    def test_request_cancel_running_job(self):
+        job, _ = enqueue_meeting(self.meeting)
+        claim_job(job.id, 'worker-1')
+        run = ProcessingRun.objects.create(meeting=self.meeting, job=job)
+
+        self.assertTrue(request_cancel(job))
+
+        # العامل يتوقف عند نقطة الفحص التالية، وحتى ذلك الحين تبقى المهمة محجوزة له
+        job.refresh_from_db()
+        run.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+        self.assertIsNotNone(job.cancel_requested_at)
+        self.assertEqual(run.status, 'cancelled')
+
+    def test_request_cancel_running_job_with_expired_lease(self):
+        job, _ = enqueue_meeting(self.meeting)
+        claim_job(job.id, 'worker-1')
+        ProcessingJob.objects.filter(id=job.id).update(
+            lease_expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+
+        self.assertTrue(request_cancel(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'cancelled')
+        self.assertIsNone(claim_job(job.id, 'worker-2'))
+
+    def test_request_cancel_finished_job(self):
+        job, _ = enqueue_meeting(self.meeting)
+        ProcessingJob.objects.filter(id=job.id).update(status='done')
+
+        self.assertFalse(request_cancel(job))
+
+
+@override_settings(PROCESSING_PRIORITY_AGING_SECONDS=3600, PROCESSING_FAIR_SHARE_WINDOW_SECONDS=3600)
+class SchedulingPolicyTests(TestCase):
+    """ترتيب الطابور: رفع الأولوية بالانتظار، والحصة العادلة بين المستخدمين (claim_next_job)"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.bulk_user = User.objects.create_user('bulk', password='secret')
+        self.other_user = User.objects.create_user('other', password='secret')
+
+    def add_job(self, user, priority=ProcessingJob.PRIORITY_NORMAL, waited=0, status='queued', **fields):
+        meeting = Meeting.objects.create(title='اجتماع', date=datetime.date(2026, 1, 1), created_by=user)
+        return ProcessingJob.objects.create(
+            meeting=meeting, priority=priority, status=status,
+            queued_at=self.now - datetime.timedelta(seconds=waited), audio_bytes=1000, **fields
+        )
+
+    def test_aging_lifts_backfill_job(self):
+        backfill = self.add_job(self.bulk_user, ProcessingJob.PRIORITY_BACKFILL, waited=2 * 3600 + 60)
+        normal = self.add_job(self.other_user, ProcessingJob.PRIORITY_NORMAL, waited=60)
+
+        self.assertEqual(jobs.effective_priority(backfill, self.now), ProcessingJob.PRIORITY_URGENT)
+        self.assertEqual(jobs.effective_priority(normal, self.now), ProcessingJob.PRIORITY_NORMAL)
+        self.assertEqual(jobs.claim_next_job('worker-1').id, backfill.id)
+
+    def test_without_aging_priority_wins(self):
+        self.add_job(self.bulk_user, ProcessingJob.PRIORITY_BACKFILL, waited=1800)
+        normal = self.add_job(self.other_user, ProcessingJob.PRIORITY_NORMAL, waited=60)
+
+        self.assertEqual(jobs.claim_next_job('worker-1').id, normal.id)
+
+    def test_recent_usage_breaks_priority_tie(self):
+        """مهمة مستخدم لم يستهلك العمال تسبق مهمة أقدم لمستخدم انتهت مهامه قبل قليل"""
+        self.add_job(self.bulk_user, status='done', finished_at=self.now - datetime.timedelta(minutes=10))
+        self.add_job(self.bulk_user, status='running', lease_owner='worker-0',
+                     lease_expires_at=self.now + datetime.timedelta(minutes=5))
+        older = self.add_job(self.bulk_user, waited=600)
+        newer = self.add_job(self.other_user, waited=60)
+
+        self.assertEqual(jobs.get_user_usage(self.now)[self.bulk_user.id], (2, 1))
+        self.assertEqual(jobs.claim_next_job('worker-1').id, newer.id)
+        self.assertEqual(jobs.claim_next_job('worker-1').id, older.id)
+
+    def test_usage_outside_window_is_ignored(self):
+        self.add_job(self.bulk_user, status='done', finished_at=self.now - datetime.timedelta(hours=2))
+        older = self.add_job(self.bulk_user, waited=600)
+        self.add_job(self.other_user, waited=60)
+
+        self.assertEqual(jobs.claim_next_job('worker-1').id, older.id)
+
+    def test_queued_backlog_breaks_tie_without_recent_usage(self):
+        first = self.add_job(self.bulk_user, waited=600)
+        self.add_job(self.bulk_user, waited=600)
+        single = self.add_job(self.other_user, waited=60)
+
+        self.assertEqual(jobs.claim_next_job('worker-1').id, single.id)
+        self.assertEqual(jobs.claim_next_job('worker-1').id, first.id)
+
+    def test_reclaimed_job_waits_from_lease_expiry(self):
+        """مدة التشغيل السابق للمهمة التي انتهى حجزها لا تُحسب انتظاراً ولا ترفع أولويتها"""
+        expired = self.now - datetime.timedelta(seconds=30)
+        job = self.add_job(self.bulk_user, ProcessingJob.PRIORITY_BACKFILL, waited=3 * 3600, status='running',
+                           lease_owner='worker-0', lease_expires_at=expired, attempts=1)
+
+        self.assertEqual(jobs.effective_priority(job, self.now), ProcessingJob.PRIORITY_BACKFILL)
+        claimed = jobs.claim_next_job('worker-1')
+
+        self.assertEqual(claimed.id, job.id)
+        self.assertLess(claimed.wait_seconds, 60)
+        self.assertEqual(claimed.queued_at, expired)
+
+
+class ReprocessMeetingsCommandTests(TestCase):
+    """أمر reprocess_meetings: اختيار الاجتماعات وحالة المهام في الملخص"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('member', password='secret')
+        self.meetings = [
+            Meeting.objects.create(title=f'اجتماع {day}', date=datetime.date(2026, 1, day), created_by=self.user)
+            for day in range(1, 7)
+        ]
+
+    def dry_run(self, *args):
+        output = io.StringIO()
+        call_command('reprocess_meetings', *args, '--dry-run', stdout=output)
+        return output.getvalue()
+
+    def selected_ids(self, *args):
+        return [int(line.split('\t')[0]) for line in self.dry_run(*args).splitlines() if '\t' in line]
+
+    def test_parse_id_ranges(self):
+        self.assertEqual(reprocess_meetings.parse_id_ranges('1-3, 7,10-9'), {1, 2, 3, 7, 9, 10})
+        with self.assertRaises(CommandError):
+            reprocess_meetings.parse_id_ranges('1-x')
+
+    def test_select_by_id_ranges(self):
+        ids = [meeting.id for meeting in self.meetings]
+        selection = f'{ids[0]}-{ids[2]},{ids[4]}'
+        self.assertEqual(self.selected_ids('--ids', selection), [ids[0], ids[1], ids[2], ids[4]])
+
+    def test_select_by_dates(self):
+        ids = [meeting.id for meeting in self.meetings]
+        self.assertEqual(self.selected_ids('--since', '2026-01-03', '--until', '2026-01-04'), ids[2:4])
+        self.assertEqual(self.selected_ids('--since', '2026-01-05'), ids[4:])
+        with self.assertRaises(CommandError):
+            self.dry_run('--since', '03/01/2026')
+
+    def test_selection_is_required(self):
+        with self.assertRaises(CommandError):
+            self.dry_run()
+
+    def test_dry_run_does_not_enqueue(self):
+        output = self.dry_run('--all')
+
+        self.assertIn('عدد الاجتماعات: 6', output)
+        self.assertFalse(ProcessingJob.objects.exists())
+
+    def test_failed_attempt_with_retries_is_reported_as_retrying(self):
+        job, _ = enqueue_meeting(self.meetings[0])
+        with override_settings(PROCESSING_MAX_ATTEMPTS=3), \
+                mock.patch('audio_processing.tasks_enhanced.process_meeting_task', side_effect=RuntimeError('boom')), \
+                mock.patch.object(reprocess_meetings, 'connection'):
+            result = reprocess_meetings.process_batch_job(job.id)
+
+        self.assertEqual(result['status'], 'retrying')
+        self.assertEqual(ProcessingJob.objects.get(id=job.id).status, 'queued')
+
+    def test_summary_counts_retrying_separately(self):
+        output = io.StringIO()
+        command = reprocess_meetings.Command(stdout=output)
+        results = [
+            {'meeting_id': 1, 'job_id': 1, 'status': 'done', 'seconds': 2.0},
+            {'meeting_id': 2, 'job_id': 2, 'status': 'retrying', 'seconds': 1.0, 'error': 'boom'},
+            {'meeting_id': 3, 'job_id': 3, 'status': 'failed', 'seconds': 1.0, 'error': 'boom'},
+        ]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'summary.json')
+        command.write_summary({'summary': path}, timezone.now(), 4.0, 2, results)
+
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['counts'], {'done': 1, 'retrying': 1, 'failed': 1})
+        self.assertIn('1 اجتماع فشلت محاولته', output.getvalue())
+
+
+class StageMeterTests(TestCase):
+    """أقصى ذاكرة لكل مرحلة (metrics.StageMeter)"""
+
+    def setUp(self):
+        user = User.objects.create_user('member', password='secret')
+        meeting = Meeting.objects.create(title='اجتماع', date=datetime.date(2026, 1, 1), created_by=user)
+        self.run = ProcessingRun.objects.create(meeting=meeting)
+
+    def test_worker_stage_uses_sampled_rss_not_process_peak(self):
+        """أقصى ذاكرة لعملية العامل منذ بدئها (VmHWM) لا يُنسب إلى المرحلة"""
+        readings = iter([200.0, 350.0])
+        with mock.patch.object(metrics, 'get_peak_rss_mb', return_value=4000.0), \
+                mock.patch.object(metrics, 'get_rss_mb', side_effect=lambda: next(readings, 250.0)), \
+                mock.patch.object(metrics, '_sampler'):
+            meter = metrics.StageMeter(self.run, 'transcription')
+            meter.observe_rss(metrics.get_rss_mb())
+            meter.save()
+
+        self.assertEqual(StageMetric.objects.get(run=self.run).peak_rss_mb, 350.0)
+
+    def test_pool_stage_uses_pool_process_peak(self):
+        with mock.patch.object(metrics, 'get_rss_mb', return_value=200.0), mock.patch.object(metrics, '_sampler'):
+            meter = metrics.StageMeter(self.run, 'diarization')
+            meter.add_call({'cpu_seconds': 1.0, 'peak_rss_mb': 1500.0, 'bytes_uploaded': 0})
+            meter.save()
+
+        metric = StageMetric.objects.get(run=self.run)
+        self.assertEqual(metric.peak_rss_mb, 1500.0)
+        self.assertGreaterEqual(metric.cpu_seconds, 1.0)
+
+    def test_sampler_raises_peak_of_running_stages(self):
+        sampler = metrics.RssSampler(interval=0.01)
+        meter = mock.Mock()
+        with mock.patch.object(metrics, 'get_rss_mb', return_value=300.0):
+            sampler.add(meter)
+            thread = sampler._thread
+            time.sleep(0.05)
+            sampler.remove(meter)
+            thread.join(timeout=1)
+
+        meter.observe_rss.assert_called_with(300.0)
+        self.assertIsNone(sampler._thread)
+
+
+class StatusSignatureTests(TestCase):
+    """بصمة حالة المعالجة لبث SSE (progress.get_status_signature) تتغير فقط مع ما تعرضه الصفحة"""
+
+    def setUp(self):
+        user = User.objects.create_user('member', password='secret')
+        self.meeting = Meeting.objects.create(title='اجتماع', date=datetime.date(2026, 1, 1), created_by=user)
+        self.run = ProcessingRun.objects.create(meeting=self.meeting, stage='diarization', stage_progress=10.2)
+
+    def update_run(self, **fields):
+        ProcessingRun.objects.filter(id=self.run.id).update(**fields)
+        return get_status_signature(self.meeting.id)
+
+    def test_heartbeat_does_not_change_signature(self):
+        before = get_status_signature(self.meeting.id)
+        self.assertEqual(self.update_run(updated_at=timezone.now() + datetime.timedelta(minutes=1)), before)
+
+    def test_fractional_progress_does_not_change_signature(self):
+        before = get_status_signature(self.meeting.id)
+        self.assertEqual(self.update_run(stage_progress=10.9), before)
+        self.assertNotEqual(self.update_run(stage_progress=11.0), before)
+
+    def test_stage_and_status_change_signature(self):
+        before = get_status_signature(self.meeting.id)
+        after_stage = self.update_run(stage='transcription', stage_progress=0.0)
+        self.assertNotEqual(after_stage, before)
+        self.assertNotEqual(self.update_run(status='failed'), after_stage)
+
+    def test_deleted_meeting_has_no_signature(self):
+        self.assertIsNone(get_status_signature(self.meeting.id + 1))
+
+
+class SpeechDetectionTests(AudioFileMixin, TestCase):
+    """اكتشاف فترات الكلام من طاقة الإطارات (frame_energies و find_speech_intervals)"""
+
+    # صمت، كلام، توقف قصير يُدمج، كلام، صمت، نقرة قصيرة تُحذف، صمت
+    PARTS = [(1, False), (2, True), (0.3, False), (0.7, True), (2, False), (0.1, True), (1.9, False)]
+
+    def test_frame_energies_of_tone_and_silence(self):
+        samples = make_signal([(1, True), (1, False)], amplitude=0.5)
+        energies = frame_energies(samples, PCM_SAMPLE_RATE, VAD_FRAME_SECONDS)
+
+        frames_per_second = int(1 / VAD_FRAME_SECONDS)
+        self.assertEqual(len(energies), len(samples) // int(PCM_SAMPLE_RATE * VAD_FRAME_SECONDS))
+        # RMS لموجة جيبية = السعة / جذر 2
+        np.testing.assert_allclose(energies[:frames_per_second - 1], 0.5 / np.sqrt(2), rtol=0.02)
+        np.testing.assert_array_equal(energies[frames_per_second + 1:], 0)
+
+    def test_frame_energies_blocks_and_float_input(self):
+        samples = make_signal(self.PARTS)
+        whole = frame_energies(samples, block_seconds=60)
+
+        np.testing.assert_allclose(frame_energies(samples, block_seconds=0.5), whole, rtol=1e-5)
+        np.testing.assert_allclose(frame_energies(samples.astype(np.float32) / 32768.0), whole, rtol=1e-4)
+
+    def test_find_speech_intervals(self):
+        energies = frame_energies(make_signal(self.PARTS), PCM_SAMPLE_RATE, VAD_FRAME_SECONDS)
+        intervals = find_speech_intervals(energies, keep_silence=0.1)
+
+        self.assertEqual(intervals.shape, (1, 2))
+        # من بداية الكلام (1s) إلى نهاية الجزء الثاني (4s) مع هامش keep_silence
+        self.assertAlmostEqual(float(intervals[0, 0]), 0.9, delta=VAD_FRAME_SECONDS + 0.01)
+        self.assertAlmostEqual(float(intervals[0, 1]), 4.1, delta=VAD_FRAME_SECONDS + 0.01)
+
+    def test_find_speech_intervals_keeps_separated_speech(self):
+        energies = frame_energies(make_signal([(1, True), (1, False), (1, True)]))
+        intervals = find_speech_intervals(energies, keep_silence=0)
+
+        np.testing.assert_allclose(intervals, [[0, 1], [2, 3]], atol=VAD_FRAME_SECONDS + 0.01)
+
+    def test_find_speech_intervals_of_silence(self):
+        intervals = find_speech_intervals(frame_energies(make_signal([(2, False)])))
+        self.assertEqual(intervals.shape, (0, 2))
+
+    def test_detect_speech_reuses_saved_intervals(self):
+        self.write_pcm(make_signal(self.PARTS))
+        intervals = detect_speech(self.audio_path)
+
+        with mock.patch.object(preprocessing, 'frame_energies', side_effect=AssertionError):
+            np.testing.assert_array_equal(detect_speech(self.audio_path), intervals)
+
+        # إعدادات مختلفة تعيد الحساب: بدون دمج التوقف القصير تنقسم الفترة
+        self.assertEqual(len(detect_speech(self.audio_path, min_silence_len=0.2, keep_silence=0)), 2)
+
+    def test_split_audio_by_silence_keeps_short_speech(self):
+        """مثل split_on_silence في pydub: النقرة القصيرة (0.1s) تبقى مقطعاً مستقلاً"""
+        self.write_pcm(make_signal(self.PARTS))
+        segments = split_audio_by_silence(self.audio_path, output_dir=self.directory)
+
+        self.assertEqual(len(segments), 2)
+        self.assertAlmostEqual(segments[1][2], 0.1 + 2 * 0.1, delta=2 * VAD_FRAME_SECONDS)
+        samples, _ = sf.read(segments[0][0], dtype='int16')
+        self.assertEqual(len(samples), int(round(segments[0][2] * PCM_SAMPLE_RATE)))
+
+
+class WaveformPeaksTests(AudioFileMixin, TestCase):
+    """قمم الموجة بعدة مستويات (compute_peaks) واختيار المستوى لعرض جزء (read_peaks)"""
+
+    def setUp(self):
+        super().setUp()
+        # خمس دقائق من عينات عشوائية، وطولها ليس مضاعفاً لأي مستوى
+        rng = np.random.default_rng(0)
+        self.samples = rng.integers(-20000, 20000, size=PCM_SAMPLE_RATE * 300 + 1234).astype(np.int16)
+        self.write_pcm(self.samples)
+
+    def load_level(self, level):
+        return np.load(get_peaks_path(self.audio_path, level))
+
+    def test_finest_level(self):
+        compute_peaks(self.audio_path)
+        finest = PEAK_LEVELS[0]
+        peaks = self.load_level(finest)
+
+        self.assertEqual(len(peaks), -(-len(self.samples) // finest))
+        frames = self.samples[:len(self.samples) // finest * finest].reshape(-1, finest)
+        np.testing.assert_array_equal(peaks[:len(frames), 0], frames.min(axis=1))
+        np.testing.assert_array_equal(peaks[:len(frames), 1], frames.max(axis=1))
+        # القمة الأخيرة من العينات الباقية فقط
+        tail = self.samples[len(frames) * finest:]
+        np.testing.assert_array_equal(peaks[-1], [tail.min(), tail.max()])
+
+    def test_coarser_levels_cover_finer(self):
+        compute_peaks(self.audio_path)
+        for level in PEAK_LEVELS:
+            peaks = self.load_level(level)
+            self.assertEqual(len(peaks), -(-len(self.samples) // level), level)
+            self.assertEqual(peaks[:, 0].min(), self.samples.min())
+            self.assertEqual(peaks[:, 1].max(), self.samples.max())
+
+        coarse = PEAK_LEVELS[2]
+        expected = self.samples[:coarse]
+        np.testing.assert_array_equal(self.load_level(coarse)[0], [expected.min(), expected.max()])
+
+    def test_block_size_does_not_change_peaks(self):
+        compute_peaks(self.audio_path, block_seconds=1)
+        small_blocks = {level: self.load_level(level) for level in PEAK_LEVELS}
+        shutil.rmtree(os.path.dirname(get_peaks_path(self.audio_path, PEAK_LEVELS[0])))
+
+        compute_peaks(self.audio_path)
+        for level in PEAK_LEVELS:
+            np.testing.assert_array_equal(self.load_level(level), small_blocks[level])
+
+    def test_existing_peaks_are_reused(self):
+        compute_peaks(self.audio_path)
+        with mock.patch.object(preprocessing, '_save_npy', side_effect=AssertionError):
+            compute_peaks(self.audio_path)
+
+    def test_read_peaks_level_selection(self):
+        compute_peaks(self.audio_path)
+        duration = len(self.samples) / PCM_SAMPLE_RATE
+
+        # التسجيل كاملاً في 1000 نقطة: أخشن مستوى يعطي 1000 قمة على الأقل
+        level, peaks, start = read_peaks(self.audio_path, 0, duration, 1000)
+        self.assertEqual(level, 4096)
+        self.assertGreaterEqual(len(peaks), 1000)
+        self.assertEqual(start, 0)
+
+        # ثانية واحدة لا تكفي 1000 قمة حتى بأدق مستوى
+        level, peaks, start = read_peaks(self.audio_path, 2.0, 3.0, 1000)
+        self.assertEqual(level, PEAK_LEVELS[0])
+        self.assertEqual(start, 2.0)
+        np.testing.assert_array_equal(peaks, self.load_level(level)[125:188])
+
+    def test_read_peaks_clamps_to_recording(self):
+        compute_peaks(self.audio_path)
+        duration = len(self.samples) / PCM_SAMPLE_RATE
+
+        level, peaks, start = read_peaks(self.audio_path, duration - 1, duration + 60, 10)
+        self.assertEqual(len(peaks), len(self.load_level(level)) - int((duration - 1) * PCM_SAMPLE_RATE) // level)
+
+
+class PcmSegmentTests(AudioFileMixin, TestCase):
+    """قص مقاطع من نسخة PCM (load_audio_segment) وتحويلها إلى WAV على دفعات"""
+
+    def setUp(self):
+        super().setUp()
+        self.samples = np.random.default_rng(0).integers(-3000, 3000, PCM_SAMPLE_RATE * 5).astype(np.int16)
+        self.write_pcm(self.samples)
+
+    def test_segment_is_sliced_by_sample_offsets(self):
+        segment = load_audio_segment(self.audio_path, 1.0, 2.5)
+
+        self.assertEqual(len(segment), 1500)
+        np.testing.assert_array_equal(np.array(segment.get_array_of_samples()), self.samples[16000:40000])
+
+    def test_segment_bounds_are_clamped(self):
+        self.assertEqual(len(load_audio_segment(self.audio_path)), 5000)
+        self.assertEqual(len(load_audio_segment(self.audio_path, 4.5, 10)), 500)
+        self.assertEqual(len(load_audio_segment(self.audio_path, 6, 7)), 0)
+
+    def test_convert_to_wav_in_blocks(self):
+        wav_path = convert_audio_to_wav(self.audio_path, block_seconds=1.3)
+        samples, sample_rate = sf.read(wav_path, dtype='int16')
+
+        self.assertEqual(sample_rate, PCM_SAMPLE_RATE)
+        np.testing.assert_array_equal(samples, self.samples)
+
+
+class EncodeForUploadTests(AudioFileMixin, TestCase):
+    """ترميز جزء من نسخة PCM للرفع إلى Whisper (encode_for_upload)"""
+
+    def setUp(self):
+        super().setUp()
+        self.samples = np.random.default_rng(0).integers(-3000, 3000, PCM_SAMPLE_RATE * 5).astype(np.int16)
+        self.write_pcm(self.samples)
+
+    def test_encodes_requested_range(self):
+        path = encode_for_upload(self.audio_path, 1.0, 2.5, 'wav')
+        samples, sample_rate = sf.read(path, dtype='int16')
+
+        self.assertEqual(os.path.basename(path), '16000-40000.wav')
+        self.assertEqual(sample_rate, PCM_SAMPLE_RATE)
+        np.testing.assert_array_equal(samples, self.samples[16000:40000])
+
+    def test_range_is_clamped_to_recording(self):
+        path = encode_for_upload(self.audio_path, 4.0, 60.0, 'wav')
+        samples, _ = sf.read(path, dtype='int16')
+        np.testing.assert_array_equal(samples, self.samples[64000:])
+
+    def test_compressed_upload_keeps_duration(self):
+        path = encode_for_upload(self.audio_path, 0.0, 2.0, 'opus')
+        info = sf.info(path)
+
+        self.assertEqual(info.samplerate, PCM_SAMPLE_RATE)
+        self.assertEqual(info.channels, 1)
+        self.assertAlmostEqual(info.duration, 2.0, delta=0.05)
+
+    def test_existing_upload_is_reused(self):
+        path = encode_for_upload(self.audio_path, 0.0, 1.0, 'wav')
+        with mock.patch.object(preprocessing, 'encode_pcm_range', side_effect=AssertionError):
+            self.assertEqual(encode_for_upload(self.audio_path, 0.0, 1.0, 'wav'), path)
+
+
+class EnhanceAudioQualityTests(AudioFileMixin, TestCase):
+    """ترشيح الصوت على دفعات في enhance_audio_quality يطابق ترشيح الإشارة كاملة"""
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.samples = rng.integers(-8000, 8000, PCM_SAMPLE_RATE * 3).astype(np.int16)
+        self.write_pcm(self.samples)
+
+    def read_enhanced(self, **kwargs):
+        path = enhance_audio_quality(self.audio_path, **kwargs)
+        samples, sample_rate = sf.read(path, dtype='float32')
+        self.assertEqual(sample_rate, PCM_SAMPLE_RATE)
+        self.assertEqual(samples.ndim, 1)
+        return samples
+
+    def test_blocks_match_whole_signal(self):
+        # حجم دفعة لا يقسم الإشارة بالتساوي، فتُختبر عدة حدود ودفعة أخيرة ناقصة
+        enhanced = self.read_enhanced(block_seconds=0.37)
+
+        filtered = signal.sosfilt(_enhancement_filter(PCM_SAMPLE_RATE), pcm_to_float(self.samples))
+        rms = np.sqrt(np.mean(filtered ** 2))
+        gain = min(10 ** (-20.0 / 20) / rms, 10 ** (-0.1 / 20) / np.max(np.abs(filtered)))
+        expected = np.clip(filtered * gain, -1.0, 1.0)
+
+        self.assertEqual(len(enhanced), len(self.samples))
+        np.testing.assert_allclose(enhanced, expected, atol=2 / 32768)
+
+    def test_block_boundaries_are_continuous(self):
+        """حالة المرشح تنتقل بين الدفعات: لا فرق عند الحدود عن الترشيح دفعة واحدة"""
+        whole = self.read_enhanced(block_seconds=60)
+        blocked = self.read_enhanced(block_seconds=0.25)
+
+        # الكسب يُحسب من مجموع الدفعات فقد يختلف في آخر خانة، أي فرق عينة int16 واحدة على الأكثر
+        boundaries = np.arange(4000, len(whole), 4000)
+        for offset in (-1, 0, 1):
+            np.testing.assert_allclose(blocked[boundaries + offset], whole[boundaries + offset], atol=1 / 32768)
+        np.testing.assert_allclose(blocked, whole, atol=1 / 32768)
+
+    def test_low_pass_below_nyquist(self):
+        """قطع low-pass يُخفض إلى 7.2kHz في نسخة 16kHz، فيُخفف ما فوقه"""
+        t = np.arange(PCM_SAMPLE_RATE * 2) / PCM_SAMPLE_RATE
+        tones = 0.2 * np.sin(2 * np.pi * 1000 * t) + 0.2 * np.sin(2 * np.pi * 7900 * t)
+        self.write_pcm((tones * 32767).astype(np.int16))
+
+        spectrum = np.abs(np.fft.rfft(self.read_enhanced()[PCM_SAMPLE_RATE:]))
+        frequencies = np.fft.rfftfreq(PCM_SAMPLE_RATE, 1 / PCM_SAMPLE_RATE)
+        passband = spectrum[frequencies == 1000][0]
+        stopband = spectrum[frequencies == 7900][0]
+        self.assertLess(stopband / passband, 0.6)
+
+
+class ChunkedUploadTests(TestCase):
+    """رفع التسجيل على أجزاء (write_chunk) وإنشاء الاجتماع منه (finalize_upload)"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            UPLOAD_SESSIONS_DIR=os.path.join(self.media_root, 'upload_sessions'),
+            UPLOAD_CHUNK_MAX_BYTES=4096,
+        )
+        self.settings_override.enable()
+
+        self.user = User.objects.create_user('member', password='secret')
+        self.content = os.urandom(10000)
+        self.session = UploadSession.objects.create(
+            created_by=self.user, filename='meeting.mp3', size=len(self.content),
+            title='اجتماع', date=datetime.date(2026, 1, 1),
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def send(self, start, end, checksum=None):
+        data = self.content[start:end + 1]
+        return write_chunk(self.session, start, end, io.BytesIO(data), checksum or hashlib.sha256(data).hexdigest())
+
+    def upload_all(self, chunk_size=4096):
+        for start in range(0, len(self.content), chunk_size):
+            self.send(start, min(start + chunk_size, len(self.content)) - 1)
+
+    def test_chunks_are_written_in_order(self):
+        self.assertEqual(self.send(0, 4095), 4096)
+        self.assertEqual(self.send(4096, 8191), 8192)
+
+        self.assertEqual(UploadSession.objects.get(id=self.session.id).received, 8192)
+        with open(get_part_path(self.session), 'rb') as f:
+            self.assertEqual(f.read(), self.content[:8192])
+
+    def test_chunk_at_wrong_offset(self):
+        self.send(0, 4095)
+
+        for start in (0, 8192):
+            with self.assertRaises(UploadOffsetMismatch) as raised:
+                self.send(start, start + 99)
+            self.assertEqual(raised.exception.offset, 4096)
+
+    def test_repeated_chunk_from_stale_session(self):
+        """طلب مكرر بنسخة قديمة من الجلسة لا يُحتسب مرتين"""
+        stale = UploadSession.objects.get(id=self.session.id)
+        self.send(0, 4095)
+
+        data = self.content[:4096]
+        with self.assertRaises(UploadOffsetMismatch) as raised:
+            write_chunk(stale, 0, 4095, io.BytesIO(data), hashlib.sha256(data).hexdigest())
+        self.assertEqual(raised.exception.offset, 4096)
+        self.assertEqual(UploadSession.objects.get(id=self.session.id).received, 4096)
+
+    def test_checksum_mismatch_keeps_resume_offset(self):
+        self.send(0, 4095)
+
+        with self.assertRaises(UploadError):
+            self.send(4096, 8191, checksum=hashlib.sha256(b'other').hexdigest())
+
+        self.assertEqual(UploadSession.objects.get(id=self.session.id).received, 4096)
+        self.assertEqual(os.path.getsize(get_part_path(self.session)), 4096)
+        self.assertEqual(self.send(4096, 8191), 8192)
+
+    def test_truncated_chunk_is_rejected(self):
+        data = self.content[:100]
+        with self.assertRaises(UploadError):
+            write_chunk(self.session, 0, 199, io.BytesIO(data), hashlib.sha256(data).hexdigest())
+        self.assertEqual(UploadSession.objects.get(id=self.session.id).received, 0)
+
+    def test_invalid_ranges(self):
+        for start, end in ((100, 50), (0, len(self.content)), (0, 4096)):
+            with self.assertRaises(UploadError):
+                write_chunk(self.session, start, end, io.BytesIO(b''), '')
+
+    def test_finalize_creates_meeting_and_job(self):
+        self.upload_all()
+        meeting = finalize_upload(self.session)
+
+        self.assertEqual(meeting.title, 'اجتماع')
+        self.assertEqual(meeting.created_by, self.user)
+        self.assertEqual(meeting.audio_sha256, hashlib.sha256(self.content).hexdigest())
+        with open(meeting.audio_file.path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(get_part_path(self.session)))
+        self.assertEqual(ProcessingJob.objects.get(meeting=meeting).priority, self.session.priority)
+
+        session = UploadSession.objects.get(id=self.session.id)
+        self.assertEqual(session.status, 'complete')
+        self.assertEqual(session.meeting, meeting)
+
+    def test_finalize_twice_returns_same_meeting(self):
+        self.upload_all()
+        meeting = finalize_upload(self.session)
+
+        again = finalize_upload(UploadSession.objects.get(id=self.session.id))
+        self.assertEqual(again.id, meeting.id)
+        self.assertEqual(Meeting.objects.count(), 1)
+
+    def test_finalize_incomplete_upload(self):
+        self.send(0, 4095)
+
+        with self.assertRaises(UploadError):
+            finalize_upload(self.session)
+        self.assertEqual(UploadSession.objects.get(id=self.session.id).status, 'uploading')
+
+    def test_no_chunks_after_completion(self):
+        self.upload_all()
+        finalize_upload(self.session)
+
+        with self.assertRaises(UploadError):
+            self.send(0, 99)
+
+
+class DiarizationInputsTests(TestCase):
+    """مدخلات مفتاح مرحلة diarization تشمل المتحدثين المسجلين (tasks_enhanced.get_diarization_inputs)"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.speaker = Speaker.objects.create(name='أحمد', position='رئيس المجلس', voice_embedding=b'first')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_enrolling_speaker_changes_inputs(self):
+        before = get_diarization_inputs()
+        Speaker.objects.create(name='سارة', position='المدير المالي', voice_embedding=b'second')
+        self.assertNotEqual(get_diarization_inputs(), before)
+
+    def test_new_embedding_changes_inputs(self):
+        before = get_diarization_inputs()
+        self.speaker.voice_embedding = b'rerecorded'
+        self.speaker.save()
+        self.assertNotEqual(get_diarization_inputs(), before)
+
+    def test_new_reference_audio_changes_inputs(self):
+        self.speaker.reference_audio.save('ahmed.wav', ContentFile(b'first recording'))
+        before = get_diarization_inputs()
+
+        path = self.speaker.reference_audio.path
+        with open(path, 'wb') as f:
+            f.write(b'a longer second recording')
+        self.assertNotEqual(get_diarization_inputs(), before)
+
+    def test_speakers_without_voice_do_not_change_inputs(self):
+        """المتحدثون غير المعروفين الذين تنشئهم المرحلة نفسها لا يغيرون مفتاحها"""
+        before = get_diarization_inputs()
+        Speaker.objects.create(name='متحدث SPEAKER_01', position='غير محدد', speaker_type='unknown')
+        self.assertEqual(get_diarization_inputs(), before)
+
+
+class DuplicateMeetingReuseTests(TestCase):
+    """إعادة استخدام نواتج اجتماع مكرر (نفس التسجيل): MeetingPipeline.clone_artifact وreuse_decoded_audio"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            PIPELINE_ARTIFACTS_DIR=os.path.join(self.media_root, 'pipeline_artifacts'),
+        )
+        self.settings_override.enable()
+        self.user = User.objects.create_user('member', password='secret')
+        self.first = self.create_meeting('first.wav', b'same recording')
+        self.second = self.create_meeting('second.wav', b'same recording')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def create_meeting(self, name, content):
+        meeting = Meeting(title='اجتماع', date=datetime.date(2026, 1, 1), created_by=self.user)
+        meeting.audio_file.save(name, ContentFile(content), save=False)
+        meeting.audio_sha256 = hashlib.sha256(content).hexdigest()
+        meeting.save()
+        return meeting
+
+    def test_stage_is_cloned_from_duplicate(self):
+        segments = [{'start': 0.0, 'end': 1.5, 'text': 'بسم الله'}]
+        MeetingPipeline(self.first).run_stage('transcription', lambda: segments, inputs={'model': 'whisper-1'})
+
+        pipeline = MeetingPipeline(self.second)
+        result = pipeline.run_stage('transcription', mock.Mock(side_effect=AssertionError), inputs={'model': 'whisper-1'})
+        self.assertEqual(result, segments)
+
+        # الناتج يُنسخ إلى مجلد الاجتماع الثاني فلا يتأثر بحذف الأول
+        checkpoint = PipelineCheckpoint.objects.get(meeting=self.second, stage='transcription')
+        self.assertTrue(checkpoint.artifact_path.startswith(get_artifacts_dir(self.second)))
+        shutil.rmtree(get_artifacts_dir(self.first))
+        self.assertEqual(pipeline.load_artifact('transcription', checkpoint.input_hash), (segments, True))
+
+    def test_different_inputs_are_not_cloned(self):
+        MeetingPipeline(self.first).run_stage('transcription', lambda: ['old'], inputs={'model': 'whisper-1'})
+
+        fn = mock.Mock(return_value=['new'])
+        result = MeetingPipeline(self.second).run_stage('transcription', fn, inputs={'model': 'whisper-2'})
+        self.assertEqual(result, ['new'])
+        fn.assert_called_once()
+
+    def test_different_recording_is_not_cloned(self):
+        MeetingPipeline(self.first).run_stage('transcription', lambda: ['first'])
+        other = self.create_meeting('other.wav', b'another recording')
+
+        fn = mock.Mock(return_value=['other'])
+        self.assertEqual(MeetingPipeline(other).run_stage('transcription', fn), ['other'])
+        fn.assert_called_once()
+
+    def write_pcm(self, meeting, samples):
+        path = meeting.audio_file.path
+        mtime = os.path.getmtime(path) - 10
+        os.utime(path, (mtime, mtime))
+        np.save(get_pcm_path(path), samples, allow_pickle=False)
+
+    def test_decoded_audio_is_reused(self):
+        samples = make_signal([(0.5, True)])
+        self.write_pcm(self.first, samples)
+
+        self.assertTrue(MeetingPipeline(self.second).reuse_decoded_audio())
+        np.testing.assert_array_equal(np.load(get_pcm_path(self.second.audio_file.path)), samples)
+
+    def test_decoded_audio_of_other_recording_is_not_reused(self):
+        self.write_pcm(self.first, make_signal([(0.5, True)]))
+        other = self.create_meeting('other.wav', b'another recording')
+
+        self.assertFalse(MeetingPipeline(other).reuse_decoded_audio())
+        self.assertFalse(os.path.exists(get_pcm_path(other.audio_file.path)))
+
+    def test_stale_pcm_of_duplicate_is_not_reused(self):
+        """نسخة PCM أقدم من ملف الاجتماع المكرر لا تُربط"""
+        np.save(get_pcm_path(self.first.audio_file.path), make_signal([(0.5, True)]), allow_pickle=False)
+        os.utime(get_pcm_path(self.first.audio_file.path), (0, 0))
+
+        self.assertFalse(MeetingPipeline(self.second).reuse_decoded_audio())
+
+
+class SegmentClipTests(AudioFileMixin, TestCase):
+    """مقاطع التشغيل المخزنة لكل مقطع نصي (clips.get_segment_clip) وإخلاؤها (clips.evict_clips)"""
+
+    def setUp(self):
+        super().setUp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.directory,
+            SEGMENT_CLIPS_DIR=os.path.join(self.directory, 'clips'),
+            SEGMENT_CLIPS_FORMAT='wav',
+        )
+        self.settings_override.enable()
+
+        self.samples = np.random.default_rng(0).integers(-3000, 3000, PCM_SAMPLE_RATE * 5).astype(np.int16)
+        user = User.objects.create_user('member', password='secret')
+        self.meeting = Meeting.objects.create(
+            title='اجتماع', date=datetime.date(2026, 1, 1), created_by=user, audio_file='meeting.wav'
+        )
+        self.write_pcm(self.samples)
+        self.segment = TranscriptSegment.objects.create(
+            meeting=self.meeting, start_time=1.0, end_time=2.5, text='نقرر الموافقة', is_decision=True
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        super().tearDown()
+
+    def write_clip(self, name, size, age):
+        path = os.path.join(clips.get_clips_dir(), name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_clip_is_cut_from_pcm(self):
+        path = clips.get_segment_clip(self.segment)
+        samples, _ = sf.read(path, dtype='int16')
+        np.testing.assert_array_equal(samples, self.samples[16000:40000])
+
+    def test_legacy_meeting_does_not_hash_recording_in_request(self):
+        """اجتماع بدون بصمة محفوظة: مفتاح سريع بدون قراءة الملف كاملاً"""
+        with mock.patch('audio_processing.pipeline.compute_file_hash', side_effect=AssertionError):
+            path = clips.get_segment_clip(self.segment)
+
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(Meeting.objects.get(id=self.meeting.id).audio_sha256, '')
+        self.assertEqual(clips.get_segment_clip(self.segment, create=False), path)
+
+    def test_stored_hash_is_shared_by_duplicates(self):
+        Meeting.objects.filter(id=self.meeting.id).update(audio_sha256='ab' * 32)
+        self.meeting.refresh_from_db()
+
+        path = clips.get_segment_clip(self.segment)
+        self.assertTrue(os.path.basename(path).startswith('ab' * 32))
+
+    def test_cached_clip_is_touched(self):
+        path = clips.get_segment_clip(self.segment)
+        os.utime(path, (0, 0))
+
+        with mock.patch.object(clips, 'encode_pcm_range', side_effect=AssertionError):
+            self.assertEqual(clips.get_segment_clip(self.segment), path)
+        self.assertGreater(os.path.getmtime(path), time.time() - 60)
+
+    def test_eviction_removes_least_recently_used_to_90_percent(self):
+        paths = [self.write_clip(f'aa/clip-{age}.wav', 100, age) for age in (50, 40, 30, 20, 10)]
+        in_progress = self.write_clip('aa/clip-new.wav.1.2.tmp', 100, 100)
+
+        # 500 بايت فوق الحد 400: الحذف حتى 360 بايت (وليس 400 فقط)، أي أقدم مقطعين
+        self.assertEqual(clips.evict_clips(max_bytes=400), 2)
+        self.assertEqual([os.path.exists(path) for path in paths], [False, False, True, True, True])
+        self.assertTrue(os.path.exists(in_progress))
+
+    def test_no_eviction_under_cap(self):
+        paths = [self.write_clip(f'aa/clip-{age}.wav', 100, age) for age in (30, 20, 10)]
+
+        self.assertEqual(clips.evict_clips(max_bytes=300), 0)
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+    def test_prewarm_decision_clips(self):
+        TranscriptSegment.objects.create(meeting=self.meeting, start_time=3.0, end_time=4.0, text='نص عادي')
+        self.assertEqual(clips.prewarm_segment_clips(self.meeting.id), 1)
@@ -0,0 +1,175 @@
+# audio_processing/uploads.py - رفع تسجيلات الاجتماعات على أجزاء قابلة للاستئناف
+
+import os
+import shutil
+import hashlib
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from transcription.models import Meeting
+from .models import UploadSession
+from .jobs import enqueue_meeting
+from .pipeline import compute_file_hash
+
+logger = logging.getLogger(__name__)
+
+# حجم القراءة من جسم الطلب أثناء كتابة الجزء
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """طلب رفع غير صالح (جلسة منتهية، حدود خاطئة، بصمة غير مطابقة)"""
+
+
+class UploadOffsetMismatch(UploadError):
+    """الجزء لا يبدأ من موضع الاستئناف الحالي، فيعيد العميل الإرسال منه"""
+
+    def __init__(self, offset):
+        super().__init__(f"Expected chunk at offset {offset}")
+        self.offset = offset
+
+
+def get_uploads_dir():
+    return getattr(settings, 'UPLOAD_SESSIONS_DIR', os.path.join(settings.MEDIA_ROOT, 'upload_sessions'))
+
+
+def get_chunk_max_bytes():
+    return getattr(settings, 'UPLOAD_CHUNK_MAX_BYTES', 16 * 1024 * 1024)
+
+
+def get_part_path(session):
+    """الملف الذي تُكتب فيه الأجزاء المستلمة حتى اكتمال الرفع"""
+    return os.path.join(get_uploads_dir(), f"{session.id}.part")
+
+
+def get_resume_offset(session):
+    """
+    موضع الاستئناف: البايتات المستلمة المؤكدة
+
+    إذا كان ملف الأجزاء أقصر مما سُجل (توقف الخادم قبل كتابته على القرص)
+    يُرجع الموضع إلى طول الملف
+    """
+    part_path = get_part_path(session)
+    on_disk = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if on_disk < session.received:
+        UploadSession.objects.filter(id=session.id, received=session.received).update(received=on_disk)
+        session.received = on_disk
+    return session.received
+
+
+def write_chunk(session, start, end, stream, checksum):
+    """
+    كتابة جزء [start, end] (شامل) من جسم الطلب في ملف الأجزاء
+
+    الجزء يُقرأ ويُكتب على دفعات مع حساب SHA-256، فلا يُحمّل في الذاكرة.
+    إذا لم تطابق البصمة checksum يُحذف ما كُتب ويبقى موضع الاستئناف كما هو
+
+    Returns:
+        int: موضع الاستئناف الجديد
+    """
+    if session.status != 'uploading':
+        raise UploadError(f"Upload {session.id} is {session.status}")
+    if end < start or end >= session.size:
+        raise UploadError(f"Invalid chunk range {start}-{end} for size {session.size}")
+    if end - start + 1 > get_chunk_max_bytes():
+        raise UploadError(f"Chunk larger than {get_chunk_max_bytes()} bytes")
+
+    offset = get_resume_offset(session)
+    if start != offset:
+        raise UploadOffsetMismatch(offset)
+
+    part_path = get_part_path(session)
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+
+    digest = hashlib.sha256()
+    remaining = end - start + 1
+    with open(part_path, 'r+b' if os.path.exists(part_path) else 'wb') as f:
+        f.seek(start)
+        f.truncate()
+        while remaining > 0:
+            data = stream.read(min(READ_BLOCK_SIZE, remaining))
+            if not data:
+                break
+            digest.update(data)
+            f.write(data)
+            remaining -= len(data)
+
+        if remaining or digest.hexdigest() != checksum.lower():
+            f.truncate(start)
+            raise UploadError("Chunk is incomplete or its checksum does not match")
+
+    # التحديث مشروط بالموضع القديم، فلا يُحتسب نفس الجزء مرتين عند تكرار الطلب
+    if not UploadSession.objects.filter(id=session.id, status='uploading', received=start).update(
+            received=end + 1, updated_at=timezone.now()):
+        session.refresh_from_db()
+        raise UploadOffsetMismatch(session.received)
+
+    session.received = end + 1
+    return session.received
+
+
+def finalize_upload(session):
+    """
+    إنشاء الاجتماع من ملف مكتمل وإضافته إلى طابور المعالجة
+
+    الملف يُنقل إلى مجلد التسجيلات بدلاً من نسخه، والتحويل إلى complete مشروط
+    فلا يُنشأ اجتماعان إذا تكرر طلب الإنهاء
+
+    Returns:
+        Meeting
+    """
+    if session.status == 'complete' and session.meeting_id:
+        return session.meeting
+    if get_resume_offset(session) != session.size:
+        raise UploadError(f"Upload {session.id} has {session.received} of {session.size} bytes")
+
+    if not UploadSession.objects.filter(id=session.id, status='uploading', received=session.size).update(
+            status='complete'):
+        session.refresh_from_db()
+        if session.status == 'complete' and session.meeting_id:
+            return session.meeting
+        raise UploadError(f"Upload {session.id} cannot be finalized")
+
+    part_path = get_part_path(session)
+    audio_sha256 = compute_file_hash(part_path)
+
+    audio_field = Meeting._meta.get_field('audio_file')
+    name = default_storage.get_available_name(audio_field.generate_filename(None, session.filename))
+    destination = default_storage.path(name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    shutil.move(part_path, destination)
+
+    meeting = Meeting.objects.create(
+        title=session.title,
+        date=session.date,
+        description=session.description,
+        audio_file=name,
+        audio_sha256=audio_sha256,
+        created_by=session.created_by,
+    )
+    UploadSession.objects.filter(id=session.id).update(meeting=meeting)
+    session.status = 'complete'
+    session.meeting = meeting
+
+    enqueue_meeting(meeting, priority=session.priority)
+    logger.info(f"Upload {session.id} finalized as meeting {meeting.id}")
+    return meeting
+
+
+def expire_upload_sessions():
+    """حذف ملفات الأجزاء للجلسات المتوقفة أكثر من UPLOAD_SESSION_EXPIRY_HOURS"""
+    hours = getattr(settings, 'UPLOAD_SESSION_EXPIRY_HOURS', 48)
+    stale = UploadSession.objects.filter(
+        status='uploading', updated_at__lt=timezone.now() - timedelta(hours=hours)
+    )
+
+    expired = 0
+    for session in stale:
+        # ومعها عينات فك الترميز أثناء الرفع إن بقيت من عامل توقف (audio_processing.ingest)
+        for path in (get_part_path(session), os.path.join(get_uploads_dir(), f"{session.id}.pcm16k.raw")):
+            if os.path.exists(path):
+                os.remove(path)
+        expired += UploadSession.objects.filter(id=session.id, status='uploading').update(status='expired')
+    return expired
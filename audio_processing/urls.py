@@ -7,9 +7,15 @@ app_name = 'audio_processing'
 
 urlpatterns = [
     path('upload/', views.upload_meeting, name='upload_meeting'),
+    path('uploads/', views.create_upload_session, name='create_upload_session'),
+    path('uploads/<uuid:session_id>/', views.upload_session_status, name='upload_session_status'),
+    path('uploads/<uuid:session_id>/chunk/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:session_id>/finalize/', views.finalize_upload_session, name='finalize_upload_session'),
     path('process/<int:meeting_id>/', views.process_meeting, name='process_meeting'),
     path('status/<int:meeting_id>/', views.processing_status, name='processing_status'),
+    path('cancel/<int:meeting_id>/', views.cancel_processing, name='cancel_processing'),
     path('check_status/<int:meeting_id>/', views.check_processing_status, name='check_status'),
+    path('stream_status/<int:meeting_id>/', views.stream_processing_status, name='stream_status'),
     path('debug/', views.debug_openai, name='debug_openai'),
 
 ]
\ No newline at end of file
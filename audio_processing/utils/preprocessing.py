@@ -1,15 +1,415 @@
 # audio_processing/utils/preprocessing.py
 
 import os
+import shutil
+import logging
+import tempfile
+import threading
+import contextlib
+import subprocess
 import librosa
 import numpy as np
+import soundfile as sf
+from scipy import signal
 from pydub import AudioSegment
-from pydub.silence import split_on_silence
 
+logger = logging.getLogger(__name__)
 
-def convert_audio_to_wav(audio_file_path, output_dir=None):
+# صيغة نسخة PCM المشتركة بين مراحل المعالجة: 16kHz أحادي القناة int16
+PCM_SAMPLE_RATE = 16000
+PCM_SUFFIX = '.pcm16k.npy'
+
+# صيغ النسخ المضغوطة (الرفع إلى خدمة النسخ ومقاطع التشغيل): (صيغة الملف، الترميز، الامتداد) في libsndfile
+ENCODING_FORMATS = {
+    'opus': ('OGG', 'OPUS', '.ogg'),
+    'mp3': ('MP3', 'MPEG_LAYER_III', '.mp3'),
+    'wav': ('WAV', 'PCM_16', '.wav'),
+}
+UPLOAD_SUFFIX = '.upload'
+
+# ملفات قمم الموجة الصوتية لعرضها في صفحة الاجتماع: مستوى لكل عدد عينات في القمة الواحدة
+PEAKS_SUFFIX = '.peaks'
+PEAK_LEVELS = (256, 1024, 4096, 16384, 65536)
+
+# فترات الكلام المكتشفة لكل ملف (detect_speech)
+VAD_SUFFIX = '.vad.npz'
+VAD_FRAME_SECONDS = 0.03
+
+
+def get_audio_duration(audio_file_path):
+    """
+    مدة الملف الصوتي بالثواني من ترويسة الملف (بدون فك ترميزه)، أو None إذا تعذرت قراءتها
+    """
+    try:
+        return librosa.get_duration(path=audio_file_path)
+    except Exception:
+        return None
+
+
+def get_pcm_path(audio_file_path):
+    """مسار نسخة PCM بجانب الملف الصوتي الأصلي"""
+    name, _ = os.path.splitext(audio_file_path)
+    return f"{name}{PCM_SUFFIX}"
+
+
+def decode_to_pcm(audio_file_path):
+    """
+    فك ترميز الملف الصوتي مرة واحدة إلى ملف .npy (16kHz أحادي int16) بجانبه
+
+    إذا وُجدت نسخة أحدث من الملف الأصلي تُستخدم مباشرة، فلا يُعاد فك الترميز عند
+    إعادة المعالجة. ffmpeg يكتب العينات إلى ملف مؤقت ثم تُنسخ على دفعات خلف ترويسة
+    npy، فلا يُحمل الصوت كاملاً في الذاكرة
+
+    Returns:
+        str: مسار ملف PCM
+    """
+    pcm_path = get_pcm_path(audio_file_path)
+    if os.path.exists(pcm_path) and os.path.getmtime(pcm_path) >= os.path.getmtime(audio_file_path):
+        return pcm_path
+
+    # أسماء مؤقتة خاصة بالعملية والخيط، والاستبدال الذري يجعل النسخة تظهر كاملة أو لا تظهر
+    raw_path = f"{pcm_path}.{os.getpid()}.{threading.get_ident()}.raw.tmp"
+    temp_path = f"{pcm_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            subprocess.run(
+                ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-i', audio_file_path,
+                 '-ac', '1', '-ar', str(PCM_SAMPLE_RATE), '-f', 's16le', '-acodec', 'pcm_s16le', raw_path],
+                check=True,
+            )
+        except FileNotFoundError:
+            # ffmpeg غير مثبت: فك الترميز في الذاكرة عبر librosa
+            logger.warning("ffmpeg not found, decoding with librosa")
+            samples, _ = librosa.load(audio_file_path, sr=PCM_SAMPLE_RATE, mono=True)
+            np.save(temp_path, _float_to_pcm(samples), allow_pickle=False)
+            os.replace(f"{temp_path}.npy", pcm_path)
+            return pcm_path
+
+        num_samples = store_raw_pcm(raw_path, audio_file_path)
+        logger.info(f"Decoded {audio_file_path} to PCM ({num_samples / PCM_SAMPLE_RATE:.1f}s)")
+        return pcm_path
+    finally:
+        for path in (raw_path, temp_path, f"{temp_path}.npy"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def store_raw_pcm(raw_path, audio_file_path):
+    """
+    حفظ عينات s16le خام (16kHz أحادي) كنسخة PCM للملف الصوتي
+
+    العينات تُنسخ على دفعات خلف ترويسة npy إلى ملف مؤقت ثم تُستبدل النسخة ذرياً
+
+    Returns:
+        int: عدد العينات
+    """
+    pcm_path = get_pcm_path(audio_file_path)
+    temp_path = f"{pcm_path}.{os.getpid()}.{threading.get_ident()}.npy.tmp"
+    num_samples = os.path.getsize(raw_path) // 2
+    try:
+        with open(temp_path, 'wb') as out, open(raw_path, 'rb') as raw:
+            np.lib.format.write_array_header_1_0(
+                out, {'descr': '<i2', 'fortran_order': False, 'shape': (num_samples,)}
+            )
+            shutil.copyfileobj(raw, out, 4 * 1024 * 1024)
+            # بايت زائد من عينة غير مكتملة لا يدخل في الترويسة
+            out.truncate(out.tell() - os.path.getsize(raw_path) % 2)
+        os.replace(temp_path, pcm_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return num_samples
+
+
+def reuse_pcm(audio_file_path, source_audio_file_path):
+    """
+    استخدام نسخة PCM لملف آخر بنفس المحتوى (تسجيل مرفوع أكثر من مرة)
+
+    النسخة تُربط بـ hard link إن أمكن (وإلا تُنسخ) ثم يُحدث تاريخها حتى تُعد أحدث من الملف
+
+    Returns:
+        bool: أصبحت للملف نسخة PCM صالحة
+    """
+    pcm_path = get_pcm_path(audio_file_path)
+    if os.path.exists(pcm_path) and os.path.getmtime(pcm_path) >= os.path.getmtime(audio_file_path):
+        return True
+
+    source_pcm_path = get_pcm_path(source_audio_file_path)
+    if not os.path.exists(source_pcm_path) or \
+            os.path.getmtime(source_pcm_path) < os.path.getmtime(source_audio_file_path):
+        return False
+
+    temp_path = f"{pcm_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            os.link(source_pcm_path, temp_path)
+        except OSError:
+            shutil.copyfile(source_pcm_path, temp_path)
+        os.utime(temp_path)
+        os.replace(temp_path, pcm_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return True
+
+
+def _float_to_pcm(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+
+
+def load_pcm(audio_file_path):
+    """
+    عينات الملف الصوتي كمصفوفة int16 مربوطة بالملف (memmap)
+    القراءة تتم عند الحاجة فقط، فقص مقطع لا يحمّل الاجتماع كاملاً
+    """
+    return np.load(decode_to_pcm(audio_file_path), mmap_mode='r')
+
+
+def get_pcm_duration(audio_file_path):
+    """مدة الصوت من نسخة PCM الصالحة، أو None إذا لم يُفك ترميزه بعد"""
+    pcm_path = get_pcm_path(audio_file_path)
+    if not os.path.exists(pcm_path) or os.path.getmtime(pcm_path) < os.path.getmtime(audio_file_path):
+        return None
+    return len(np.load(pcm_path, mmap_mode='r')) / PCM_SAMPLE_RATE
+
+
+def pcm_to_float(samples):
+    """تحويل عينات int16 إلى float32 في المدى [-1, 1]"""
+    return np.asarray(samples, dtype=np.float32) / 32768.0
+
+
+def read_pcm_segment(audio_file_path, start_time, end_time=None):
+    """
+    قراءة مقطع من الصوت (بالثواني، end_time=None حتى نهاية الملف) كمصفوفة float32 بمعدل PCM_SAMPLE_RATE
+    """
+    samples = load_pcm(audio_file_path)
+    start = max(0, int(start_time * PCM_SAMPLE_RATE))
+    end = len(samples) if end_time is None else min(len(samples), int(end_time * PCM_SAMPLE_RATE))
+    return pcm_to_float(samples[start:end])
+
+
+def get_upload_dir(audio_file_path):
+    """مجلد النسخ المضغوطة المرفوعة إلى خدمة النسخ بجانب الملف الصوتي الأصلي"""
+    name, _ = os.path.splitext(audio_file_path)
+    return f"{name}{UPLOAD_SUFFIX}"
+
+
+def _available_format(audio_format):
+    """الصيغة المطلوبة إذا كانت نسخة libsndfile المثبتة تدعمها، وإلا WAV"""
+    container, subtype, _ = ENCODING_FORMATS[audio_format]
+    if audio_format != 'wav' and subtype not in sf.available_subtypes(container):
+        logger.warning(f"libsndfile cannot encode {audio_format}, using WAV instead")
+        return 'wav'
+    return audio_format
+
+
+def get_format_extension(audio_format):
+    """امتداد الملف الناتج عن encode_pcm_range بهذه الصيغة"""
+    return ENCODING_FORMATS[_available_format(audio_format)][2]
+
+
+def encode_pcm_range(samples, start, end, output_path, audio_format='opus'):
+    """
+    ترميز العينات [start, end) من نسخة PCM إلى ملف مضغوط (كتابة ذرية على دفعات)
+
+    Returns:
+        str: مسار الملف
+    """
+    container, subtype, _ = ENCODING_FORMATS[_available_format(audio_format)]
+
+    temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with sf.SoundFile(temp_path, 'w', PCM_SAMPLE_RATE, 1, subtype=subtype, format=container) as out:
+            # الكتابة على دفعات من memmap حتى لا يُحمل الجزء كاملاً في الذاكرة
+            block = 60 * PCM_SAMPLE_RATE
+            for offset in range(start, end, block):
+                out.write(np.asarray(samples[offset:min(end, offset + block)]))
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+def encode_for_upload(audio_file_path, start_time=0.0, end_time=None, audio_format='opus'):
+    """
+    ترميز الصوت (أو جزء منه بالثواني) إلى نسخة مضغوطة 16kHz أحادية للرفع إلى Whisper
+
+    Opus بهذا المعدل أصغر من الملف الأصلي أو WAV بعدة أضعاف، فيقل زمن الرفع.
+    النسخة تُحفظ باسم حدودها في get_upload_dir وتُستخدم مباشرة عند إعادة المحاولة
+    ما دامت أحدث من نسخة PCM
+
+    Returns:
+        str: مسار الملف المضغوط
+    """
+    pcm_path = decode_to_pcm(audio_file_path)
+    samples = np.load(pcm_path, mmap_mode='r')
+    start = max(0, int(start_time * PCM_SAMPLE_RATE))
+    end = len(samples) if end_time is None else min(len(samples), int(end_time * PCM_SAMPLE_RATE))
+
+    upload_dir = get_upload_dir(audio_file_path)
+    upload_path = os.path.join(upload_dir, f"{start}-{end}{get_format_extension(audio_format)}")
+    if os.path.exists(upload_path) and os.path.getmtime(upload_path) >= os.path.getmtime(pcm_path):
+        return upload_path
+
+    os.makedirs(upload_dir, exist_ok=True)
+    encode_pcm_range(samples, start, end, upload_path, audio_format)
+
+    logger.info(f"Encoded {audio_file_path} [{start_time:.1f}s-{end / PCM_SAMPLE_RATE:.1f}s] for upload "
+                f"as {audio_format} ({os.path.getsize(upload_path) / 1024:.0f} KB)")
+    return upload_path
+
+
+def get_peaks_dir(audio_file_path):
+    """مجلد ملفات القمم بجانب الملف الصوتي الأصلي"""
+    name, _ = os.path.splitext(audio_file_path)
+    return f"{name}{PEAKS_SUFFIX}"
+
+
+def get_peaks_path(audio_file_path, samples_per_peak):
+    return os.path.join(get_peaks_dir(audio_file_path), f"{samples_per_peak}.npy")
+
+
+def _save_npy(path, array):
+    """حفظ مصفوفة عبر ملف مؤقت ثم استبدال ذري"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            np.save(f, array, allow_pickle=False)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def peaks_ready(audio_file_path):
+    """ملفات القمم محسوبة من نسخة PCM الحالية (بدون فك ترميز أو حساب)"""
+    pcm_path = get_pcm_path(audio_file_path)
+    coarsest_path = get_peaks_path(audio_file_path, PEAK_LEVELS[-1])
+    return os.path.exists(pcm_path) and os.path.exists(coarsest_path) and \
+        os.path.getmtime(coarsest_path) >= os.path.getmtime(pcm_path)
+
+
+def compute_peaks(audio_file_path, block_seconds=60):
+    """
+    حساب قمم الموجة (أدنى وأعلى عينة) بعدة مستويات تكبير من نسخة PCM
+
+    كل مستوى في PEAK_LEVELS مصفوفة int16 بشكل (n, 2) في get_peaks_dir، فتقرأ صفحة
+    الاجتماع جزءاً صغيراً بالدقة المناسبة بدلاً من تحميل التسجيل. المستوى الأدق يُحسب
+    من الصوت على دفعات، وكل مستوى أعلى يُحسب من الذي قبله. الملفات تُستخدم مباشرة
+    ما دامت أحدث من نسخة PCM
+
+    Returns:
+        str: مجلد ملفات القمم
+    """
+    pcm_path = decode_to_pcm(audio_file_path)
+    peaks_dir = get_peaks_dir(audio_file_path)
+    if peaks_ready(audio_file_path):
+        return peaks_dir
+
+    samples = np.load(pcm_path, mmap_mode='r')
+    finest = PEAK_LEVELS[0]
+    num_peaks = -(-len(samples) // finest)
+    peaks = np.zeros((num_peaks, 2), dtype=np.int16)
+
+    # الدفعة مضاعف لعدد عينات القمة، فلا تنقسم قمة بين دفعتين
+    block_size = max(1, int(block_seconds * PCM_SAMPLE_RATE) // finest) * finest
+    for offset in range(0, len(samples), block_size):
+        block = np.asarray(samples[offset:offset + block_size])
+        padding = -len(block) % finest
+        if padding:
+            block = np.concatenate([block, np.repeat(block[-1:], padding)])
+        frames = block.reshape(-1, finest)
+        first = offset // finest
+        peaks[first:first + len(frames), 0] = frames.min(axis=1)
+        peaks[first:first + len(frames), 1] = frames.max(axis=1)
+
+    os.makedirs(peaks_dir, exist_ok=True)
+    # المستويات الأدق أولاً والأعلى أخيراً، فوجود آخر مستوى يعني اكتمال الكل
+    previous_level = finest
+    for level in PEAK_LEVELS:
+        if level != finest:
+            factor = level // previous_level
+            padding = -len(peaks) % factor
+            if padding:
+                peaks = np.concatenate([peaks, np.repeat(peaks[-1:], padding, axis=0)])
+            grouped = peaks.reshape(-1, factor, 2)
+            peaks = np.stack([grouped[:, :, 0].min(axis=1), grouped[:, :, 1].max(axis=1)], axis=1)
+            previous_level = level
+        _save_npy(get_peaks_path(audio_file_path, level), peaks)
+
+    logger.info(f"Computed waveform peaks for {audio_file_path} ({num_peaks} peaks at finest level)")
+    return peaks_dir
+
+
+def read_peaks(audio_file_path, start_time, end_time, width):
+    """
+    قمم جزء من التسجيل بدقة تكفي لعرضه في width نقطة
+
+    يُختار أخشن مستوى يعطي width قمة على الأقل في الجزء المطلوب
+
+    Returns:
+        tuple: (عدد العينات في القمة، مصفوفة القمم (n, 2)، زمن أول قمة بالثواني)
+    """
+    span = max(0.0, end_time - start_time) * PCM_SAMPLE_RATE
+    samples_per_peak = PEAK_LEVELS[0]
+    for level in PEAK_LEVELS:
+        if span / level >= width:
+            samples_per_peak = level
+
+    peaks = np.load(get_peaks_path(audio_file_path, samples_per_peak), mmap_mode='r')
+    first = max(0, int(start_time * PCM_SAMPLE_RATE) // samples_per_peak)
+    last = min(len(peaks), -(-int(end_time * PCM_SAMPLE_RATE) // samples_per_peak))
+    return samples_per_peak, np.asarray(peaks[first:last]), first * samples_per_peak / PCM_SAMPLE_RATE
+
+
+def frame_energies(samples, sample_rate=PCM_SAMPLE_RATE, frame_seconds=0.03, block_seconds=60):
+    """
+    طاقة (RMS) كل إطار صوتي في المدى [0, 1]
+
+    الحساب يتم على دفعات (block_seconds) فيمكن تمرير memmap لاجتماع كامل
+    بدون تحميله في الذاكرة
+
+    Returns:
+        numpy array: طاقة كل إطار بطول frame_seconds
+    """
+    frame = max(1, int(sample_rate * frame_seconds))
+    num_frames = len(samples) // frame
+    scale = 32768.0 if np.issubdtype(samples.dtype, np.integer) else 1.0
+
+    energies = np.empty(num_frames, dtype=np.float32)
+    frames_per_block = max(1, int(block_seconds / frame_seconds))
+    for first in range(0, num_frames, frames_per_block):
+        last = min(num_frames, first + frames_per_block)
+        block = np.asarray(samples[first * frame:last * frame], dtype=np.float32).reshape(last - first, frame)
+        energies[first:last] = np.sqrt(np.mean(np.square(block / scale), axis=1))
+    return energies
+
+
+def load_audio_segment(audio_file_path, start_time=0, end_time=None):
+    """
+    AudioSegment من نسخة PCM (بدون تشغيل ffmpeg مرة أخرى)
+
+    المقطع [start_time, end_time) بالثواني يُقص من الـ memmap قبل نسخه،
+    فلا يُقرأ من القرص ولا يُنسخ في الذاكرة إلا المقطع المطلوب
+    """
+    samples = load_pcm(audio_file_path)
+    start = max(0, int(start_time * PCM_SAMPLE_RATE))
+    end = len(samples) if end_time is None else min(len(samples), int(end_time * PCM_SAMPLE_RATE))
+    return AudioSegment(
+        data=samples[start:max(start, end)].tobytes(),
+        sample_width=2,
+        frame_rate=PCM_SAMPLE_RATE,
+        channels=1,
+    )
+
+
+def convert_audio_to_wav(audio_file_path, output_dir=None, block_seconds=60):
     """
     تحويل أي ملف صوتي إلى صيغة WAV للمعالجة
+
+    العينات تُكتب من نسخة PCM (أحادية القناة بمعدل 16kHz أصلاً) على دفعات،
+    فلا يُحمل التسجيل كاملاً في الذاكرة
     """
     if output_dir is None:
         output_dir = os.path.dirname(audio_file_path)
@@ -18,63 +418,226 @@ def convert_audio_to_wav(audio_file_path, output_dir=None):
     name, _ = os.path.splitext(filename)
     output_path = os.path.join(output_dir, f"{name}.wav")
 
-    audio = AudioSegment.from_file(audio_file_path)
-    audio = audio.set_channels(1)  # تحويل إلى أحادي القناة
-    audio = audio.set_frame_rate(16000)  # تعيين معدل العينات إلى 16kHz
-    audio.export(output_path, format="wav")
+    samples = load_pcm(audio_file_path)
+    block_size = int(block_seconds * PCM_SAMPLE_RATE)
+    with sf.SoundFile(output_path, 'w', PCM_SAMPLE_RATE, 1, subtype='PCM_16', format='WAV') as out:
+        for offset in range(0, len(samples), block_size):
+            out.write(np.asarray(samples[offset:offset + block_size]))
 
     return output_path
 
 
-def enhance_audio_quality(audio_file_path, output_dir=None):
+@contextlib.contextmanager
+def temporary_wav(audio_file_path):
+    """
+    ملف WAV مؤقت (16kHz أحادي) من نسخة PCM لتمرير مساره إلى pyannote
+
+    pyannote يقرأ من الملف ما يحتاجه من مقاطع فقط، بدلاً من موجة float32 للاجتماع
+    كاملاً في الذاكرة طوال المعالجة. الملف يُكتب على دفعات ويُحذف بعد الاستخدام
+    """
+    temp_dir = tempfile.mkdtemp(prefix='pcm-wav-')
+    try:
+        yield convert_audio_to_wav(audio_file_path, output_dir=temp_dir)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _enhancement_filter(sample_rate, high_pass=80, low_pass=10000):
+    """
+    مرشح Butterworth (high-pass ثم low-pass) كأقسام من الدرجة الثانية
+
+    قطع low-pass يُخفض إلى ما تحت تردد Nyquist (نسخة PCM بمعدل 16kHz لا تحتوي 10kHz أصلاً)
+    """
+    low_pass = min(low_pass, 0.45 * sample_rate)
+    return np.vstack([
+        signal.butter(4, high_pass, 'highpass', fs=sample_rate, output='sos'),
+        signal.butter(4, low_pass, 'lowpass', fs=sample_rate, output='sos'),
+    ])
+
+
+def _filtered_blocks(samples, sos, block_size):
+    """تمرير الصوت في المرشح على دفعات مع نقل حالته بين الدفعات (نفس ناتج الترشيح دفعة واحدة)"""
+    state = np.zeros((sos.shape[0], 2))
+    for offset in range(0, len(samples), block_size):
+        block, state = signal.sosfilt(sos, pcm_to_float(samples[offset:offset + block_size]), zi=state)
+        yield block.astype(np.float32)
+
+
+def enhance_audio_quality(audio_file_path, output_dir=None, target_level=-20.0, headroom=0.1, block_seconds=60):
     """
     تحسين جودة الصوت وإزالة الضوضاء
+
+    الصوت يُقرأ من نسخة PCM على دفعات، فالذاكرة المستخدمة ثابتة مهما طال التسجيل:
+    - المرور الأول: ترشيح (high-pass 80Hz و low-pass) وقياس القمة ومستوى الصوت
+    - المرور الثاني: ترشيح مرة أخرى بالكسب المحسوب وكتابة الناتج
+    الكسب يرفع مستوى الصوت إلى target_level (dBFS) بشرط ألا تتجاوز القمة -headroom dBFS
+
+    Returns:
+        str: مسار الملف المحسن
     """
     if output_dir is None:
         output_dir = os.path.dirname(audio_file_path)
 
     filename = os.path.basename(audio_file_path)
     name, ext = os.path.splitext(filename)
+    file_format = ext.lstrip('.').upper()
+    if file_format not in sf.available_formats():
+        # صيغ لا تكتبها libsndfile (مثل M4A) تُحفظ WAV
+        ext, file_format = '.wav', 'WAV'
     output_path = os.path.join(output_dir, f"{name}_enhanced{ext}")
 
-    # تحميل الصوت
-    audio = AudioSegment.from_file(audio_file_path)
+    samples = load_pcm(audio_file_path)
+    sos = _enhancement_filter(PCM_SAMPLE_RATE)
+    block_size = int(block_seconds * PCM_SAMPLE_RATE)
 
-    # تطبيع مستوى الصوت
-    normalized_audio = audio.normalize()
+    # المرور الأول: القمة ومجموع المربعات بعد الترشيح
+    peak = 0.0
+    energy = 0.0
+    for block in _filtered_blocks(samples, sos, block_size):
+        if len(block):
+            peak = max(peak, float(np.max(np.abs(block))))
+            energy += float(np.dot(block, block))
 
-    # تحسين الوضوح
-    enhanced_audio = normalized_audio.high_pass_filter(80).low_pass_filter(10000)
+    gain = 1.0
+    if peak > 0:
+        rms = np.sqrt(energy / len(samples))
+        gain = min(10 ** (target_level / 20) / rms, 10 ** (-headroom / 20) / peak)
 
-    # حفظ الملف المحسن
-    enhanced_audio.export(output_path, format=ext.replace(".", ""))
+    # المرور الثاني: الكتابة بالكسب المحسوب
+    with sf.SoundFile(output_path, 'w', PCM_SAMPLE_RATE, 1, format=file_format) as out:
+        for block in _filtered_blocks(samples, sos, block_size):
+            out.write(np.clip(block * gain, -1.0, 1.0))
 
     return output_path
 
 
+def _merge_close_intervals(starts, ends, min_gap):
+    """دمج الفترات المتتالية التي تفصلها فجوة أقصر من min_gap (بنفس وحدة الحدود)"""
+    if len(starts) == 0:
+        return starts, ends
+    keep = (starts[1:] - ends[:-1]) >= min_gap
+    return np.concatenate([starts[:1], starts[1:][keep]]), np.concatenate([ends[:-1][keep], ends[-1:]])
+
+
+def find_speech_intervals(energies, frame_seconds=VAD_FRAME_SECONDS, silence_thresh=-40,
+                          min_silence_len=0.5, min_speech_len=0.25, keep_silence=0.1):
+    """
+    فترات الكلام من طاقة الإطارات (frame_energies)
+
+    الإطارات فوق silence_thresh (dBFS) تُعد كلاماً، والفجوات الأقصر من min_silence_len
+    تُدمج مع ما حولها، والفترات الأقصر من min_speech_len تُحذف، ثم يُضاف keep_silence
+    قبل وبعد كل فترة. كل الخطوات عمليات NumPy على المصفوفة كاملة
+
+    Returns:
+        numpy array: مصفوفة (n, 2) من (البداية، النهاية) بالثواني
+    """
+    levels = 20 * np.log10(np.maximum(energies, 1e-10))
+    speech = np.concatenate([[0], (levels > silence_thresh).astype(np.int8), [0]])
+    edges = np.diff(speech)
+    starts = np.flatnonzero(edges == 1) * frame_seconds
+    ends = np.flatnonzero(edges == -1) * frame_seconds
+
+    starts, ends = _merge_close_intervals(starts, ends, min_silence_len)
+    long_enough = (ends - starts) >= min_speech_len
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    total = len(energies) * frame_seconds
+    starts = np.maximum(starts - keep_silence, 0.0)
+    ends = np.minimum(ends + keep_silence, total)
+    # الهوامش قد تجعل فترتين متجاورتين تتداخلان
+    starts, ends = _merge_close_intervals(starts, ends, 1e-9)
+
+    return np.stack([starts, ends], axis=1).astype(np.float32) if len(starts) else np.zeros((0, 2), np.float32)
+
+
+def get_vad_path(audio_file_path):
+    """مسار فترات الكلام المحفوظة بجانب الملف الصوتي الأصلي"""
+    name, _ = os.path.splitext(audio_file_path)
+    return f"{name}{VAD_SUFFIX}"
+
+
+def detect_speech(audio_file_path, silence_thresh=-40, min_silence_len=0.5, min_speech_len=0.25, keep_silence=0.1):
+    """
+    اكتشاف فترات الكلام في ملف صوتي (بالثواني) من نسخة PCM
+
+    الناتج يُحفظ مع إعداداته، ويُستخدم مباشرة في المرات التالية بنفس الإعدادات
+    ما دام أحدث من نسخة PCM
+
+    Returns:
+        numpy array: مصفوفة (n, 2) من (البداية، النهاية) بالثواني
+    """
+    pcm_path = decode_to_pcm(audio_file_path)
+    params = _vad_params(silence_thresh, min_silence_len, min_speech_len, keep_silence)
+
+    vad_path = get_vad_path(audio_file_path)
+    if os.path.exists(vad_path) and os.path.getmtime(vad_path) >= os.path.getmtime(pcm_path):
+        try:
+            with np.load(vad_path) as cached:
+                if np.array_equal(cached['params'], params):
+                    return cached['intervals']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Unreadable VAD cache {vad_path}: {e}")
+
+    samples = np.load(pcm_path, mmap_mode='r')
+    intervals = find_speech_intervals(
+        frame_energies(samples, PCM_SAMPLE_RATE, VAD_FRAME_SECONDS),
+        VAD_FRAME_SECONDS, silence_thresh, min_silence_len, min_speech_len, keep_silence,
+    )
+
+    save_speech_intervals(audio_file_path, intervals, params)
+    logger.info(f"Detected {len(intervals)} speech intervals in {audio_file_path}")
+    return intervals
+
+
+def _vad_params(silence_thresh=-40, min_silence_len=0.5, min_speech_len=0.25, keep_silence=0.1):
+    return np.array([silence_thresh, min_silence_len, min_speech_len, keep_silence], dtype=np.float64)
+
+
+def save_speech_intervals(audio_file_path, intervals, params=None):
+    """
+    حفظ فترات الكلام مع إعداداتها (الافتراضية إذا لم تُحدد) حيث يقرؤها detect_speech
+
+    يجب أن تُحفظ بعد نسخة PCM، فالفترات الأقدم منها تُعد قديمة
+    """
+    if params is None:
+        params = _vad_params()
+
+    vad_path = get_vad_path(audio_file_path)
+    temp_path = f"{vad_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            np.savez(f, intervals=intervals, params=params)
+        os.replace(temp_path, vad_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
 def split_audio_by_silence(audio_file_path, output_dir=None, min_silence_len=500, silence_thresh=-40):
     """
     تقسيم الصوت إلى مقاطع بناء على فترات الصمت
+
+    الفترات من detect_speech، والمقاطع تُكتب مباشرة من نسخة PCM. مثل split_on_silence
+    في pydub لا يُحذف أي كلام مهما قصر (min_speech_len=0)
     """
     if output_dir is None:
         output_dir = os.path.dirname(audio_file_path)
 
-    # تحميل الصوت
-    audio = AudioSegment.from_file(audio_file_path)
-
-    # تقسيم بناء على الصمت
-    segments = split_on_silence(
-        audio,
-        min_silence_len=min_silence_len,  # طول الصمت بالميلي ثانية
+    intervals = detect_speech(
+        audio_file_path,
         silence_thresh=silence_thresh,  # عتبة الصمت بالديسيبل
-        keep_silence=100  # احتفظ بـ 100 ميلي ثانية من الصمت في بداية ونهاية كل مقطع
+        min_silence_len=min_silence_len / 1000.0,  # طول الصمت بالميلي ثانية
+        min_speech_len=0,
+        keep_silence=0.1  # احتفظ بـ 100 ميلي ثانية من الصمت في بداية ونهاية كل مقطع
     )
+    samples = load_pcm(audio_file_path)
 
     # حفظ المقاطع
     segment_paths = []
-    for i, segment in enumerate(segments):
+    for i, (start_time, end_time) in enumerate(intervals):
         segment_path = os.path.join(output_dir, f"segment_{i:04d}.wav")
-        segment.export(segment_path, format="wav")
-        segment_paths.append((segment_path, i, len(segment) / 1000.0))  # المسار، الترتيب، المدة بالثواني
+        start, end = int(start_time * PCM_SAMPLE_RATE), int(end_time * PCM_SAMPLE_RATE)
+        sf.write(segment_path, np.asarray(samples[start:end]), PCM_SAMPLE_RATE, subtype='PCM_16')
+        segment_paths.append((segment_path, i, (end - start) / PCM_SAMPLE_RATE))  # المسار، الترتيب، المدة بالثواني
 
-    return segment_paths
\ No newline at end of file
+    return segment_paths
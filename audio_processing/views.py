@@ -1,40 +1,69 @@
 # audio_processing/views.py
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.utils.translation import gettext as _
-from .forms import MeetingUploadForm
+from .forms import MeetingUploadForm, UploadSessionForm
 from transcription.models import Meeting
-# from .tasks import process_meeting_task
-from .tasks_enhanced import process_meeting_task
+from .jobs import enqueue_meeting, get_active_job, request_cancel
+from .models import ProcessingRun, UploadSession
+from .progress import build_status_payload, get_status_signature, is_final_status
+from .pipeline import find_duplicate_meetings
+from .status_stream import get_status_poller
+from .uploads import (
+    UploadError, UploadOffsetMismatch, get_resume_offset, write_chunk, finalize_upload, get_chunk_max_bytes
+)
 
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
-import threading
-from django.http import JsonResponse
+import asyncio
+import json
+import logging
 import openai
 import os
+import re
+
+logger = logging.getLogger(__name__)
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+def notify_duplicate(request, meeting):
+    """
+    إعلام المستخدم بأنه رفع نفس التسجيل سابقاً
+
+    البحث مقصور على اجتماعات المستخدم نفسه، فلا يكشف وجود اجتماعات الآخرين أو عناوينها
+    (إعادة استخدام نواتج المعالجة بين المستخدمين تتم داخل المعالجة فقط)
+    """
+    duplicate = find_duplicate_meetings(meeting).filter(created_by=request.user).first()
+    if duplicate:
+        messages.info(request, _('هذا التسجيل مطابق لاجتماع سابق (%(title)s)، وستُستخدم نتائج معالجته.')
+                      % {'title': duplicate.title})
+
 
 @login_required
 def upload_meeting(request):
     if request.method == 'POST':
-        form = MeetingUploadForm(request.POST, request.FILES)
+        form = MeetingUploadForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             meeting = form.save(commit=False)
             meeting.created_by = request.user
             meeting.save()
 
-            # بدء معالجة الاجتماع في خيط منفصل
+            # إضافة الاجتماع إلى طابور المعالجة، والعامل (run_processing_worker) يتولى التنفيذ
             # هذا يسمح للمستخدم بمتابعة استخدام الموقع أثناء المعالجة
-            thread = threading.Thread(target=process_meeting_task, args=(meeting.id,))
-            thread.daemon = True
-            thread.start()
+            enqueue_meeting(meeting, priority=form.cleaned_data['priority'])
 
             messages.success(request, _('تم رفع الاجتماع بنجاح وسيتم معالجته قريبًا.'))
+            notify_duplicate(request, meeting)
             return redirect('audio_processing:processing_status', meeting_id=meeting.id)
     else:
-        form = MeetingUploadForm()
+        form = MeetingUploadForm(user=request.user)
 
     context = {
         'title': _('رفع اجتماع جديد'),
@@ -43,6 +72,92 @@ def upload_meeting(request):
     return render(request, 'audio_processing/upload_meeting.html', context)
 
 
+def serialize_upload(session):
+    return {
+        'id': str(session.id),
+        'status': session.status,
+        'offset': session.received,
+        'size': session.size,
+        'chunk_size': get_chunk_max_bytes(),
+        'meeting_id': session.meeting_id,
+    }
+
+
+@login_required
+@require_POST
+def create_upload_session(request):
+    """
+    بدء رفع على أجزاء: بيانات الاجتماع واسم الملف وحجمه، والرد فيه معرف الجلسة
+    الأجزاء تُرسل بعدها إلى upload_chunk بالترتيب، ثم finalize_upload
+    """
+    form = UploadSessionForm(request.POST, user=request.user)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    session = form.save(commit=False)
+    session.created_by = request.user
+    session.save()
+    return JsonResponse(serialize_upload(session), status=201)
+
+
+@login_required
+def upload_session_status(request, session_id):
+    """موضع الاستئناف لجلسة رفع (بعد انقطاع الاتصال أو إعادة تحميل الصفحة)"""
+    session = get_object_or_404(UploadSession, id=session_id, created_by=request.user)
+    if session.status == 'uploading':
+        get_resume_offset(session)
+    return JsonResponse(serialize_upload(session))
+
+
+@login_required
+@require_POST
+def upload_chunk(request, session_id):
+    """
+    استلام جزء من الملف: جسم الطلب هو البايتات، و Content-Range يحدد موضعها،
+    و X-Chunk-SHA256 بصمتها. الجزء الذي لا يبدأ من موضع الاستئناف يُرفض بـ 409
+    مع الموضع الصحيح
+    """
+    session = get_object_or_404(UploadSession, id=session_id, created_by=request.user)
+
+    match = CONTENT_RANGE_RE.match(request.headers.get('Content-Range', ''))
+    checksum = request.headers.get('X-Chunk-SHA256', '')
+    if not match or not checksum:
+        return JsonResponse({'error': _('ترويسة Content-Range أو X-Chunk-SHA256 مفقودة')}, status=400)
+
+    start, end, total = (int(value) for value in match.groups())
+    if total != session.size:
+        return JsonResponse({'error': _('حجم الملف لا يطابق جلسة الرفع')}, status=400)
+
+    try:
+        write_chunk(session, start, end, request, checksum)
+    except UploadOffsetMismatch as e:
+        return JsonResponse({**serialize_upload(session), 'offset': e.offset}, status=409)
+    except UploadError as e:
+        return JsonResponse({**serialize_upload(session), 'error': str(e)}, status=400)
+
+    return JsonResponse(serialize_upload(session))
+
+
+@login_required
+@require_POST
+def finalize_upload_session(request, session_id):
+    """إنهاء الرفع: إنشاء الاجتماع وإضافته إلى طابور المعالجة"""
+    session = get_object_or_404(UploadSession, id=session_id, created_by=request.user)
+
+    try:
+        meeting = finalize_upload(session)
+    except UploadError as e:
+        return JsonResponse({**serialize_upload(session), 'error': str(e)}, status=400)
+
+    messages.success(request, _('تم رفع الاجتماع بنجاح وسيتم معالجته قريبًا.'))
+    notify_duplicate(request, meeting)
+
+    return JsonResponse({
+        **serialize_upload(session),
+        'redirect_url': reverse('audio_processing:processing_status', args=[meeting.id]),
+    })
+
+
 @login_required
 def process_meeting(request, meeting_id):
     """
@@ -51,12 +166,13 @@ def process_meeting(request, meeting_id):
     meeting = get_object_or_404(Meeting, id=meeting_id, created_by=request.user)
 
     if not meeting.processed:
-        # بدء معالجة الاجتماع في خيط منفصل
-        thread = threading.Thread(target=process_meeting_task, args=(meeting.id,))
-        thread.daemon = True
-        thread.start()
+        # إضافة الاجتماع إلى طابور المعالجة، أو متابعة المعالجة الجارية إن وجدت
+        job, created = enqueue_meeting(meeting)
 
-        messages.info(request, _('بدأت معالجة الاجتماع. سيستغرق ذلك بعض الوقت.'))
+        if created:
+            messages.info(request, _('بدأت معالجة الاجتماع. سيستغرق ذلك بعض الوقت.'))
+        else:
+            messages.info(request, _('الاجتماع قيد المعالجة بالفعل.'))
     else:
         messages.warning(request, _('تمت معالجة هذا الاجتماع بالفعل.'))
 
@@ -73,26 +189,108 @@ def processing_status(request, meeting_id):
     context = {
         'title': _('حالة معالجة الاجتماع'),
         'meeting': meeting,
+        'run': meeting.processing_runs.first(),
+        'active_job': get_active_job(meeting),
+        # مراحل المعالجة الفعلية (بدون مرحلتي البدء والاكتمال)
+        'stages': ProcessingRun.STAGE_CHOICES[1:-1],
     }
     return render(request, 'audio_processing/processing_status.html', context)
 
 
+@login_required
+@require_POST
+def cancel_processing(request, meeting_id):
+    """
+    إلغاء معالجة الاجتماع المنتظرة أو الجارية
+    """
+    meeting = get_object_or_404(Meeting, id=meeting_id, created_by=request.user)
+    job = get_active_job(meeting)
+
+    if job and request_cancel(job):
+        messages.info(request, _('تم طلب إلغاء المعالجة.'))
+    else:
+        messages.warning(request, _('لا توجد معالجة جارية لهذا الاجتماع.'))
+
+    return redirect('audio_processing:processing_status', meeting_id=meeting.id)
+
+
 @login_required
 def check_processing_status(request, meeting_id):
     """
     التحقق من حالة معالجة الاجتماع وإرجاع النتيجة في صيغة JSON
-    يستخدم من JavaScript للتحقق الدوري من حالة المعالجة
+    يستخدم من JavaScript للتحقق الدوري عندما لا يتوفر بث stream_status
+
+    يعيد آخر تشغيل (ProcessingRun): المرحلة الحالية ونسبة التقدم داخلها والخطأ إن وجد
     """
     meeting = get_object_or_404(Meeting, id=meeting_id, created_by=request.user)
+    return JsonResponse(build_status_payload(meeting))
 
-    # إعادة قراءة حالة الاجتماع من قاعدة البيانات للحصول على آخر تحديث
-    meeting.refresh_from_db()
 
-    return JsonResponse({
-        'processed': meeting.processed,
-        'id': meeting.id,
-        'title': meeting.title,
-    })
+async def _status_events(meeting_id):
+    """
+    أحداث SSE لحالة المعالجة: حدث status عند كل تغير فقط، وتعليق keepalive عند السكون
+
+    التغيرات يكتشفها فاحص واحد مشترك لكل البثوث (StatusPoller). البث ينتهي عند الحالة
+    النهائية أو بعد PROCESSING_STATUS_STREAM_TIMEOUT ويعيد المتصفح الاتصال بعد retry،
+    وعند انقطاع العميل يُلغى المولد (CancelledError أو GeneratorExit) فيُلغى اشتراكه
+    """
+    timeout = getattr(settings, 'PROCESSING_STATUS_STREAM_TIMEOUT', 600)
+    retry = getattr(settings, 'PROCESSING_STATUS_STREAM_RETRY', 5)
+    keepalive = 15.0
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    poller = get_status_poller()
+    poller.subscribe(meeting_id)
+    try:
+        yield f'retry: {int(retry * 1000)}\n\n'
+
+        last_signature = None
+        signature = await sync_to_async(get_status_signature)(meeting_id)
+        while signature is not None:
+            if signature != last_signature:
+                last_signature = signature
+                meeting = await Meeting.objects.aget(id=meeting_id)
+                payload = await sync_to_async(build_status_payload)(meeting)
+                yield f"event: status\ndata: {json.dumps(payload, cls=DjangoJSONEncoder)}\n\n"
+                if is_final_status(payload):
+                    return
+            else:
+                yield ': keepalive\n\n'
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            signature = await poller.wait(meeting_id, last_signature, min(keepalive, remaining))
+    except (asyncio.CancelledError, GeneratorExit):
+        logger.debug(f"Status stream of meeting {meeting_id} closed by client")
+        raise
+    finally:
+        poller.unsubscribe(meeting_id)
+
+
+async def stream_processing_status(request, meeting_id):
+    """
+    بث حالة المعالجة بـ Server-Sent Events بدلاً من الاستعلام كل 5 ثوانٍ
+
+    يعمل فقط عند التشغيل عبر ASGI (board_meeting_project/asgi.py)؛ تحت WSGI
+    يُعاد 204 فتتوقف EventSource وتعود الصفحة إلى check_status
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return HttpResponse(status=401)
+
+    if not await Meeting.objects.filter(id=meeting_id, created_by=user).aexists():
+        raise Http404
+
+    response = StreamingHttpResponse(_status_events(meeting_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # منع nginx من تجميع الأحداث قبل إرسالها
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @login_required
@@ -219,3 +219,78 @@ USE_VOICE_COMPARISON = False
 TESTING_MODE = False
 # تقليل وقت المحاكاة إلى 5 ثوانٍ
 SIMULATION_DELAY = 5  # يمكن تعديله حسب الرغبة
+
+# طابور المعالجة (audio_processing.jobs) - يشغله: python manage.py run_processing_worker
+PROCESSING_LEASE_SECONDS = 300  # مدة حجز المهمة قبل أن يستلمها عامل آخر
+PROCESSING_MAX_ATTEMPTS = 3
+PROCESSING_POLL_INTERVAL = 5
+PROCESSING_CONCURRENT_JOBS = 4  # عدد الاجتماعات المتزامنة في كل عامل
+PROCESSING_CPU_WORKERS = None  # عمليات diarization والبصمات (None = عدد الأنوية)
+PROCESSING_IO_WORKERS = 16  # خيوط استدعاءات Whisper (أجزاء النسخ) و GPT، حد التزامن لكل الاجتماعات في العامل
+PROCESSING_PRIORITY_AGING_SECONDS = 3600  # كل ساعة انتظار ترفع أولوية المهمة درجة واحدة
+PROCESSING_FAIR_SHARE_WINDOW_SECONDS = 3600  # المهام المنتهية خلالها تُحسب من حصة المستخدم
+
+# نواتج مراحل المعالجة (audio_processing.pipeline) لاستئناف المعالجة بعد الفشل
+PIPELINE_ARTIFACTS_DIR = os.path.join(MEDIA_ROOT, 'pipeline_artifacts')
+
+# بث حالة المعالجة (SSE) - يعمل فقط عند تشغيل board_meeting_project.asgi:application بخادم ASGI
+# (uvicorn أو daphne)؛ تحت runserver أو خادم WSGI تعود الصفحة إلى الاستعلام الدوري (check_status)
+PROCESSING_STATUS_STREAM_INTERVAL = 3  # ثوانٍ بين كل فحص لتغير الحالة (فحص واحد لكل البثوث في العملية)
+PROCESSING_STATUS_STREAM_TIMEOUT = 600  # يعيد المتصفح الاتصال بعدها تلقائياً
+PROCESSING_STATUS_STREAM_RETRY = 5  # ثوانٍ ينتظرها المتصفح قبل إعادة الاتصال (retry في SSE)
+
+# مهلة كل مرحلة بالثواني (audio_processing.cancellation) - المرحلة التي تتجاوزها تفشل وتحرر العامل
+PROCESSING_STAGE_TIMEOUTS = {
+    'embeddings': 30 * 60,
+    'diarization': 2 * 60 * 60,
+    'transcription': 60 * 60,
+    'speaker_attribution': 30 * 60,
+}
+
+# نسخ Whisper على أجزاء متزامنة (transcription.utils.chunked_whisper)
+WHISPER_CHUNK_SECONDS = 600  # أقصى طول للجزء (حتى بصيغة WAV يبقى أقل من حد الرفع 25MB)
+WHISPER_SPLIT_SEARCH_SECONDS = 30  # نافذة البحث عن الصمت قبل نهاية كل جزء
+WHISPER_CONCURRENCY = 1  # عدد مسارات الأجزاء المنسوخة معاً لكل اجتماع (1 = كل جزء بعد سابقه)
+WHISPER_PROMPT_CHARS = 200  # طول نهاية الجزء السابق المرسلة كسياق للجزء التالي
+WHISPER_UPLOAD_FORMAT = 'opus'  # صيغة الأجزاء المرفوعة: opus أو mp3 أو wav
+
+# تشغيل صوت الاجتماعات (transcription.views.stream_audio)
+# عند التشغيل خلف nginx: AUDIO_SENDFILE_HEADER = 'X-Accel-Redirect' مع location داخلي
+# (internal) على AUDIO_SENDFILE_PREFIX يشير إلى MEDIA_ROOT، أو 'X-Sendfile' في Apache
+AUDIO_SENDFILE_HEADER = None
+AUDIO_SENDFILE_PREFIX = '/protected-media/'
+
+# مقاطع صوت جاهزة لكل مقطع نصي (audio_processing.clips) - تُحذف الأقدم استخداماً عند تجاوز الحد
+SEGMENT_CLIPS_DIR = os.path.join(MEDIA_ROOT, 'segment_clips')
+SEGMENT_CLIPS_FORMAT = 'mp3'  # mp3 يعمل في كل المتصفحات، و opus أصغر
+SEGMENT_CLIPS_MAX_BYTES = 500 * 1024 * 1024
+
+# رفع التسجيلات على أجزاء قابلة للاستئناف (audio_processing.uploads)
+UPLOAD_SESSIONS_DIR = os.path.join(MEDIA_ROOT, 'upload_sessions')
+UPLOAD_CHUNK_MAX_BYTES = 16 * 1024 * 1024  # الجزء يُكتب على القرص مباشرة ولا يُحمّل في الذاكرة
+UPLOAD_SESSION_EXPIRY_HOURS = 48  # تُحذف أجزاء الجلسات المتوقفة بعدها (يتولاها run_processing_worker)
+
+# فك ترميز التسجيلات واكتشاف الكلام أثناء رفعها (audio_processing.ingest، يتطلب ffmpeg)
+UPLOAD_INGEST_CONCURRENCY = 2  # عدد الرفعات التي يفكها كل عامل في نفس الوقت
+UPLOAD_INGEST_POLL_INTERVAL = 1  # الثواني بين كل تغذية للأجزاء الجديدة
+UPLOAD_INGEST_WAIT_SECONDS = 120  # أقصى انتظار لآخر جزء قبل أن تفك المعالجة الترميز بنفسها
+UPLOAD_INGEST_IDLE_SECONDS = 30  # رفع متوقف أطول من ذلك يُحرر ويُوقف فك ترميزه حتى يصل جزء جديد
+
+# النماذج التي تحمّلها كل عملية في مجمع المعالج عند بدء العامل (speaker_identification.utils.model_registry)
+# الأسماء المتاحة: diarization و embedding و speaker_encoder
+MODEL_PRELOAD = ['diarization', 'embedding'] if USE_VOICE_COMPARISON else []
+
+# خادم البصمات الصوتية المحلي (python manage.py run_embedding_server)
+# عند تحديد المسار تستخدم كل العمليات نسخة الخادم من نماذج embedding و speaker_encoder
+# بدلاً من تحميلها في كل عملية
+EMBEDDING_SERVER_SOCKET = None  # مثال: os.path.join(BASE_DIR, 'run', 'embeddings.sock')
+EMBEDDING_SERVER_TIMEOUT = 120  # أقصى انتظار (بالثواني) لرد خادم البصمات قبل اعتباره معطلاً
+
+# استخراج بصمات المتحدثين على دفعات (speaker_identification.utils.batch_embeddings)
+EMBEDDING_BATCH_SIZE = 16  # عدد النوافذ في كل استدعاء للنموذج
+EMBEDDING_TURNS_PER_LABEL = 5  # عدد المقاطع التي يُحسب متوسط بصماتها لكل متحدث
+EMBEDDING_WINDOW_SECONDS = 4.0  # أقصى طول لنافذة البصمة من منتصف المقطع
+EMBEDDING_MIN_SECONDS = 0.5  # المقاطع الأقصر لا تُستخدم إلا إذا لم يكن للمتحدث غيرها
+
+# يُزاد لإبطال كل نواتج المراحل المحفوظة (audio_processing.pipeline) بعد تغيير لا تلتقطه مدخلات المراحل
+PIPELINE_CACHE_VERSION = 1
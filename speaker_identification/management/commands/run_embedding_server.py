@@ -0,0 +1,44 @@
+# speaker_identification/management/commands/run_embedding_server.py
+
+from django.core.management.base import BaseCommand, CommandError
+from speaker_identification.utils.model_registry import registry
+from speaker_identification.utils.embedding_server import (
+    SERVED_MODELS,
+    EmbeddingServer,
+    get_embedding_server_socket
+)
+
+
+class Command(BaseCommand):
+    help = 'تشغيل خادم البصمات الصوتية المحلي (نسخة واحدة من النماذج لكل عمليات الجهاز)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket',
+            default=None,
+            help='مسار Unix socket (الافتراضي: EMBEDDING_SERVER_SOCKET)'
+        )
+
+    def handle(self, *args, **options):
+        socket_path = options.get('socket') or get_embedding_server_socket()
+        if not socket_path:
+            raise CommandError('حدد EMBEDDING_SERVER_SOCKET في الإعدادات أو --socket')
+
+        # تحميل النماذج قبل قبول الاتصالات، فلا ينتظر أول عميل تحميلها
+        self.stdout.write('تحميل النماذج...')
+        for name, model in registry.preload(SERVED_MODELS).items():
+            if name not in SERVED_MODELS:
+                continue
+            if model['state'] == 'ready':
+                self.stdout.write(self.style.SUCCESS(f"✓ النموذج {name} جاهز ({model['seconds']} ث)"))
+            else:
+                self.stdout.write(self.style.ERROR(f"✗ تعذر تحميل النموذج {name}: {model['error']}"))
+
+        server = EmbeddingServer(socket_path, registry)
+        self.stdout.write(self.style.SUCCESS(f'خادم البصمات يعمل على {socket_path}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nتم إيقاف خادم البصمات'))
+        finally:
+            server.server_close()
@@ -1,3 +1,347 @@
-from django.test import TestCase
+# speaker_identification/tests.py
 
-# Create your tests here.
+import os
+import json
+import time
+import shutil
+import socket
+import tempfile
+import threading
+from unittest import mock
+import numpy as np
+import soundfile as sf
+import torch
+from django.test import SimpleTestCase
+from audio_processing.utils.preprocessing import PCM_SAMPLE_RATE, get_pcm_path, temporary_wav
+from .utils import batch_embeddings, diarization, embedding_server, voice_comparison
+
+
+class SegmentEmbeddingTests(SimpleTestCase):
+    """قص المقطع من عينات في الذاكرة قبل استخراج بصمته (extract_segment_embedding)"""
+
+    def setUp(self):
+        self.samples = (np.sin(np.arange(32000) / 10) * 20000).astype(np.int16)
+        patcher = mock.patch.object(diarization, 'extract_voice_embedding', side_effect=lambda segment, rate: segment)
+        self.extract = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_int16_samples_are_scaled_to_float(self):
+        segment = diarization.extract_segment_embedding(self.samples, 0.5, 1.0, 16000)
+
+        self.assertEqual(segment.dtype, np.float32)
+        np.testing.assert_allclose(segment, self.samples[8000:16000].astype(np.float32) / 32768.0)
+        self.assertLessEqual(np.abs(segment).max(), 1.0)
+
+    def test_float_samples_are_unchanged(self):
+        samples = self.samples.astype(np.float32) / 32768.0
+        segment = diarization.extract_segment_embedding(samples, 0.5, 1.0, 16000)
+
+        np.testing.assert_array_equal(segment, samples[8000:16000])
+
+
+class DiarizationInputTests(SimpleTestCase):
+    """pyannote يتلقى مسار ملف WAV مؤقت بدلاً من موجة الاجتماع كاملاً في الذاكرة"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.audio_path = os.path.join(self.directory, 'meeting.mp3')
+        open(self.audio_path, 'wb').close()
+        mtime = os.path.getmtime(self.audio_path) - 10
+        os.utime(self.audio_path, (mtime, mtime))
+
+        self.samples = np.random.default_rng(0).integers(-3000, 3000, PCM_SAMPLE_RATE * 3).astype(np.int16)
+        np.save(get_pcm_path(self.audio_path), self.samples, allow_pickle=False)
+
+    def fake_pipeline(self, received):
+        def run(file, **kwargs):
+            received['file'] = file
+            received['samples'], _ = sf.read(file, dtype='int16')
+            received['exists'] = os.path.exists(file)
+            return mock.Mock(itertracks=mock.Mock(return_value=[]))
+        return run
+
+    def test_temporary_wav_matches_pcm_and_is_removed(self):
+        with temporary_wav(self.audio_path) as wav_path:
+            samples, sample_rate = sf.read(wav_path, dtype='int16')
+            self.assertEqual(sample_rate, PCM_SAMPLE_RATE)
+            np.testing.assert_array_equal(samples, self.samples)
+        self.assertFalse(os.path.exists(wav_path))
+
+    def test_perform_speaker_diarization_passes_file_path(self):
+        received = {}
+        with mock.patch.object(diarization, 'get_model', return_value=self.fake_pipeline(received)), \
+                mock.patch.dict(os.environ, {'HUGGINGFACE_TOKEN': 'token'}):
+            diarization.perform_speaker_diarization(self.audio_path, num_speakers=2)
+
+        self.assertIsInstance(received['file'], str)
+        self.assertTrue(received['exists'])
+        np.testing.assert_array_equal(received['samples'], self.samples)
+        self.assertFalse(os.path.exists(received['file']))
+
+    def test_voice_comparison_embeds_windows_from_pcm(self):
+        received = {}
+        with mock.patch.object(voice_comparison, 'get_diarization_pipeline',
+                               return_value=self.fake_pipeline(received)), \
+                mock.patch.object(voice_comparison, 'embed_labels', return_value={}) as embed, \
+                mock.patch.object(voice_comparison, 'load_known_speakers', return_value=[]):
+            voice_comparison.process_meeting_with_diarization(self.audio_path)
+
+        self.assertIsInstance(received['file'], str)
+        samples = embed.call_args.args[0]
+        # نسخة PCM مربوطة بالملف (memmap)، وكل نافذة تُحول إلى float عند قصها فقط
+        self.assertIsInstance(samples, np.memmap)
+        self.assertEqual(samples.dtype, np.int16)
+        self.assertEqual(embed.call_args.args[3], PCM_SAMPLE_RATE)
+
+    def test_reference_embedding_is_sent_as_waveform(self):
+        """التسجيل المرجعي يُمرر كموجة في الذاكرة، فيعمل مع خادم البصمات (RemoteInference) أيضاً"""
+        inference = mock.Mock(return_value=np.ones(4, dtype=np.float32))
+        with mock.patch.object(voice_comparison, 'get_embedding_model', return_value=inference):
+            voice_comparison.extract_speaker_embedding(self.audio_path)
+
+        file = inference.call_args.args[0]
+        self.assertEqual(file['sample_rate'], PCM_SAMPLE_RATE)
+        np.testing.assert_allclose(file['waveform'].numpy()[0], self.samples / 32768.0, rtol=1e-6)
+
+
+class FakeRegistry:
+    """نماذج بديلة للخادم: البصمة متوسط العينات ومجموعها"""
+
+    class Inference:
+        def __call__(self, file):
+            return file['waveform'].mean(dim=-1)
+
+        def infer(self, chunks):
+            return chunks.mean(dim=-1)
+
+    class Encoder:
+        def encode_batch(self, wavs, wav_lens=None):
+            return wavs.sum(dim=-1, keepdim=True).unsqueeze(1)
+
+    def get(self, name):
+        return self.Inference() if name == 'embedding' else self.Encoder()
+
+
+class RecordingServer(embedding_server.EmbeddingServer):
+    """خادم يحتفظ باتصالات العملاء حتى يقطعها الاختبار"""
+
+    def get_request(self):
+        connection, address = super().get_request()
+        self.connections = getattr(self, 'connections', []) + [connection]
+        return connection, address
+
+
+class EmbeddingServerTests(SimpleTestCase):
+    """بروتوكول خادم البصمات (send_message و recv_message) والعميل (EmbeddingClient)"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.socket_path = os.path.join(self.directory, 'embeddings.sock')
+
+    def start_server(self):
+        server = RecordingServer(self.socket_path, FakeRegistry())
+        self.server = server
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join(timeout=1)
+        return stop
+
+    def test_message_round_trip(self):
+        left, right = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+        arrays = [np.arange(6, dtype=np.float64).reshape(2, 3), np.zeros((0, 4)), np.array([1.5, -2.0])]
+
+        embedding_server.send_message(left, {'model': 'embedding', 'sample_rate': 16000}, arrays)
+        header, received = embedding_server.recv_message(right)
+
+        self.assertEqual(header, {'model': 'embedding', 'sample_rate': 16000, 'shapes': [[2, 3], [0, 4], [2]]})
+        self.assertEqual(len(received), 3)
+        for sent, array in zip(arrays, received):
+            self.assertEqual(array.dtype, np.float32)
+            np.testing.assert_array_equal(array, sent)
+
+    def test_frame_header_layout(self):
+        left, right = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+
+        embedding_server.send_message(left, {'ok': True}, [np.ones((2, 2))])
+        header_size, count = embedding_server.FRAME_HEADER.unpack(right.recv(embedding_server.FRAME_HEADER.size))
+        self.assertEqual(count, 1)
+        self.assertEqual(json.loads(right.recv(header_size)), {'ok': True, 'shapes': [[2, 2]]})
+        self.assertEqual(len(right.recv(64)), 16)
+
+    def test_closed_connection_mid_message(self):
+        left, right = socket.socketpair()
+        self.addCleanup(right.close)
+        left.sendall(embedding_server.FRAME_HEADER.pack(100, 0) + b'{"ok"')
+        left.close()
+
+        with self.assertRaises(ConnectionError):
+            embedding_server.recv_message(right)
+
+    def test_client_requests(self):
+        stop = self.start_server()
+        self.addCleanup(stop)
+        client = embedding_server.EmbeddingClient(self.socket_path, timeout=5)
+
+        waveforms = [np.full((1, 100), 0.5, dtype=np.float32), np.full((1, 50), -0.25, dtype=np.float32)]
+        embeddings = client.embed(waveforms, 16000)
+        np.testing.assert_allclose([embedding[0] for embedding in embeddings], [0.5, -0.25])
+
+        np.testing.assert_allclose(client.infer(np.ones((3, 1, 10), dtype=np.float32)), np.ones((3, 1)))
+        encoded = client.encode_batch(np.ones((2, 8), dtype=np.float32), np.ones(2, dtype=np.float32))
+        np.testing.assert_allclose(encoded, np.full((2, 1, 1), 8.0))
+
+    def test_server_error_is_raised(self):
+        stop = self.start_server()
+        self.addCleanup(stop)
+        client = embedding_server.EmbeddingClient(self.socket_path, timeout=5)
+
+        with self.assertRaisesRegex(embedding_server.EmbeddingServerError, 'not served'):
+            client.request({'model': 'diarization'}, [])
+        # الاتصال يبقى صالحاً بعد الخطأ
+        self.assertEqual(len(client.embed([np.ones((1, 10), dtype=np.float32)], 16000)), 1)
+
+    def test_client_reconnects_after_dropped_connection(self):
+        stop = self.start_server()
+        self.addCleanup(stop)
+        client = embedding_server.EmbeddingClient(self.socket_path, timeout=5)
+        client.embed([np.ones((1, 10), dtype=np.float32)], 16000)
+        stale = client._local.sock
+
+        # الخادم أُعيد تشغيله فانقطع الاتصال القديم: يُعاد الاتصال وإرسال الطلب مرة واحدة
+        for connection in self.server.connections:
+            connection.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(len(client.embed([np.ones((1, 10), dtype=np.float32)], 16000)), 1)
+        self.assertIsNot(client._local.sock, stale)
+        self.assertEqual(len(self.server.connections), 2)
+
+    def test_hung_server_times_out(self):
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(listener.close)
+        listener.bind(self.socket_path)
+        listener.listen(1)
+        client = embedding_server.EmbeddingClient(self.socket_path, timeout=0.2)
+
+        started = time.monotonic()
+        with self.assertRaisesRegex(embedding_server.EmbeddingServerError, 'did not respond'):
+            client.embed([np.ones((1, 10), dtype=np.float32)], 16000)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertIsNone(client._local.sock)
+
+    def test_missing_server(self):
+        client = embedding_server.EmbeddingClient(self.socket_path, timeout=1)
+        with self.assertRaisesRegex(embedding_server.EmbeddingServerError, 'not running'):
+            client.embed([np.ones((1, 10), dtype=np.float32)], 16000)
+
+
+class FakeEncoder:
+    """بديل ECAPA: بصمة كل صف من عيناته الفعلية فقط (wav_lens)، فلا يؤثر الحشو ولا باقي الدفعة"""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode_batch(self, wavs, wav_lens=None):
+        self.batches.append(wavs.shape)
+        lengths = (wav_lens * wavs.shape[1]).round().long() if wav_lens is not None else [wavs.shape[1]] * len(wavs)
+        rows = [window_features(wav[:int(length)]) for wav, length in zip(wavs, lengths)]
+        return torch.stack(rows).unsqueeze(1)
+
+
+class FakeInference:
+    """بديل pyannote: بدون قناع للحشو، فكل دفعة يجب أن تكون بنفس الطول"""
+
+    def __init__(self):
+        self.batches = []
+
+    def infer(self, chunks):
+        self.batches.append(tuple(chunks.shape))
+        return torch.stack([window_features(chunk[0]) for chunk in chunks]).numpy()
+
+
+def window_features(wav):
+    wav = torch.as_tensor(wav, dtype=torch.float64)
+    return torch.stack([wav.mean(), wav.abs().mean(), wav[:100].sum(), torch.tensor(float(len(wav)))]).float()
+
+
+class BatchEmbeddingsTests(SimpleTestCase):
+    """اختيار النوافذ (select_windows) واستخراج بصماتها على دفعات (embed_windows)"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.samples = rng.integers(-8000, 8000, PCM_SAMPLE_RATE * 30).astype(np.int16)
+        # نوافذ قصيرة (أقصر من خطوة الطول) وطويلة، بترتيب غير مرتب
+        self.windows = [(1.0, 5.0), (6.0, 6.3), (7.0, 8.7), (10.0, 20.0), (21.0, 21.2), (22.0, 25.75), (29.5, 40.0)]
+
+    def embed(self, model, model_name, batch_size):
+        with mock.patch.object(batch_embeddings, 'get_model', return_value=model):
+            return batch_embeddings.embed_windows(self.samples, self.windows, model_name, batch_size=batch_size)
+
+    def test_encoder_batches_match_single_windows(self):
+        batched = self.embed(FakeEncoder(), 'speaker_encoder', batch_size=4)
+        single = self.embed(FakeEncoder(), 'speaker_encoder', batch_size=1)
+
+        for (start, end), one, many in zip(self.windows, single, batched):
+            np.testing.assert_allclose(many, one, rtol=1e-5)
+            expected = self.samples[int(start * PCM_SAMPLE_RATE):int(end * PCM_SAMPLE_RATE)] / 32768.0
+            np.testing.assert_allclose(one, window_features(expected).numpy(), rtol=1e-4)
+
+    def test_encoder_sorts_windows_by_length(self):
+        encoder = FakeEncoder()
+        self.embed(encoder, 'speaker_encoder', batch_size=3)
+        # ثلاث دفعات لسبع نوافذ، وأطول نافذة وحدها في الأخيرة
+        self.assertEqual(len(encoder.batches), 3)
+        self.assertEqual(encoder.batches[-1][0], 1)
+        self.assertEqual(encoder.batches[-1][1], int(10.0 * PCM_SAMPLE_RATE))
+
+    def test_inference_batches_match_single_windows(self):
+        inference = FakeInference()
+        batched = self.embed(inference, 'embedding', batch_size=4)
+        single = self.embed(FakeInference(), 'embedding', batch_size=1)
+
+        for one, many in zip(single, batched):
+            np.testing.assert_allclose(many, one, rtol=1e-5)
+
+        # كل دفعة بطول واحد من مضاعفات خطوة الطول
+        step = int(batch_embeddings.EMBEDDING_LENGTH_STEP * PCM_SAMPLE_RATE)
+        for batch in inference.batches:
+            self.assertEqual(batch[2] % step, 0)
+
+    def test_inference_buckets_by_length(self):
+        inference = FakeInference()
+        self.embed(inference, 'embedding', batch_size=16)
+
+        step = int(batch_embeddings.EMBEDDING_LENGTH_STEP * PCM_SAMPLE_RATE)
+        # 0.3s و 0.2s تُحشى إلى خطوة واحدة مع النافذة المقصوصة بنهاية التسجيل (0.5s)،
+        # و 1.7s تُقص إلى 1.5s، و 3.75s إلى 3.5s
+        self.assertEqual(sorted(batch[2] // step for batch in inference.batches), [1, 3, 7, 8, 20])
+        self.assertEqual(sorted(batch[0] for batch in inference.batches), [1, 1, 1, 1, 3])
+
+    def test_empty_window_has_no_embedding(self):
+        self.windows = [(1.0, 2.0), (40.0, 45.0)]
+        embeddings = self.embed(FakeEncoder(), 'speaker_encoder', batch_size=4)
+        self.assertIsNotNone(embeddings[0])
+        self.assertIsNone(embeddings[1])
+
+    def test_select_windows(self):
+        turns = [
+            ('A', 0.0, 10.0), ('A', 12.0, 13.0), ('A', 14.0, 14.2), ('A', 20.0, 22.0),
+            ('B', 30.0, 30.3), ('B', 31.0, 31.1),
+        ]
+        windows = batch_embeddings.select_windows(turns, turns_per_label=2, window_seconds=4.0, min_seconds=0.5)
+
+        # أطول مقطعين للمتحدث A، كل نافذة في منتصف مقطعها ولا تتجاوز 4 ثوانٍ
+        self.assertEqual(windows[:2], [('A', 3.0, 7.0), ('A', 20.0, 22.0)])
+        # مقاطع B كلها أقصر من الحد الأدنى: يُستخدم أطولها
+        self.assertEqual(len(windows), 3)
+        self.assertEqual(windows[2][0], 'B')
+        self.assertAlmostEqual(windows[2][1], 30.0)
+        self.assertAlmostEqual(windows[2][2], 30.3)
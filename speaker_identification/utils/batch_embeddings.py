@@ -0,0 +1,199 @@
+# speaker_identification/utils/batch_embeddings.py - استخراج بصمات عدة مقاطع من الاجتماع على دفعات
+
+import logging
+import numpy as np
+import torch
+import torchaudio
+from django.conf import settings
+from audio_processing.utils.preprocessing import PCM_SAMPLE_RATE, pcm_to_float
+from .model_registry import get_model
+
+logger = logging.getLogger(__name__)
+
+# أطوال نوافذ pyannote تُقرب لأسفل إلى مضاعفات هذه المدة، فتتساوى أطوال كل دفعة بدون حشو
+EMBEDDING_LENGTH_STEP = 0.5
+
+
+def get_batch_settings():
+    return {
+        'batch_size': getattr(settings, 'EMBEDDING_BATCH_SIZE', 16),
+        'turns_per_label': getattr(settings, 'EMBEDDING_TURNS_PER_LABEL', 5),
+        'window_seconds': getattr(settings, 'EMBEDDING_WINDOW_SECONDS', 4.0),
+        'min_seconds': getattr(settings, 'EMBEDDING_MIN_SECONDS', 0.5),
+    }
+
+
+def select_windows(turns, turns_per_label=None, window_seconds=None, min_seconds=None):
+    """
+    اختيار نوافذ البصمات لكل متحدث: أطول turns_per_label مقاطع له
+
+    كل نافذة في منتصف مقطعها وطولها لا يتجاوز window_seconds، والمقاطع الأقصر
+    من min_seconds لا تُستخدم. إذا لم يكن للمتحدث مقطع بهذا الطول يُستخدم أطول مقاطعه
+
+    Args:
+        turns: قائمة (label, start, end) بالثواني
+
+    Returns:
+        list: قائمة (label, start, end) للنوافذ المختارة
+    """
+    options = get_batch_settings()
+    turns_per_label = turns_per_label or options['turns_per_label']
+    window_seconds = window_seconds or options['window_seconds']
+    min_seconds = options['min_seconds'] if min_seconds is None else min_seconds
+
+    by_label = {}
+    for label, start, end in turns:
+        by_label.setdefault(label, []).append((start, end))
+
+    windows = []
+    for label, label_turns in by_label.items():
+        label_turns.sort(key=lambda turn: turn[1] - turn[0], reverse=True)
+        chosen = [turn for turn in label_turns if turn[1] - turn[0] >= min_seconds][:turns_per_label]
+        for start, end in chosen or label_turns[:1]:
+            middle = (start + end) / 2
+            half = min(end - start, window_seconds) / 2
+            windows.append((label, middle - half, middle + half))
+    return windows
+
+
+def _mono_samples(samples, sample_rate):
+    """عينات أحادية بمعدل PCM_SAMPLE_RATE (int16 أو float، numpy أو tensor، (samples) أو (channels, samples))"""
+    if isinstance(samples, torch.Tensor):
+        if samples.dim() > 1:
+            samples = samples.mean(dim=0)
+        samples = samples.cpu().numpy()
+    elif samples.ndim > 1:
+        samples = pcm_to_float(samples).mean(axis=0) if np.issubdtype(samples.dtype, np.integer) \
+            else samples.mean(axis=0)
+
+    if sample_rate != PCM_SAMPLE_RATE:
+        if np.issubdtype(samples.dtype, np.integer):
+            samples = pcm_to_float(samples)
+        resampled = torchaudio.functional.resample(torch.as_tensor(samples, dtype=torch.float32),
+                                                   sample_rate, PCM_SAMPLE_RATE)
+        samples = resampled.numpy()
+    return samples
+
+
+def _window_slice(samples, start_time, end_time):
+    """عينات نافذة كـ float32 (memmap int16 يُقرأ منه المقطع فقط)"""
+    start = max(0, int(start_time * PCM_SAMPLE_RATE))
+    end = min(len(samples), int(end_time * PCM_SAMPLE_RATE))
+    segment = samples[start:end]
+    if np.issubdtype(segment.dtype, np.integer):
+        return pcm_to_float(segment)
+    return np.asarray(segment, dtype=np.float32)
+
+
+def _encoder_batches(encoder, slices, order, batch_size, progress):
+    """ECAPA: النوافذ مرتبة بالطول فتتقارب أطوال كل دفعة، والأقصر تُحشى بأصفار مع wav_lens"""
+    embeddings = {}
+    for first in range(0, len(order), batch_size):
+        batch = order[first:first + batch_size]
+        longest = max(len(slices[index]) for index in batch)
+        wavs = torch.zeros(len(batch), longest)
+        for row, index in enumerate(batch):
+            wavs[row, :len(slices[index])] = torch.from_numpy(slices[index])
+        wav_lens = torch.tensor([len(slices[index]) / longest for index in batch])
+
+        with torch.inference_mode():
+            output = encoder.encode_batch(wavs, wav_lens)
+        output = output.reshape(len(batch), -1).cpu().numpy()
+        for row, index in enumerate(batch):
+            embeddings[index] = output[row]
+
+        if progress:
+            progress(min(first + batch_size, len(order)), len(order))
+    return embeddings
+
+
+def _inference_batches(inference, slices, order, batch_size, progress):
+    """pyannote: نموذج البصمات بدون قناع للحشو، فكل دفعة من نوافذ بنفس الطول تماماً"""
+    step = int(EMBEDDING_LENGTH_STEP * PCM_SAMPLE_RATE)
+    buckets = {}
+    for index in order:
+        length = max(step, len(slices[index]) // step * step)
+        buckets.setdefault(length, []).append(index)
+
+    embeddings = {}
+    done = 0
+    for length, indices in buckets.items():
+        for first in range(0, len(indices), batch_size):
+            batch = indices[first:first + batch_size]
+            chunks = torch.zeros(len(batch), 1, length)
+            for row, index in enumerate(batch):
+                # قص من المنتصف إلى طول الدفعة (النوافذ الأقصر من خطوة واحدة تُحشى)
+                window = slices[index]
+                offset = max(0, (len(window) - length) // 2)
+                window = window[offset:offset + length]
+                chunks[row, 0, :len(window)] = torch.from_numpy(window)
+
+            with torch.inference_mode():
+                output = np.asarray(inference.infer(chunks)).reshape(len(batch), -1)
+            for row, index in enumerate(batch):
+                embeddings[index] = output[row]
+
+            done += len(batch)
+            if progress:
+                progress(done, len(order))
+    return embeddings
+
+
+def embed_windows(samples, windows, model_name='speaker_encoder', sample_rate=PCM_SAMPLE_RATE,
+                  batch_size=None, progress=None):
+    """
+    بصمات عدة نوافذ من نفس الاجتماع على دفعات
+
+    Args:
+        samples: عينات الاجتماع (load_pcm، أو موجة في الذاكرة بمعدل sample_rate)
+        windows: قائمة (start, end) بالثواني
+        model_name: speaker_encoder (ECAPA من speechbrain) أو embedding (pyannote)،
+            ويجب أن يطابق نموذج بصمات المتحدثين المقارنة معها
+        batch_size: عدد النوافذ في كل استدعاء للنموذج (EMBEDDING_BATCH_SIZE)
+        progress: دالة اختيارية (done, total) بعد كل دفعة
+
+    Returns:
+        list: بصمة numpy لكل نافذة بنفس الترتيب، و None للنافذة الفارغة
+    """
+    batch_size = max(1, batch_size or get_batch_settings()['batch_size'])
+    samples = _mono_samples(samples, sample_rate)
+
+    slices = [_window_slice(samples, start, end) for start, end in windows]
+    order = sorted((index for index, window in enumerate(slices) if len(window)),
+                   key=lambda index: len(slices[index]))
+    if not order:
+        return [None] * len(windows)
+
+    model = get_model(model_name)
+    if model_name == 'speaker_encoder':
+        embeddings = _encoder_batches(model, slices, order, batch_size, progress)
+    else:
+        embeddings = _inference_batches(model, slices, order, batch_size, progress)
+
+    logger.info(f"Extracted {len(order)} embeddings in batches of {batch_size}")
+    return [embeddings.get(index) for index in range(len(windows))]
+
+
+def embed_labels(samples, turns, model_name='speaker_encoder', sample_rate=PCM_SAMPLE_RATE, progress=None):
+    """
+    بصمة واحدة لكل متحدث من diarization: متوسط بصمات عدة مقاطع له (select_windows)
+
+    متوسط البصمات بعد توحيد أطوالها أثبت من بصمة مقطع واحد قد يكون قصيراً أو فيه تداخل
+
+    Args:
+        turns: قائمة (label, start, end) بالثواني
+
+    Returns:
+        dict: label -> بصمة numpy (لا يظهر المتحدث الذي لم تُستخرج له أي بصمة)
+    """
+    windows = select_windows(turns)
+    embeddings = embed_windows(
+        samples, [(start, end) for _, start, end in windows], model_name, sample_rate, progress=progress
+    )
+
+    grouped = {}
+    for (label, _, _), embedding in zip(windows, embeddings):
+        if embedding is not None:
+            norm = np.linalg.norm(embedding)
+            grouped.setdefault(label, []).append(embedding / norm if norm else embedding)
+    return {label: np.mean(label_embeddings, axis=0) for label, label_embeddings in grouped.items()}
@@ -2,7 +2,6 @@
 
 import torch
 import numpy as np
-from pyannote.audio import Pipeline
 from django.conf import settings
 import os
 import logging
@@ -12,8 +11,12 @@ from .voice_embeddings import (
     compare_embeddings,
     get_speaker_encoder
 )
+from .model_registry import get_model
+from .batch_embeddings import embed_labels
 import torchaudio
-from pydub import AudioSegment
+from audio_processing.utils.preprocessing import (
+    PCM_SAMPLE_RATE, load_pcm, pcm_to_float, read_pcm_segment, temporary_wav
+)
 
 logger = logging.getLogger(__name__)
 
@@ -37,19 +40,16 @@ def perform_speaker_diarization(audio_file_path, num_speakers=None):
         if not hf_token:
             raise ValueError("HUGGINGFACE_TOKEN not found in environment variables")
 
-        # تحميل pipeline
-        pipeline = Pipeline.from_pretrained(
-            "pyannote/speaker-diarization-3.1",
-            use_auth_token=hf_token
-        )
-
-        # إذا كان لدينا عدد المتحدثين، استخدمه
-        if num_speakers:
-            pipeline.instantiate({"num_speakers": num_speakers})
+        # pipeline المشترك في العملية (model_registry)، فلا يُحمّل مع كل اجتماع
+        pipeline = get_model('diarization')
 
-        # تشغيل diarization
+        # تشغيل diarization، وعدد المتحدثين (إن وُجد) يُمرر مع الاستدعاء
+        # فلا يتغير الـ pipeline المشترك لباقي الاجتماعات. pyannote يقرأ المقاطع من ملف
+        # WAV مؤقت بدلاً من موجة float32 للاجتماع كاملاً في الذاكرة
         logger.info("Running diarization pipeline...")
-        diarization = pipeline(audio_file_path)
+        params = {'num_speakers': num_speakers} if num_speakers else {}
+        with temporary_wav(audio_file_path) as wav_path:
+            diarization = pipeline(wav_path, **params)
 
         # تحويل النتائج إلى قائمة
         segments = []
@@ -74,40 +74,31 @@ def perform_speaker_diarization(audio_file_path, num_speakers=None):
         }]
 
 
-def extract_segment_embedding(audio_file_path, start_time, end_time):
+def extract_segment_embedding(audio, start_time, end_time, sample_rate=None):
     """
-    استخراج البصمة الصوتية من مقطع محدد من الملف الصوتي
+    استخراج البصمة الصوتية من مقطع محدد من الصوت
 
     Args:
-        audio_file_path: مسار الملف الصوتي
+        audio: مسار الملف الصوتي (يُقص المقطع من نسخة PCM المشتركة)،
+            أو عينات في الذاكرة بمعدل sample_rate (float، أو int16 تُحول إلى float)
         start_time: وقت البداية بالثواني
         end_time: وقت النهاية بالثواني
+        sample_rate: معدل العينات للعينات في الذاكرة
 
     Returns:
         numpy array: البصمة الصوتية للمقطع
     """
     try:
-        # استخدام pydub لقص المقطع
-        audio = AudioSegment.from_file(audio_file_path)
-
-        # تحويل الأوقات إلى ميلي ثانية
-        start_ms = int(start_time * 1000)
-        end_ms = int(end_time * 1000)
-
-        # قص المقطع
-        segment = audio[start_ms:end_ms]
+        if isinstance(audio, (str, os.PathLike)):
+            segment = read_pcm_segment(audio, start_time, end_time)
+            sample_rate = PCM_SAMPLE_RATE
+        else:
+            segment = audio[..., int(start_time * sample_rate):int(end_time * sample_rate)]
+            if isinstance(segment, np.ndarray) and np.issubdtype(segment.dtype, np.integer):
+                # عينات int16 (مثل load_pcm): النموذج يتوقع float في المدى [-1, 1]
+                segment = pcm_to_float(segment)
 
-        # حفظ المقطع مؤقتاً
-        temp_path = f"/tmp/segment_{start_time}_{end_time}.wav"
-        segment.export(temp_path, format="wav")
-
-        # استخراج البصمة الصوتية
-        embedding = extract_voice_embedding(temp_path)
-
-        # حذف الملف المؤقت
-        os.remove(temp_path)
-
-        return embedding
+        return extract_voice_embedding(segment, sample_rate)
 
     except Exception as e:
         logger.error(f"Error extracting segment embedding: {str(e)}")
@@ -144,6 +135,11 @@ def identify_speakers_with_embeddings(audio_file_path, diarization_segments):
         logger.warning("No speakers with voice embeddings found!")
         return diarization_segments
 
+    # بصمة كل متحدث: متوسط بصمات عدة مقاطع له (4 ثوانٍ من منتصف كل منها)،
+    # مستخرجة لكل المتحدثين معاً على دفعات
+    turns = [(segment['speaker_label'], segment['start'], segment['end']) for segment in diarization_segments]
+    label_embeddings = embed_labels(load_pcm(audio_file_path), turns, 'speaker_encoder')
+
     # معالجة كل مقطع
     identified_segments = []
     speaker_mapping = {}  # ربط التسميات مع المتحدثين الحقيقيين
@@ -154,17 +150,7 @@ def identify_speakers_with_embeddings(audio_file_path, diarization_segments):
         # إذا لم نحدد هذا المتحدث بعد
         if speaker_label not in speaker_mapping:
             logger.info(f"Identifying speaker: {speaker_label}")
-
-            # استخراج بصمة صوتية من منتصف المقطع
-            mid_time = (segment['start'] + segment['end']) / 2
-            sample_start = max(segment['start'], mid_time - 2)  # عينة 4 ثوانٍ
-            sample_end = min(segment['end'], mid_time + 2)
-
-            segment_embedding = extract_segment_embedding(
-                audio_file_path,
-                sample_start,
-                sample_end
-            )
+            segment_embedding = label_embeddings.get(speaker_label)
 
             if segment_embedding is not None:
                 # مقارنة مع جميع المتحدثين المسجلين
@@ -0,0 +1,260 @@
+# speaker_identification/utils/embedding_server.py - خادم محلي لبصمات المتحدثين عبر Unix socket
+
+import os
+import json
+import struct
+import socket
+import socketserver
+import threading
+import logging
+import numpy as np
+import torch
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# النماذج التي يخدمها الخادم، وباقي النماذج (diarization) تُحمّل في كل عملية
+SERVED_MODELS = ('embedding', 'speaker_encoder')
+
+# ترويسة كل رسالة: طول JSON ثم عدد المصفوفات
+FRAME_HEADER = struct.Struct('!II')
+
+
+class EmbeddingServerError(Exception):
+    """خطأ من خادم البصمات (فشل النموذج أو انقطاع الاتصال)"""
+
+
+def get_embedding_server_socket():
+    """مسار socket خادم البصمات، أو None لتحميل النماذج في كل عملية"""
+    return getattr(settings, 'EMBEDDING_SERVER_SOCKET', None)
+
+
+def get_embedding_server_timeout():
+    return getattr(settings, 'EMBEDDING_SERVER_TIMEOUT', 120)
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if not count:
+            raise ConnectionError("Embedding server connection closed")
+        received += count
+    return buffer
+
+
+def send_message(sock, header, arrays=()):
+    """
+    رسالة = ترويسة JSON + مصفوفات float32 متتالية
+
+    أشكال المصفوفات تُرسل في الترويسة، فيُقرأ كل منها مباشرة بدون pickle
+    """
+    arrays = [np.ascontiguousarray(array, dtype=np.float32) for array in arrays]
+    header = dict(header, shapes=[list(array.shape) for array in arrays])
+    encoded = json.dumps(header).encode('utf-8')
+    sock.sendall(FRAME_HEADER.pack(len(encoded), len(arrays)) + encoded)
+    for array in arrays:
+        if array.size:
+            sock.sendall(memoryview(array).cast('B'))
+
+
+def recv_message(sock):
+    header_size, count = FRAME_HEADER.unpack(_recv_exactly(sock, FRAME_HEADER.size))
+    header = json.loads(bytes(_recv_exactly(sock, header_size)).decode('utf-8'))
+
+    arrays = []
+    for shape in header['shapes'][:count]:
+        size = int(np.prod(shape)) * 4
+        arrays.append(np.frombuffer(_recv_exactly(sock, size), dtype=np.float32).reshape(shape))
+    return header, arrays
+
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """
+    اتصال عميل واحد: طلبات متتالية حتى يغلقه العميل
+
+    كل طلب يحمل دفعة موجات لنموذج واحد:
+    - embedding: موجة (channels, samples) لكل عنصر، والناتج بصمة لكل عنصر،
+      أو مع method=infer دفعة (batch, channels, samples) والناتج (batch, dimension)
+    - speaker_encoder: دفعة (batch, samples) مع wav_lens اختيارية، والناتج كما يعيده encode_batch
+    """
+
+    def handle(self):
+        while True:
+            try:
+                header, arrays = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+
+            try:
+                outputs = self.server.run(header, arrays)
+                send_message(self.request, {'ok': True}, outputs)
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                logger.error(f"Embedding request failed: {str(e)}")
+                send_message(self.request, {'ok': False, 'error': str(e)})
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    نسخة واحدة من نماذج البصمات تخدم كل عمليات Django والعامل على نفس الجهاز
+
+    العملاء يتصلون بخيوط منفصلة، واستدلال كل نموذج يتم بقفل خاص به
+    فلا تتزاحم خيوط torch على نفس النموذج
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, registry):
+        self.registry = registry
+        self.model_locks = {name: threading.Lock() for name in SERVED_MODELS}
+
+        if os.path.exists(socket_path):
+            # socket قديم من خادم توقف
+            os.remove(socket_path)
+        super().__init__(socket_path, EmbeddingRequestHandler)
+        os.chmod(socket_path, 0o660)
+
+    def run(self, header, arrays):
+        name = header.get('model')
+        if name not in SERVED_MODELS:
+            raise ValueError(f"Model {name} is not served")
+
+        model = self.registry.get(name)
+        with self.model_locks[name], torch.inference_mode():
+            if name == 'embedding' and header.get('method') == 'infer':
+                # دفعة (batch, channels, samples) بنفس الطول (batch_embeddings)
+                return [_to_numpy(model.infer(torch.from_numpy(arrays[0].copy())))]
+            if name == 'embedding':
+                sample_rate = header['sample_rate']
+                return [
+                    _to_numpy(model({'waveform': torch.from_numpy(waveform.copy()), 'sample_rate': sample_rate}))
+                    for waveform in arrays
+                ]
+
+            wavs = torch.from_numpy(arrays[0].copy())
+            wav_lens = torch.from_numpy(arrays[1].copy()) if len(arrays) > 1 else None
+            return [_to_numpy(model.encode_batch(wavs, wav_lens))]
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def _to_numpy(output):
+    if isinstance(output, torch.Tensor):
+        return output.detach().cpu().numpy()
+    return np.asarray(output)
+
+
+class EmbeddingClient:
+    """
+    اتصال بخادم البصمات، اتصال لكل خيط يُفتح عند أول طلب
+
+    إذا انقطع الاتصال (إعادة تشغيل الخادم) يُعاد الاتصال وإرسال الطلب مرة واحدة.
+    كل عملية على الاتصال مقيدة بمهلة (EMBEDDING_SERVER_TIMEOUT)، فالخادم المعلق
+    لا يحجز خيط المهمة حتى انتهاء مهلة المرحلة، ولا يُعاد إرسال الطلب إليه
+    """
+
+    def __init__(self, socket_path, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout if timeout is not None else get_embedding_server_timeout()
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise EmbeddingServerError(f"Embedding server is not running at {self.socket_path}: {e}")
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def request(self, header, arrays):
+        for attempt in range(2):
+            sock = self._connection()
+            try:
+                send_message(sock, header, arrays)
+                response, outputs = recv_message(sock)
+                break
+            except socket.timeout:
+                # الرد قد يصل لاحقاً على نفس الاتصال، فلا يُستخدم بعد الآن
+                self._close()
+                raise EmbeddingServerError(f"Embedding server did not respond within {self.timeout}s")
+            except (ConnectionError, OSError) as e:
+                self._close()
+                if attempt:
+                    raise EmbeddingServerError(f"Embedding server connection failed: {e}")
+
+        if not response.get('ok'):
+            raise EmbeddingServerError(response.get('error', 'Embedding request failed'))
+        return outputs
+
+    def embed(self, waveforms, sample_rate):
+        """بصمات pyannote لعدة موجات (channels, samples) في طلب واحد"""
+        return self.request({'model': 'embedding', 'sample_rate': sample_rate}, waveforms)
+
+    def infer(self, chunks):
+        """نفس Inference.infer من pyannote لدفعة بنفس الطول"""
+        return self.request({'model': 'embedding', 'method': 'infer'}, [chunks])[0]
+
+    def encode_batch(self, wavs, wav_lens=None):
+        """نفس EncoderClassifier.encode_batch من speechbrain"""
+        arrays = [wavs] if wav_lens is None else [wavs, wav_lens]
+        return self.request({'model': 'speaker_encoder'}, arrays)[0]
+
+
+class RemoteInference:
+    """بديل pyannote Inference(window="whole") يرسل الموجة إلى الخادم"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __call__(self, file):
+        waveform = _to_numpy(file['waveform'])
+        return self.client.embed([waveform], file['sample_rate'])[0]
+
+    def infer(self, chunks):
+        return self.client.infer(_to_numpy(chunks))
+
+
+class RemoteEncoder:
+    """بديل EncoderClassifier من speechbrain يرسل الدفعة إلى الخادم"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def encode_batch(self, wavs, wav_lens=None):
+        wav_lens = None if wav_lens is None else _to_numpy(wav_lens)
+        return torch.from_numpy(self.client.encode_batch(_to_numpy(wavs), wav_lens).copy())
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_remote_model(name):
+    """بديل النموذج الذي يستخدم خادم البصمات (بنفس واجهة النموذج المحلي)"""
+    socket_path = get_embedding_server_socket()
+    with _clients_lock:
+        client = _clients.get(socket_path)
+        if client is None:
+            client = _clients[socket_path] = EmbeddingClient(socket_path)
+
+    if name == 'embedding':
+        return RemoteInference(client)
+    return RemoteEncoder(client)
@@ -0,0 +1,134 @@
+# speaker_identification/utils/model_registry.py - تحميل نماذج الصوت مرة واحدة لكل عملية
+
+import os
+import time
+import threading
+import logging
+from django.conf import settings
+from .embedding_server import SERVED_MODELS, get_embedding_server_socket, get_remote_model
+
+logger = logging.getLogger(__name__)
+
+DIARIZATION_MODEL = "pyannote/speaker-diarization-3.1"
+EMBEDDING_MODEL = "pyannote/embedding"
+SPEAKER_ENCODER_MODEL = "speechbrain/spkrec-ecapa-voxceleb"
+
+
+class ModelRegistry:
+    """
+    النماذج المشتركة بين كل مسارات المعالجة في العملية الحالية
+
+    كل نموذج له قفل خاص، فإذا طلبه خيطان في نفس الوقت يحمله أحدهما وينتظر الآخر،
+    وتحميل نموذج لا يوقف من يستخدم نموذجاً آخر محملاً. النموذج الذي فشل تحميله
+    يُعاد تحميله عند الطلب التالي
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """تسجيل دالة بدون وسائط تحمّل النموذج وتعيده"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks[name] = threading.Lock()
+            self._status[name] = {'state': 'not_loaded', 'seconds': None, 'error': ''}
+
+    def get(self, name):
+        """النموذج المحمل، ويُحمّل عند أول طلب إذا لم يُحمّل مسبقاً"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            logger.info(f"Loading model '{name}'...")
+            self._status[name] = {'state': 'loading', 'seconds': None, 'error': ''}
+            started = time.monotonic()
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                self._status[name] = {'state': 'failed', 'seconds': None, 'error': str(e)}
+                raise
+
+            seconds = time.monotonic() - started
+            self._models[name] = model
+            self._status[name] = {'state': 'ready', 'seconds': round(seconds, 1), 'error': ''}
+            logger.info(f"Model '{name}' loaded in {seconds:.1f}s")
+            return model
+
+    def preload(self, names=None):
+        """
+        تحميل النماذج مسبقاً (عند بدء العامل)، والفشل يُسجل ولا يوقف باقي النماذج
+
+        Returns:
+            dict: حالة كل نموذج (status)
+        """
+        for name in names if names is not None else list(self._loaders):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Could not preload model '{name}': {str(e)}")
+        return self.status()
+
+    def is_ready(self, names=None):
+        names = names if names is not None else list(self._loaders)
+        return all(name in self._models for name in names)
+
+    def status(self):
+        """حالة كل نموذج: not_loaded أو loading أو ready أو failed، مع مدة التحميل وسبب الفشل"""
+        return {name: dict(status, pid=os.getpid()) for name, status in self._status.items()}
+
+
+def load_diarization_pipeline():
+    from pyannote.audio.pipelines import SpeakerDiarization
+    return SpeakerDiarization.from_pretrained(DIARIZATION_MODEL, use_auth_token=os.getenv("HUGGINGFACE_TOKEN"))
+
+
+def load_embedding_model():
+    from pyannote.audio import Model, Inference
+    model = Model.from_pretrained(EMBEDDING_MODEL, use_auth_token=os.getenv("HUGGINGFACE_TOKEN"))
+    return Inference(model, window="whole")
+
+
+def load_speaker_encoder():
+    from speechbrain.pretrained import EncoderClassifier
+    return EncoderClassifier.from_hparams(source=SPEAKER_ENCODER_MODEL, savedir="models/speaker_encoder")
+
+
+registry = ModelRegistry()
+registry.register('diarization', load_diarization_pipeline)
+registry.register('embedding', load_embedding_model)
+registry.register('speaker_encoder', load_speaker_encoder)
+
+
+def get_model(name):
+    """
+    النموذج لكل مسارات المعالجة: من خادم البصمات إذا حُدد EMBEDDING_SERVER_SOCKET
+    (نسخة واحدة لكل الجهاز)، وإلا من نسخة العملية الحالية
+    """
+    if name in SERVED_MODELS and get_embedding_server_socket():
+        return get_remote_model(name)
+    return registry.get(name)
+
+
+def preload_models(names=None):
+    """
+    تحميل النماذج المحددة في MODEL_PRELOAD (تستدعيها عمليات مجمع المعالج عند بدئها)
+
+    النماذج التي يخدمها خادم البصمات لا تُحمّل في العملية
+    """
+    if names is None:
+        names = getattr(settings, 'MODEL_PRELOAD', [])
+    if get_embedding_server_socket():
+        names = [name for name in names if name not in SERVED_MODELS]
+    return registry.preload(names)
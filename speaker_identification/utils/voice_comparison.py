@@ -3,61 +3,82 @@
 import os
 import torch
 import numpy as np
-from pyannote.audio import Model, Inference
-from pyannote.audio.pipelines import SpeakerDiarization
-from pyannote.core import Segment
 from scipy.spatial.distance import cosine
 import logging
 from django.conf import settings
+from audio_processing.cancellation import ProcessingCancelled
+from audio_processing.utils.preprocessing import (
+    PCM_SAMPLE_RATE, load_pcm, pcm_to_float, read_pcm_segment, temporary_wav
+)
+from .model_registry import get_model
+from .batch_embeddings import embed_labels
 
 logger = logging.getLogger(__name__)
 
-# تحميل النماذج
-embedding_model = None
-diarization_pipeline = None
-
 
 def get_embedding_model():
-    """تحميل نموذج استخراج البصمات الصوتية"""
-    global embedding_model
-    if embedding_model is None:
-        logger.info("Loading embedding model...")
-        # نموذج استخراج البصمات الصوتية
-        embedding_model = Model.from_pretrained(
-            "pyannote/embedding",
-            use_auth_token=os.getenv("HUGGINGFACE_TOKEN")
-        )
-        embedding_model = Inference(embedding_model, window="whole")
-    return embedding_model
+    """نموذج استخراج البصمات الصوتية (مشترك في العملية، model_registry)"""
+    return get_model('embedding')
 
 
 def get_diarization_pipeline():
-    """تحميل pipeline للـ diarization"""
-    global diarization_pipeline
-    if diarization_pipeline is None:
-        logger.info("Loading diarization pipeline...")
-        diarization_pipeline = SpeakerDiarization.from_pretrained(
-            "pyannote/speaker-diarization-3.1",
-            use_auth_token=os.getenv("HUGGINGFACE_TOKEN")
-        )
-    return diarization_pipeline
+    """pipeline للـ diarization (مشترك في العملية، model_registry)"""
+    return get_model('diarization')
+
+
+def get_waveform_input(audio, start_time=None, end_time=None, sample_rate=None):
+    """
+    مدخل pyannote في الذاكرة (كامل العينات، أو مقطع بالثواني)
+
+    Args:
+        audio: مسار ملف صوتي مع مقطع بالثواني (يُقص المقطع وحده من نسخة PCM المشتركة،
+            end_time=None حتى نهاية الملف، والاجتماع كاملاً يُمرر لـ pyannote كمسار عبر temporary_wav)،
+            أو عينات في الذاكرة (numpy array أو tensor) بشكل (samples) أو (channels, samples)
+        sample_rate: معدل العينات (مطلوب للعينات في الذاكرة)
+    """
+    if isinstance(audio, (str, os.PathLike)):
+        if start_time is None:
+            raise ValueError("start_time and end_time are required for audio files")
+        sample_rate = PCM_SAMPLE_RATE
+        samples = torch.from_numpy(read_pcm_segment(audio, start_time, end_time))
+    else:
+        if sample_rate is None:
+            raise ValueError("sample_rate is required for in-memory audio")
+        if isinstance(audio, np.ndarray) and np.issubdtype(audio.dtype, np.integer):
+            audio = pcm_to_float(audio)
+        samples = torch.as_tensor(audio, dtype=torch.float32)
+        if start_time is not None:
+            samples = samples[..., int(start_time * sample_rate):int(end_time * sample_rate)]
+
+    if samples.dim() == 1:
+        samples = samples.unsqueeze(0)
+    return {'waveform': samples, 'sample_rate': sample_rate}
 
 
-def extract_speaker_embedding(audio_file_path):
+def extract_speaker_embedding(audio, sample_rate=None):
     """
-    استخراج البصمة الصوتية من ملف صوتي
+    استخراج البصمة الصوتية من ملف صوتي أو من عينات في الذاكرة
+
+    Args:
+        audio: مسار الملف الصوتي، أو عينات (numpy array أو tensor)
+        sample_rate: معدل العينات (مطلوب للعينات في الذاكرة)
 
     Returns:
         numpy array: البصمة الصوتية (embedding)
     """
     try:
-        logger.info(f"Extracting embedding from: {audio_file_path}")
+        if isinstance(audio, (str, os.PathLike)):
+            logger.info(f"Extracting embedding from: {audio}")
 
         # الحصول على نموذج الـ embedding
         inference = get_embedding_model()
 
-        # استخراج البصمة الصوتية من الملف كاملاً
-        embedding = inference(audio_file_path)
+        # استخراج البصمة الصوتية من الصوت كاملاً (تسجيلات مرجعية قصيرة)، كمقطع في الذاكرة
+        # حتى يعمل مع النموذج المحلي وخادم البصمات (RemoteInference) معاً
+        if isinstance(audio, (str, os.PathLike)):
+            embedding = inference(get_waveform_input(audio, 0.0, None))
+        else:
+            embedding = inference(get_waveform_input(audio, sample_rate=sample_rate))
 
         # تحويل إلى numpy array
         if isinstance(embedding, torch.Tensor):
@@ -139,72 +160,111 @@ def load_speaker_embedding(speaker):
     return None
 
 
-def identify_speaker_from_segment(audio_file_path, start_time, end_time):
+def identify_speaker_from_segment(audio, start_time, end_time, sample_rate=None):
     """
     تحديد المتحدث من مقطع صوتي
 
     Args:
-        audio_file_path: مسار الملف الصوتي
+        audio: مسار الملف الصوتي، أو عينات الاجتماع في الذاكرة
         start_time: وقت البداية
         end_time: وقت النهاية
+        sample_rate: معدل العينات (مطلوب للعينات في الذاكرة)
 
     Returns:
         Speaker object or None
     """
-    from speaker_identification.models import Speaker
-
     try:
-        # استخراج البصمة الصوتية للمقطع
+        # استخراج البصمة الصوتية للمقطع: قص في الذاكرة ثم استدلال النموذج فقط
         inference = get_embedding_model()
-        segment = Segment(start_time, end_time)
-        segment_embedding = inference.crop(audio_file_path, segment)
-
-        # مقارنة مع جميع المتحدثين
-        best_speaker = None
-        best_score = 0.0
-        threshold = 0.7  # عتبة التشابه
-
-        for speaker in Speaker.objects.all():
-            speaker_embedding = load_speaker_embedding(speaker)
-            if speaker_embedding is not None:
-                similarity = compare_embeddings(segment_embedding, speaker_embedding)
-                logger.info(f"Comparing with {speaker.name}: {similarity:.3f}")
-
-                if similarity > best_score and similarity > threshold:
-                    best_score = similarity
-                    best_speaker = speaker
-
-        if best_speaker:
-            logger.info(f"Identified speaker: {best_speaker.name} (score: {best_score:.3f})")
-        else:
-            logger.warning(f"No speaker identified (best score: {best_score:.3f})")
-
-        return best_speaker, best_score
+        segment_embedding = inference(get_waveform_input(audio, start_time, end_time, sample_rate))
+        return match_speaker_embedding(segment_embedding)
 
     except Exception as e:
         logger.error(f"Error identifying speaker: {str(e)}")
         return None, 0.0
 
 
-def process_meeting_with_diarization(audio_file_path):
+def load_known_speakers():
+    """المتحدثون المسجلون مع بصماتهم (تُقرأ مرة واحدة لكل اجتماع)"""
+    from speaker_identification.models import Speaker
+
+    known_speakers = []
+    for speaker in Speaker.objects.all():
+        speaker_embedding = load_speaker_embedding(speaker)
+        if speaker_embedding is not None:
+            known_speakers.append((speaker, speaker_embedding))
+    return known_speakers
+
+
+def match_speaker_embedding(segment_embedding, known_speakers=None):
+    """
+    أقرب متحدث مسجل لبصمة صوتية
+
+    Returns:
+        (Speaker أو None، درجة التشابه)
+    """
+    if known_speakers is None:
+        known_speakers = load_known_speakers()
+
+    best_speaker = None
+    best_score = 0.0
+    threshold = 0.7  # عتبة التشابه
+
+    for speaker, speaker_embedding in known_speakers:
+        similarity = compare_embeddings(segment_embedding, speaker_embedding)
+        logger.info(f"Comparing with {speaker.name}: {similarity:.3f}")
+
+        if similarity > best_score and similarity > threshold:
+            best_score = similarity
+            best_speaker = speaker
+
+    if best_speaker:
+        logger.info(f"Identified speaker: {best_speaker.name} (score: {best_score:.3f})")
+    else:
+        logger.warning(f"No speaker identified (best score: {best_score:.3f})")
+
+    return best_speaker, best_score
+
+
+def process_meeting_with_diarization(audio_file_path, progress_callback=None):
     """
     معالجة اجتماع كامل مع diarization وتحديد المتحدثين
 
+    Args:
+        audio_file_path: مسار الملف الصوتي
+        progress_callback: دالة اختيارية (done, total) لتسجيل تقدم خطوات pyannote ثم عدد المقاطع المعالجة،
+            وهي أيضاً نقطة فحص للإلغاء (تثير ProcessingCancelled)
+
     Returns:
         list of dict: قائمة المقاطع مع المتحدثين المحددين
     """
     logger.info(f"Starting diarization for: {audio_file_path}")
 
     try:
-        # 1. تشغيل diarization
+        # 1. تشغيل diarization (pyannote يقرأ المقاطع من ملف WAV مؤقت، فلا تُحمل
+        #    موجة float32 للاجتماع كاملاً في الذاكرة)
         pipeline = get_diarization_pipeline()
-        diarization = pipeline(audio_file_path)
+        hook = _progress_hook(progress_callback) if progress_callback else None
+        with temporary_wav(audio_file_path) as wav_path:
+            diarization = pipeline(wav_path, hook=hook)
+
+        # 2. بصمة كل متحدث: متوسط بصمات عدة مقاطع له من نسخة PCM (كل نافذة تُحول وحدها إلى float)،
+        #    وعلى دفعات لكل المتحدثين معاً بدلاً من استدعاء النموذج لكل متحدث
+        turns = list(diarization.itertracks(yield_label=True))
+        label_embeddings = embed_labels(
+            load_pcm(audio_file_path),
+            [(speaker_label, turn.start, turn.end) for turn, _, speaker_label in turns],
+            'embedding',
+            PCM_SAMPLE_RATE,
+            progress=progress_callback,
+        )
+        known_speakers = load_known_speakers()
 
-        # 2. معالجة كل مقطع
+        # 3. معالجة كل مقطع
         segments = []
         speaker_mapping = {}  # ربط labels مع المتحدثين الحقيقيين
 
-        for turn, _, speaker_label in diarization.itertracks(yield_label=True):
+        for turn_index, (turn, _, speaker_label) in enumerate(turns, 1):
             start_time = turn.start
             end_time = turn.end
 
@@ -212,12 +272,10 @@ def process_meeting_with_diarization(audio_file_path):
             if speaker_label not in speaker_mapping:
                 logger.info(f"Identifying speaker for label: {speaker_label}")
 
-                # تحديد المتحدث من البصمة الصوتية
-                speaker, score = identify_speaker_from_segment(
-                    audio_file_path,
-                    start_time,
-                    end_time
-                )
+                # تحديد المتحدث من بصمته الصوتية
+                speaker = None
+                if speaker_label in label_embeddings:
+                    speaker, score = match_speaker_embedding(label_embeddings[speaker_label], known_speakers)
 
                 if speaker:
                     speaker_mapping[speaker_label] = speaker
@@ -239,14 +297,27 @@ def process_meeting_with_diarization(audio_file_path):
                 'label': speaker_label
             })
 
+            if progress_callback:
+                progress_callback(turn_index, len(turns))
+
         logger.info(f"Found {len(segments)} segments with {len(speaker_mapping)} speakers")
         return segments
 
+    except ProcessingCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error in diarization: {str(e)}")
         return []
 
 
+def _progress_hook(progress_callback):
+    """ربط خطوات pyannote الطويلة (segmentation، embeddings) بدالة التقدم، فتُفحص كل دفعة للإلغاء"""
+    def hook(step_name, step_artifact, file=None, total=None, completed=None):
+        if total and completed is not None:
+            progress_callback(completed, total)
+    return hook
+
+
 # دالة اختبار
 def test_voice_comparison():
     """اختبار النظام"""
@@ -4,44 +4,43 @@ import os
 import torch
 import torchaudio
 import numpy as np
-from speechbrain.pretrained import EncoderClassifier
 from django.conf import settings
 import pickle
 import logging
+from .model_registry import get_model
 
 logger = logging.getLogger(__name__)
 
-# تحميل نموذج استخراج البصمات الصوتية
-speaker_encoder = None
-
 
 def get_speaker_encoder():
-    """الحصول على نموذج التشفير الصوتي"""
-    global speaker_encoder
-    if speaker_encoder is None:
-        logger.info("Loading speaker encoder model...")
-        speaker_encoder = EncoderClassifier.from_hparams(
-            source="speechbrain/spkrec-ecapa-voxceleb",
-            savedir="models/speaker_encoder"
-        )
-    return speaker_encoder
-
-
-def extract_voice_embedding(audio_file_path):
+    """الحصول على نموذج التشفير الصوتي (مشترك في العملية، model_registry)"""
+    return get_model('speaker_encoder')
+
+
+def extract_voice_embedding(audio, sample_rate=None):
     """
-    استخراج البصمة الصوتية من ملف صوتي
+    استخراج البصمة الصوتية من ملف صوتي أو من عينات في الذاكرة
 
     Args:
-        audio_file_path: مسار الملف الصوتي
+        audio: مسار الملف الصوتي، أو عينات float (numpy array أو tensor) بشكل (samples) أو (channels, samples)
+        sample_rate: معدل العينات (مطلوب للعينات في الذاكرة)
 
     Returns:
         numpy array: البصمة الصوتية (embedding vector)
     """
     try:
-        logger.info(f"Extracting voice embedding from: {audio_file_path}")
-
-        # تحميل الملف الصوتي
-        signal, fs = torchaudio.load(audio_file_path)
+        if isinstance(audio, (str, os.PathLike)):
+            logger.info(f"Extracting voice embedding from: {audio}")
+
+            # تحميل الملف الصوتي
+            signal, fs = torchaudio.load(audio)
+        else:
+            # عينات في الذاكرة: التكلفة هي استدلال النموذج فقط بدون قراءة أو كتابة ملفات
+            if sample_rate is None:
+                raise ValueError("sample_rate is required for in-memory audio")
+            signal, fs = torch.as_tensor(audio, dtype=torch.float32), sample_rate
+            if signal.dim() == 1:
+                signal = signal.unsqueeze(0)
 
         # تحويل إلى mono إذا كان stereo
         if signal.shape[0] > 1:
@@ -49,8 +48,7 @@ def extract_voice_embedding(audio_file_path):
 
         # إعادة العينات إلى 16kHz إذا لزم الأمر
         if fs != 16000:
-            resampler = torchaudio.transforms.Resample(fs, 16000)
-            signal = resampler(signal)
+            signal = torchaudio.functional.resample(signal, fs, 16000)
 
         # استخراج البصمة الصوتية
         encoder = get_speaker_encoder()
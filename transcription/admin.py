@@ -38,14 +38,14 @@ class MeetingAdmin(admin.ModelAdmin):
             'fields': ('title', 'date', 'description')
         }),
         ('الملف الصوتي', {
-            'fields': ('audio_file',)
+            'fields': ('audio_file', 'audio_sha256')
         }),
         ('حالة المعالجة', {
             'fields': ('processed', 'created_by', 'created_at'),
         }),
     )
 
-    readonly_fields = ['created_at', 'created_by']
+    readonly_fields = ['created_at', 'created_by', 'audio_sha256']
 
     def view_transcript_link(self, obj):
         if obj.processed:
@@ -75,17 +75,15 @@ class MeetingAdmin(admin.ModelAdmin):
     mark_as_unprocessed.short_description = 'تحديد كغير معالج'
 
     def reprocess_meetings(self, request, queryset):
-        from audio_processing.tasks import process_meeting_task
-        import threading
+        from audio_processing.jobs import enqueue_meeting
 
         count = 0
         for meeting in queryset:
-            thread = threading.Thread(target=process_meeting_task, args=(meeting.id,))
-            thread.daemon = True
-            thread.start()
-            count += 1
+            job, created = enqueue_meeting(meeting)
+            if created:
+                count += 1
 
-        self.message_user(request, f'تم بدء إعادة معالجة {count} اجتماع')
+        self.message_user(request, f'تمت إضافة {count} اجتماع إلى طابور إعادة المعالجة')
 
     reprocess_meetings.short_description = 'إعادة معالجة'
 
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meeting',
+            name='audio_sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='بصمة الملف الصوتي'),
+        ),
+    ]
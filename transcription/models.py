@@ -11,6 +11,8 @@ class Meeting(models.Model):
     date = models.DateField(_('تاريخ الاجتماع'))
     description = models.TextField(_('وصف الاجتماع'), blank=True)
     audio_file = models.FileField(_('ملف التسجيل الصوتي'), upload_to='meeting_audio/')
+    # SHA-256 لمحتوى الملف، تُحسب عند الرفع لاكتشاف التسجيلات المكررة
+    audio_sha256 = models.CharField(_('بصمة الملف الصوتي'), max_length=64, blank=True, db_index=True, editable=False)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_meetings')
     created_at = models.DateTimeField(_('تاريخ الإنشاء'), auto_now_add=True)
     processed = models.BooleanField(_('تمت المعالجة'), default=False)
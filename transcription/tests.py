@@ -1,3 +1,380 @@
-from django.test import TestCase
+# transcription/tests.py
 
-# Create your tests here.
+import os
+import shutil
+import datetime
+import tempfile
+from unittest import mock
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from audio_processing.jobs import enqueue_meeting
+from audio_processing.utils.preprocessing import (
+    PCM_SAMPLE_RATE, PEAK_LEVELS, frame_energies, find_speech_intervals, get_pcm_path, get_peaks_dir,
+    get_peaks_path, compute_peaks
+)
+from .models import Meeting
+from .utils import chunked_whisper
+from .utils.chunked_whisper import plan_chunks, stitch_chunks, transcribe_chunked
+from .views import parse_range_header, range_file_response
+
+
+class ParseRangeHeaderTests(TestCase):
+    """ترويسة Range لتشغيل الصوت (نطاق بايتات واحد فقط)"""
+
+    def test_closed_range(self):
+        self.assertEqual(parse_range_header('bytes=0-99', 1000), (0, 99))
+
+    def test_end_is_clamped_to_file(self):
+        self.assertEqual(parse_range_header('bytes=900-5000', 1000), (900, 999))
+
+    def test_open_ended_range(self):
+        self.assertEqual(parse_range_header('bytes=400-', 1000), (400, 999))
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range_header('bytes=-500', 1000), (500, 999))
+
+    def test_suffix_longer_than_file(self):
+        self.assertEqual(parse_range_header('bytes=-5000', 1000), (0, 999))
+
+    def test_start_past_end_is_unsatisfiable(self):
+        self.assertEqual(parse_range_header('bytes=1000-', 1000), (1000, 1000))
+        self.assertEqual(parse_range_header('bytes=-0', 1000), (1000, 1000))
+
+    def test_multiple_ranges_are_ignored(self):
+        self.assertIsNone(parse_range_header('bytes=0-99,200-299', 1000))
+
+    def test_malformed_headers_are_ignored(self):
+        for header in ('', 'bytes=', 'bytes=-', 'items=0-99', 'bytes=abc-def', 'bytes=500-100'):
+            self.assertIsNone(parse_range_header(header, 1000), header)
+
+
+class RangeFileResponseTests(TestCase):
+    """ردود 200 و 206 و 416 لملف صوتي"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'meeting.mp3')
+        self.content = bytes(range(256)) * 8
+        with open(self.path, 'wb') as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get(self, range_header=None):
+        headers = {'HTTP_RANGE': range_header} if range_header is not None else {}
+        response = range_file_response(self.factory.get('/', **headers), self.path, 'audio/mpeg')
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_full_file_without_range(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+
+    def test_partial_content(self):
+        response, body = self.get('bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+
+    def test_suffix_range(self):
+        response, body = self.get('bytes=-500')
+        size = len(self.content)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[-500:])
+        self.assertEqual(response['Content-Range'], f'bytes {size - 500}-{size - 1}/{size}')
+        self.assertEqual(response['Content-Length'], '500')
+
+    def test_open_ended_range(self):
+        response, body = self.get('bytes=2000-')
+        size = len(self.content)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[2000:])
+        self.assertEqual(response['Content-Range'], f'bytes 2000-{size - 1}/{size}')
+        self.assertEqual(response['Content-Length'], str(size - 2000))
+
+    def test_unsatisfiable_range(self):
+        response, body = self.get(f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+        self.assertEqual(body, b'')
+
+    def test_multiple_ranges_send_full_file(self):
+        response, body = self.get('bytes=0-9,20-29')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+
+    def test_malformed_range_sends_full_file(self):
+        response, body = self.get('bytes=abc')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+
+    def test_missing_file(self):
+        response = range_file_response(self.factory.get('/'), self.path + '.missing', 'audio/mpeg')
+        self.assertEqual(response.status_code, 404)
+
+
+class MeetingPeaksViewTests(TestCase):
+    """قمم الموجة لصفحة الاجتماع (meeting_peaks): تُقرأ فقط ولا تُحسب أثناء الطلب"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.user = User.objects.create_user('member', password='secret')
+        self.client.force_login(self.user)
+        self.meeting = Meeting(title='اجتماع', date=datetime.date(2026, 1, 1), created_by=self.user)
+        self.meeting.audio_file.save('meeting.wav', ContentFile(b'audio'), save=False)
+        self.meeting.save()
+
+        audio_path = self.meeting.audio_file.path
+        mtime = os.path.getmtime(audio_path) - 10
+        os.utime(audio_path, (mtime, mtime))
+        np.save(get_pcm_path(audio_path), make_signal([(3, True)]), allow_pickle=False)
+        self.url = reverse('transcription:meeting_peaks', args=[self.meeting.id])
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_peaks_are_read(self):
+        compute_peaks(self.meeting.audio_file.path)
+        response = self.client.get(self.url, {'start': 1, 'end': 2, 'width': 10})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['duration'], 3.0)
+        # البداية تُحاذى إلى أول قمة تحتوي الثانية المطلوبة
+        self.assertLessEqual(data['start'], 1.0)
+        self.assertGreater(data['start'], 0.9)
+        self.assertTrue(data['peaks'])
+
+    def test_non_finite_values_are_rejected(self):
+        compute_peaks(self.meeting.audio_file.path)
+        for params in ({'start': 'inf'}, {'start': 'nan'}, {'end': 'inf'}, {'end': '-inf'}, {'end': 'nan'}, {'start': 'abc'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+    def test_cold_cache_is_not_computed_in_request(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(os.path.exists(get_peaks_dir(self.meeting.audio_file.path)))
+
+    def test_cold_cache_while_processing(self):
+        enqueue_meeting(self.meeting)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_stale_peaks_are_not_served(self):
+        """نسخة PCM أحدث من القمم (أُعيد فك الترميز): تنتظر العامل"""
+        audio_path = self.meeting.audio_file.path
+        compute_peaks(audio_path)
+        old = os.path.getmtime(get_pcm_path(audio_path)) - 5
+        for level in PEAK_LEVELS:
+            os.utime(get_peaks_path(audio_path, level), (old, old))
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+def make_signal(parts, sample_rate=PCM_SAMPLE_RATE):
+    """عينات int16 من أجزاء (المدة بالثواني، كلام أم صمت)"""
+    rng = np.random.default_rng(0)
+    blocks = []
+    for seconds, speech in parts:
+        count = int(seconds * sample_rate)
+        blocks.append(rng.integers(-8000, 8000, count) if speech else np.zeros(count))
+    return np.concatenate(blocks).astype(np.int16)
+
+
+def fake_response(text, segments):
+    """رد Whisper (verbose_json) لجزء واحد: segments أزواج (البداية، النهاية، النص) من بداية الجزء"""
+    return {
+        'text': text,
+        'segments': [{'start': start, 'end': end, 'text': segment_text} for start, end, segment_text in segments],
+    }
+
+
+class PlanChunksTests(TestCase):
+    """تقسيم التسجيل إلى أجزاء عند نقاط الصمت (chunked_whisper.plan_chunks)"""
+
+    def test_short_recording_is_one_chunk(self):
+        samples = make_signal([(5, True)])
+        self.assertEqual(plan_chunks(samples, chunk_seconds=10, search_seconds=3), [(0.0, 5.0)])
+
+    def test_empty_recording_has_no_chunks(self):
+        self.assertEqual(plan_chunks(np.zeros(0, dtype=np.int16), chunk_seconds=10, search_seconds=3), [])
+
+    def test_splits_at_silence_inside_search_window(self):
+        # صمت من 8s إلى 9s داخل نافذة البحث [7s, 10s] للجزء الأول
+        samples = make_signal([(8, True), (1, False), (8, True)])
+        chunks = plan_chunks(samples, chunk_seconds=10, search_seconds=3)
+
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[0][0], 0.0)
+        self.assertGreaterEqual(chunks[0][1], 8.0)
+        self.assertLessEqual(chunks[0][1], 9.0)
+        self.assertEqual(chunks[1], (chunks[0][1], 17.0))
+
+    def test_chunks_are_contiguous_and_bounded(self):
+        samples = make_signal([(7, True), (0.5, False)] * 8)
+        chunks = plan_chunks(samples, chunk_seconds=10, search_seconds=4)
+
+        self.assertEqual(chunks[0][0], 0.0)
+        self.assertAlmostEqual(chunks[-1][1], len(samples) / PCM_SAMPLE_RATE)
+        for (start, end), (next_start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, next_start)
+        for start, end in chunks:
+            self.assertLessEqual(end - start, 10)
+            self.assertGreater(end - start, 0)
+
+    def test_splits_in_middle_of_longest_saved_gap(self):
+        """فترات الكلام المحفوظة (detect_speech) تُستخدم بدون حساب طاقة التسجيل"""
+        samples = make_signal([(17, True)])
+        intervals = np.array([[0.0, 7.5], [7.7, 8.0], [9.0, 17.0]], dtype=np.float32)
+
+        with mock.patch.object(chunked_whisper, 'frame_energies', side_effect=AssertionError):
+            chunks = plan_chunks(samples, chunk_seconds=10, search_seconds=3, intervals=intervals)
+
+        self.assertEqual(len(chunks), 2)
+        self.assertAlmostEqual(chunks[0][1], 8.5)
+        self.assertEqual(chunks[1], (chunks[0][1], 17.0))
+
+    def test_gap_is_clipped_to_search_window(self):
+        samples = make_signal([(20, True)])
+        # الصمت من 9s إلى 14s، والنافذة تنتهي عند 10s
+        intervals = np.array([[0.0, 9.0], [14.0, 20.0]], dtype=np.float32)
+        chunks = plan_chunks(samples, chunk_seconds=10, search_seconds=3, intervals=intervals)
+
+        self.assertAlmostEqual(chunks[0][1], 9.5)
+
+    def test_without_silence_splits_inside_window(self):
+        samples = make_signal([(25, True)])
+        chunks = plan_chunks(samples, chunk_seconds=10, search_seconds=3)
+
+        for start, end in chunks[:-1]:
+            self.assertGreaterEqual(end - start, 7 - 0.1)
+            self.assertLessEqual(end - start, 10)
+
+
+class StitchChunksTests(TestCase):
+    """دمج نواتج الأجزاء بتوقيتات مطلقة (chunked_whisper.stitch_chunks)"""
+
+    def test_segments_are_offset_by_chunk_start(self):
+        chunks = [(0.0, 10.0), (10.0, 18.5)]
+        results = [
+            fake_response(' أهلاً بكم ', [(0.0, 4.0, ' أهلاً '), (4.0, 9.5, 'بكم')]),
+            fake_response('نبدأ الاجتماع', [(0.5, 3.25, 'نبدأ الاجتماع')]),
+        ]
+        stitched = stitch_chunks(chunks, results)
+
+        self.assertEqual(stitched['text'], 'أهلاً بكم نبدأ الاجتماع')
+        self.assertEqual(stitched['segments'], [
+            {'start': 0.0, 'end': 4.0, 'text': 'أهلاً'},
+            {'start': 4.0, 'end': 9.5, 'text': 'بكم'},
+            {'start': 10.5, 'end': 13.25, 'text': 'نبدأ الاجتماع'},
+        ])
+
+    def test_segment_end_is_clamped_to_chunk(self):
+        stitched = stitch_chunks([(20.0, 25.0)], [fake_response('نص', [(1.0, 7.0, 'نص')])])
+        self.assertEqual(stitched['segments'], [{'start': 21.0, 'end': 25.0, 'text': 'نص'}])
+
+    def test_empty_segments_and_chunks_are_skipped(self):
+        chunks = [(0.0, 5.0), (5.0, 10.0)]
+        results = [fake_response('  ', [(0.0, 5.0, ' ')]), {'text': 'بدون مقاطع', 'segments': None}]
+        stitched = stitch_chunks(chunks, results)
+
+        self.assertEqual(stitched, {'text': 'بدون مقاطع', 'segments': []})
+
+    def test_repeated_prompt_at_chunk_start_is_dropped(self):
+        """Whisper كرر آخر مقطع من الجزء السابق (الـ prompt) في بداية الجزء التالي"""
+        chunks = [(0.0, 10.0), (10.0, 20.0)]
+        results = [
+            fake_response('البند الأول. تمت الموافقة', [(0.0, 6.0, 'البند الأول.'), (6.0, 10.0, 'تمت الموافقة')]),
+            fake_response('تمت الموافقة البند الثاني', [(0.0, 1.0, 'تمت الموافقة'), (1.0, 5.0, 'البند الثاني')]),
+        ]
+        stitched = stitch_chunks(chunks, results)
+
+        self.assertEqual(stitched['text'], 'البند الأول. تمت الموافقة البند الثاني')
+        self.assertEqual([segment['text'] for segment in stitched['segments']],
+                         ['البند الأول.', 'تمت الموافقة', 'البند الثاني'])
+        self.assertEqual(stitched['segments'][-1]['start'], 11.0)
+
+    def test_repeated_text_later_in_chunk_is_kept(self):
+        chunks = [(0.0, 10.0), (10.0, 20.0)]
+        results = [
+            fake_response('موافق', [(0.0, 2.0, 'موافق')]),
+            fake_response('نعم موافق', [(0.0, 1.0, 'نعم'), (1.0, 2.0, 'موافق')]),
+        ]
+        self.assertEqual(len(stitch_chunks(chunks, results)['segments']), 3)
+
+
+@override_settings(WHISPER_CHUNK_SECONDS=10, WHISPER_SPLIT_SEARCH_SECONDS=3, WHISPER_PROMPT_CHARS=5)
+class TranscribeChunkedTests(TestCase):
+    """نسخ الأجزاء مع تمرير نهاية نص الجزء السابق كـ prompt (chunked_whisper.transcribe_chunked)"""
+
+    def setUp(self):
+        # أربعة أجزاء: صمت بعد كل 8 ثوانٍ
+        self.samples = make_signal([(8, True), (1, False)] * 4)
+
+    def transcribe(self):
+        calls = []
+
+        def fake_transcribe(audio_file, language, prompt=None):
+            index = len(calls)
+            calls.append((os.path.basename(audio_file.name), prompt))
+            return fake_response(f'نص الجزء {index}', [(0.0, 1.0, f'نص الجزء {index}')])
+
+        def fake_encode(audio_file_path, start_time, end_time, audio_format):
+            path = os.path.join(self.directory, f'{start_time:.2f}.opus')
+            with open(path, 'wb') as f:
+                f.write(b'\0' * 10)
+            return path
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        progress = mock.Mock()
+        intervals = find_speech_intervals(frame_energies(self.samples))
+        with mock.patch.object(chunked_whisper, 'load_pcm', return_value=self.samples), \
+                mock.patch.object(chunked_whisper, 'detect_speech', return_value=intervals), \
+                mock.patch.object(chunked_whisper, 'encode_for_upload', side_effect=fake_encode), \
+                mock.patch.object(chunked_whisper, 'transcribe_chunk', side_effect=fake_transcribe):
+            result = transcribe_chunked('meeting.mp3', progress=progress)
+        return result, calls, progress
+
+    def test_each_chunk_gets_previous_text_as_prompt(self):
+        result, calls, progress = self.transcribe()
+
+        self.assertEqual(len(calls), 4)
+        self.assertEqual([prompt for _, prompt in calls], [None, 'جزء 0', 'جزء 1', 'جزء 2'])
+        self.assertEqual(result['text'], 'نص الجزء 0 نص الجزء 1 نص الجزء 2 نص الجزء 3')
+        self.assertEqual([call.args for call in progress.call_args_list], [(1, 4), (2, 4), (3, 4), (4, 4)])
+
+    @override_settings(WHISPER_CONCURRENCY=2)
+    def test_concurrent_lanes_chain_prompts_within_lane(self):
+        _, calls, progress = self.transcribe()
+
+        # مساران: الجزءان 0 و 2 يبدآن بدون prompt، و 1 و 3 بعد سابقيهما
+        prompts = dict(calls)
+        ordered = sorted(prompts, key=lambda name: float(name[:-len('.opus')]))
+        self.assertIsNone(prompts[ordered[0]])
+        self.assertIsNone(prompts[ordered[2]])
+        self.assertIsNotNone(prompts[ordered[1]])
+        self.assertIsNotNone(prompts[ordered[3]])
+        self.assertEqual(progress.call_args_list[-1].args, (4, 4))
+
+    def test_split_lanes(self):
+        self.assertEqual(chunked_whisper.split_lanes(5, 2), [[0, 1, 2], [3, 4]])
+        self.assertEqual(chunked_whisper.split_lanes(2, 4), [[0], [1]])
+        self.assertEqual(chunked_whisper.split_lanes(0, 4), [])
@@ -9,6 +9,9 @@ app_name = 'transcription'
 urlpatterns = [
     path('', views.meetings_list, name='meetings'),
     path('view/<int:meeting_id>/', views.view_meeting, name='view_meeting'),  # تأكد من هذا النمط
+    path('audio/<int:meeting_id>/', views.stream_audio, name='stream_audio'),
+    path('clip/<int:segment_id>/', views.segment_clip, name='segment_clip'),
+    path('peaks/<int:meeting_id>/', views.meeting_peaks, name='meeting_peaks'),
     path('edit/<int:meeting_id>/', views.edit_transcript, name='edit_transcript'),
     path('report/<int:meeting_id>/', views.meeting_report, name='meeting_report'),
     path('export/<int:meeting_id>/<str:format>/', views.export_transcript, name='export_transcript'),
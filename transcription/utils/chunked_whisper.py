@@ -0,0 +1,225 @@
+# transcription/utils/chunked_whisper.py - نسخ الاجتماعات الطويلة على أجزاء
+
+import os
+import logging
+import numpy as np
+import openai
+from django.conf import settings
+from audio_processing.metrics import record_upload
+from audio_processing.scheduler import map_io
+from audio_processing.utils.preprocessing import (
+    PCM_SAMPLE_RATE, VAD_FRAME_SECONDS, load_pcm, frame_energies, find_speech_intervals, detect_speech,
+    encode_for_upload
+)
+
+logger = logging.getLogger(__name__)
+
+# طول الإطار المستخدم لإيجاد أهدأ نقطة في نافذة لا توجد فيها فجوة صمت
+FRAME_SECONDS = 0.03
+
+# عدد الإطارات التي يُحسب عليها متوسط الطاقة (~0.3 ثانية) حتى لا يُقطع عند توقف لحظي داخل كلمة
+SMOOTHING_FRAMES = 10
+
+
+def get_chunk_settings():
+    return {
+        'chunk_seconds': getattr(settings, 'WHISPER_CHUNK_SECONDS', 600),
+        'search_seconds': getattr(settings, 'WHISPER_SPLIT_SEARCH_SECONDS', 30),
+        'concurrency': max(1, getattr(settings, 'WHISPER_CONCURRENCY', 1)),
+        'prompt_chars': getattr(settings, 'WHISPER_PROMPT_CHARS', 200),
+        'upload_format': getattr(settings, 'WHISPER_UPLOAD_FORMAT', 'opus'),
+    }
+
+
+def plan_chunks(samples, chunk_seconds, search_seconds, intervals=None, sample_rate=PCM_SAMPLE_RATE):
+    """
+    تحديد حدود الأجزاء (بالثواني) بحيث لا يتجاوز أي جزء chunk_seconds
+
+    كل جزء يُقطع في منتصف أطول فجوة صمت بين فترات الكلام (detect_speech) تقع
+    في آخر search_seconds قبل حده الأقصى. إذا لم توجد فجوة في تلك النافذة يُقطع
+    عند أهدأ نقطة فيها، وطاقتها تُحسب للنافذة وحدها
+
+    Args:
+        samples: عينات الاجتماع (load_pcm)
+        intervals: فترات الكلام (n, 2) بالثواني، وتُحسب من العينات إذا لم تُمرر
+
+    Returns:
+        list: أزواج (البداية، النهاية) بالثواني (فارغة إذا لم يكن في الملف صوت)
+    """
+    total = len(samples) / sample_rate
+    if total == 0:
+        return []
+    if total <= chunk_seconds:
+        return [(0.0, total)]
+
+    if intervals is None:
+        intervals = find_speech_intervals(frame_energies(samples, sample_rate, VAD_FRAME_SECONDS))
+    intervals = np.asarray(intervals, dtype=np.float64).reshape(-1, 2)
+    # فجوات الصمت: قبل أول فترة كلام، وبين كل فترتين، وبعد آخر فترة
+    gap_starts = np.concatenate([[0.0], intervals[:, 1]])
+    gap_ends = np.concatenate([intervals[:, 0], [total]])
+
+    chunks = []
+    start = 0.0
+    while total - start > chunk_seconds:
+        window_end = start + chunk_seconds
+        window_start = max(window_end - search_seconds, start + FRAME_SECONDS)
+
+        split = _silence_split(gap_starts, gap_ends, window_start, window_end)
+        if split is None:
+            split = _quietest_point(samples, window_start, window_end, sample_rate)
+
+        chunks.append((start, split))
+        start = split
+
+    chunks.append((start, total))
+    return chunks
+
+
+def _silence_split(gap_starts, gap_ends, window_start, window_end):
+    """منتصف الجزء من أطول فجوة صمت داخل النافذة، أو None إذا لم تتداخل معها أي فجوة"""
+    overlap_starts = np.maximum(gap_starts, window_start)
+    overlap_ends = np.minimum(gap_ends, window_end)
+    lengths = overlap_ends - overlap_starts
+    if not len(lengths) or lengths.max() <= 0:
+        return None
+    best = int(np.argmax(lengths))
+    return float((overlap_starts[best] + overlap_ends[best]) / 2)
+
+
+def _quietest_point(samples, window_start, window_end, sample_rate):
+    """أهدأ نقطة في النافذة بمتوسط طاقة ~0.3 ثانية، حتى لا يُقطع عند توقف لحظي داخل كلمة"""
+    first = int(window_start * sample_rate)
+    energies = frame_energies(samples[first:int(window_end * sample_rate)], sample_rate, FRAME_SECONDS)
+    if not len(energies):
+        return window_end
+    kernel = np.ones(SMOOTHING_FRAMES, dtype=np.float32) / SMOOTHING_FRAMES
+    window = np.convolve(energies, kernel, mode='same')
+    return first / sample_rate + int(np.argmin(window)) * FRAME_SECONDS
+
+
+def split_lanes(total, concurrency):
+    """
+    توزيع أرقام الأجزاء على مسارات متتالية بعدد التزامن
+
+    كل مسار ينسخ أجزاءه بالترتيب، فكل جزء فيه يأخذ نص الجزء السابق له كـ prompt.
+    أول جزء في كل مسار فقط يبدأ بدون prompt، فالناتج لا يعتمد على توقيت الخيوط
+    """
+    lanes = min(concurrency, total)
+    return [list(lane) for lane in np.array_split(np.arange(total), lanes)] if lanes else []
+
+
+def get_prompt(previous, prompt_chars):
+    """آخر prompt_chars حرفاً من نص الجزء السابق (None للجزء الأول)"""
+    if previous is None or prompt_chars <= 0:
+        return None
+    return previous['text'].strip()[-prompt_chars:] or None
+
+
+def transcribe_chunk(audio_file, language, prompt=None):
+    """نسخ جزء واحد مع توقيتات مقاطعه (verbose_json)"""
+    params = {
+        'model': 'whisper-1',
+        'file': audio_file,
+        'language': language,
+        'response_format': 'verbose_json',
+    }
+    if prompt:
+        params['prompt'] = prompt
+    return openai.Audio.transcribe(**params)
+
+
+def transcribe_chunked(audio_file_path, language='ar', progress=None):
+    """
+    نسخ ملف صوتي على أجزاء ثم دمجها بتوقيتات مطلقة
+
+    الأجزاء تُقطع عند فجوات الصمت بين فترات الكلام المحفوظة (detect_speech)، وتُقرأ
+    من نسخة PCM للاجتماع وتُرفع كنسخة مضغوطة 16kHz أحادية
+    (WHISPER_UPLOAD_FORMAT) محفوظة لإعادة المحاولة، فيبقى كل جزء تحت حد الرفع
+    في Whisper مهما طال الاجتماع. كل جزء يُرسل معه آخر نص الجزء السابق كـ prompt،
+    لذلك يبدأ الجزء بعد اكتمال سابقه. WHISPER_CONCURRENCY يقسم الأجزاء على مسارات
+    متتالية تُنسخ معاً (split_lanes)، والاستدعاءات تمر بمجمع الـ API المشترك
+    (scheduler.map_io) فيبقى PROCESSING_IO_WORKERS حداً لكل الاجتماعات في العامل
+
+    Args:
+        audio_file_path: مسار الملف الصوتي الأصلي
+        language: لغة الاجتماع
+        progress: دالة اختيارية (done, total) تُستدعى كلما اكتمل جزء
+
+    Returns:
+        dict: النص الكامل، والمقاطع بتوقيتاتها من بداية الاجتماع
+    """
+    options = get_chunk_settings()
+    samples = load_pcm(audio_file_path)
+    # فترات الكلام محفوظة غالباً منذ الرفع (ingest)، فلا تُحسب طاقة التسجيل كاملاً مرة أخرى
+    chunks = plan_chunks(samples, options['chunk_seconds'], options['search_seconds'],
+                         intervals=detect_speech(audio_file_path))
+    total = len(chunks)
+    lanes = split_lanes(total, options['concurrency'])
+    logger.info(f"Transcribing {audio_file_path} in {total} chunks over {len(lanes)} lanes")
+
+    def run_chunk(item):
+        index, prompt = item
+        start_time, end_time = chunks[index]
+        upload_path = encode_for_upload(audio_file_path, start_time, end_time, options['upload_format'])
+        # يُسجل في خيط الاستدعاء وتجمعه map_io في قياسات المرحلة
+        record_upload(os.path.getsize(upload_path))
+        with open(upload_path, 'rb') as audio_file:
+            return transcribe_chunk(audio_file, language, prompt)
+
+    results = [None] * total
+    done = 0
+    for position in range(max((len(lane) for lane in lanes), default=0)):
+        # الجزء التالي من كل مسار بعد اكتمال سابقه
+        items = []
+        for lane in lanes:
+            if position < len(lane):
+                index = int(lane[position])
+                previous = results[index - 1] if position > 0 else None
+                items.append((index, get_prompt(previous, options['prompt_chars'])))
+
+        step_progress = None
+        if progress:
+            step_progress = lambda count, _total, base=done: progress(base + count, total)
+        for (index, _), response in zip(items, map_io(run_chunk, items, progress=step_progress)):
+            results[index] = response
+        done += len(items)
+
+    return stitch_chunks(chunks, results)
+
+
+def stitch_chunks(chunks, results):
+    """
+    دمج نواتج الأجزاء بإزاحة توقيت كل مقطع ببداية جزئه
+
+    Whisper يكرر أحياناً الـ prompt في بداية الجزء، فأول مقطع في الجزء يُحذف
+    إذا طابق نصه آخر مقطع في الجزء السابق
+    """
+    texts = []
+    segments = []
+    for (offset, end_time), response in zip(chunks, results):
+        text = response['text'].strip()
+        first = True
+
+        for segment in response.get('segments') or []:
+            segment_text = segment['text'].strip()
+            if not segment_text:
+                continue
+            if first and segments and segment_text == segments[-1]['text']:
+                first = False
+                text = text[len(segment_text):].strip() if text.startswith(segment_text) else text
+                continue
+            first = False
+            segments.append({
+                'start': round(offset + segment['start'], 2),
+                'end': round(min(offset + segment['end'], end_time), 2),
+                'text': segment_text,
+            })
+
+        if text:
+            texts.append(text)
+
+    return {
+        'text': ' '.join(texts),
+        'segments': segments,
+    }
@@ -15,10 +15,16 @@ else:
     raise Exception("OPENAI_API_KEY not found in settings!")
 
 
-def transcribe_with_whisper(audio_file_path, language="ar"):
+def transcribe_with_whisper(audio_file_path, language="ar", progress=None):
     """
     نسخ الصوت باستخدام Whisper من OpenAI
+
+    الملف يُقسم عند فترات الصمت إلى أجزاء تُنسخ بالتوازي (chunked_whisper)،
+    والمقاطع تحمل توقيتاتها الفعلية من بداية التسجيل
     """
+    # استيراد متأخر لتجنب تحميل مكتبات الصوت عند استيراد هذه الوحدة فقط لتحديد المتحدثين
+    from .chunked_whisper import transcribe_chunked
+
     print(f"Starting Whisper transcription for: {audio_file_path}")
 
     # التأكد من وجود الملف
@@ -26,37 +32,12 @@ def transcribe_with_whisper(audio_file_path, language="ar"):
         raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
 
     try:
-        # استخدام Whisper API - الإصدار القديم
-        with open(audio_file_path, "rb") as audio_file:
-            response = openai.Audio.transcribe(
-                model="whisper-1",
-                file=audio_file,
-                language=language
-            )
+        result = transcribe_chunked(audio_file_path, language=language, progress=progress)
 
         print(f"Whisper transcription successful!")
-        print(f"Transcribed text: {response['text'][:100]}...")
-
-        # تقسيم النص إلى مقاطع
-        text = response['text']
-        sentences = text.split('.')
-        segments = []
-        current_time = 0
-
-        for sentence in sentences:
-            if sentence.strip():
-                # حساب وقت تقريبي بناءً على طول الجملة
-                words_count = len(sentence.split())
-                segment_duration = max(5, words_count * 0.5)  # نصف ثانية لكل كلمة
-
-                segments.append({
-                    'start': current_time,
-                    'end': current_time + segment_duration,
-                    'text': sentence.strip() + '.'
-                })
-                current_time += segment_duration
+        print(f"Transcribed text: {result['text'][:100]}...")
 
-        return {'text': text, 'segments': segments}
+        return {'text': result['text'], 'segments': result['segments']}
 
     except Exception as e:
         logger.error(f"CRITICAL Whisper API Error: {str(e)}")
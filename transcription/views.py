@@ -3,9 +3,29 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, FileResponse
+from django.conf import settings
+from django.http import HttpResponse, FileResponse, JsonResponse
 from django.utils.translation import gettext as _
 from .models import Meeting, TranscriptSegment, MeetingReport
+from audio_processing.utils.preprocessing import PCM_SAMPLE_RATE, peaks_ready, read_peaks, get_pcm_duration
+from audio_processing.jobs import get_active_job
+from audio_processing.clips import get_segment_clip
+
+import math
+import mimetypes
+import os
+import re
+
+# أقصى عدد قمم في الطلب الواحد
+MAX_PEAKS_WIDTH = 4000
+
+# مهلة إعادة طلب القمم أثناء حسابها في العامل (بالثواني)
+PEAKS_RETRY_SECONDS = 5
+
+# حجم الدفعة عند إرسال جزء من الملف الصوتي
+AUDIO_STREAM_BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
 
 @login_required
 def meetings_list(request):
@@ -29,6 +49,172 @@ def view_meeting(request, meeting_id):
     }
     return render(request, 'transcription/view_meeting.html', context)
 
+@login_required
+def meeting_peaks(request, meeting_id):
+    """
+    قمم الموجة الصوتية لجزء من الاجتماع (start و end بالثواني، و width عدد النقاط المطلوبة)
+    تُقرأ من ملفات القمم المحسوبة أثناء المعالجة، فلا يحتاج المتصفح تحميل التسجيل
+    """
+    meeting = get_object_or_404(Meeting, id=meeting_id, created_by=request.user)
+    audio_path = meeting.audio_file.path
+
+    try:
+        start = float(request.GET.get('start', 0))
+        end = float(request.GET['end']) if 'end' in request.GET else None
+        width = min(max(int(request.GET.get('width', 1000)), 1), MAX_PEAKS_WIDTH)
+    except ValueError:
+        return JsonResponse({'error': _('قيم غير صالحة.')}, status=400)
+    if not math.isfinite(start) or (end is not None and not math.isfinite(end)):
+        return JsonResponse({'error': _('قيم غير صالحة.')}, status=400)
+
+    # القمم يحسبها العامل أثناء المعالجة، ولا تُحسب هنا (حساب اجتماع طويل يحجز الطلب).
+    # الاجتماعات المعالجة قبل إضافة القمم تحتاج إعادة معالجة
+    duration = get_pcm_duration(audio_path)
+    if duration is None or not peaks_ready(audio_path):
+        if get_active_job(meeting):
+            response = JsonResponse({'status': 'pending'}, status=202)
+            response['Retry-After'] = str(PEAKS_RETRY_SECONDS)
+            return response
+        return JsonResponse({'error': _('لم يتم تجهيز الموجة الصوتية لهذا الاجتماع بعد.')}, status=404)
+
+    start = max(0.0, start)
+    end = duration if end is None else min(duration, end)
+    samples_per_peak, peaks, offset = read_peaks(audio_path, start, end, width)
+
+    return JsonResponse({
+        'duration': duration,
+        'sample_rate': PCM_SAMPLE_RATE,
+        'samples_per_peak': samples_per_peak,
+        'start': offset,
+        'peaks': peaks.ravel().tolist(),
+    })
+
+def parse_range_header(header, size):
+    """
+    تحويل ترويسة Range (نطاق واحد) إلى (البداية، النهاية) شاملة
+
+    Returns:
+        tuple أو None: None إذا لم تكن الترويسة نطاق بايتات واحداً صالح الصيغة
+        (يُرسل الملف كاملاً)، و (size, size) إذا كان النطاق خارج الملف
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # آخر N بايت
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        if last and int(last) < start:
+            # صيغة غير صالحة حسب RFC 7233 فتُتجاهل الترويسة
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or size == 0:
+        return size, size
+    return start, end
+
+
+class RangeFile:
+    """ملف مفتوح مقيد بجزء منه، يقرؤه FileResponse على دفعات"""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+@login_required
+def stream_audio(request, meeting_id):
+    """
+    تشغيل صوت الاجتماع لصاحبه مع دعم Range (ردود 206)
+
+    المشغل يطلب الجزء الذي يحتاجه فقط عند الانتقال إلى أي موضع. إذا حُدد
+    AUDIO_SENDFILE_HEADER (مثل X-Accel-Redirect في nginx) يُترك الإرسال وتنفيذ
+    Range للخادم الأمامي بعد التحقق من الصلاحية
+    """
+    meeting = get_object_or_404(Meeting, id=meeting_id, created_by=request.user)
+    if not meeting.audio_file:
+        return HttpResponse(status=404)
+
+    content_type = mimetypes.guess_type(meeting.audio_file.name)[0] or 'application/octet-stream'
+
+    sendfile_header = getattr(settings, 'AUDIO_SENDFILE_HEADER', None)
+    if sendfile_header:
+        response = HttpResponse(content_type=content_type)
+        if sendfile_header == 'X-Accel-Redirect':
+            # nginx: مسار داخلي (internal) يشير إلى MEDIA_ROOT
+            response[sendfile_header] = getattr(settings, 'AUDIO_SENDFILE_PREFIX', '/protected-media/') + meeting.audio_file.name
+        else:
+            response[sendfile_header] = meeting.audio_file.path
+        return response
+
+    return range_file_response(request, meeting.audio_file.path, content_type)
+
+
+@login_required
+def segment_clip(request, segment_id):
+    """
+    مقطع صوت جاهز لمقطع نصي (يُقص ويُرمز عند أول طلب ثم يُحفظ)
+
+    التشغيل لا يعتمد على حجم التسجيل الأصلي، وإذا لم يتوفر المقطع
+    يرجع المشغل في الصفحة إلى الانتقال داخل التسجيل الكامل
+    """
+    segment = get_object_or_404(
+        TranscriptSegment.objects.select_related('meeting'),
+        id=segment_id, meeting__created_by=request.user
+    )
+    clip_path = get_segment_clip(segment)
+    if clip_path is None:
+        return HttpResponse(status=404)
+
+    content_type = mimetypes.guess_type(clip_path)[0] or 'application/octet-stream'
+    return range_file_response(request, clip_path, content_type)
+
+
+def range_file_response(request, path, content_type):
+    """رد بالملف كاملاً أو بالجزء المطلوب في ترويسة Range"""
+    try:
+        audio = open(path, 'rb')
+    except OSError:
+        return HttpResponse(status=404)
+    size = os.fstat(audio.fileno()).st_size
+
+    byte_range = parse_range_header(request.META.get('HTTP_RANGE', ''), size)
+    if byte_range is None:
+        # الملف كاملاً: FileResponse يستخدم wsgi.file_wrapper (sendfile) إن توفر
+        response = FileResponse(audio, content_type=content_type)
+    elif byte_range == (size, size):
+        audio.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(audio, start, length), status=206, content_type=content_type)
+        response.block_size = AUDIO_STREAM_BLOCK_SIZE
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
 @login_required
 def edit_transcript(request, meeting_id):
     meeting = get_object_or_404(Meeting, id=meeting_id, created_by=request.user)